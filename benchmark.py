@@ -0,0 +1,291 @@
+import argparse
+from dataclasses import asdict, dataclass
+import gc
+import glob
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+from data_module.dataset import PunchDataset
+from data_module.loader import load_recordings
+from data_module.types import AnnotatedAction, ColumnarRawAnnotatedAction
+from ml.feature_extractor import StatisticalFeatureExtractor
+from resample import find_max_subaction
+
+DEFAULT_BATCH_SIZES = (1, 16, 128)
+DEFAULT_THRESHOLD = 0.2  # 20% slower p50 than the baseline is a regression
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    calls: int
+    items_per_call: int
+    throughput: float  # items per second
+    p50_ms: float
+    p99_ms: float
+    peak_memory_kb: float
+
+def run_benchmark(
+    name: str,
+    fn: Callable[[int], object],
+    items_per_call: int,
+    repeat: int,
+    warmup: int = 1,
+) -> BenchmarkResult:
+    """Times `repeat` calls of `fn` after `warmup` untimed ones.
+
+    The peak memory is measured with tracemalloc on one more call, so the tracing overhead
+    does not affect the latencies. NumPy reports its buffers to tracemalloc, hence the peak
+    includes the arrays allocated by the call.
+
+    Args:
+        name: name of the benchmark in the report
+        fn: the timed function, called with the index of the call
+        items_per_call: items processed by one call, used for the throughput
+        repeat: number of timed calls
+        warmup: number of calls before timing
+    """
+    for i in range(warmup):
+        fn(i)
+    gc.collect()
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        latencies[i] = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn(repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return BenchmarkResult(
+        name=name,
+        calls=repeat,
+        items_per_call=items_per_call,
+        throughput=items_per_call * repeat / latencies.sum(),
+        p50_ms=float(np.percentile(latencies, 50) * 1000),
+        p99_ms=float(np.percentile(latencies, 99) * 1000),
+        peak_memory_kb=peak / 1024,
+    )
+
+def bench_features(samples: list[AnnotatedAction], repeat: int) -> list[BenchmarkResult]:
+    extractor = StatisticalFeatureExtractor()
+    return [run_benchmark("extract_features", lambda i: extractor.extract_features(samples), len(samples), repeat)]
+
+def bench_find_max_subaction(raw_samples: list, repeat: int) -> list[BenchmarkResult]:
+    """One recording per call, cycling over the dataset."""
+    calls = max(repeat, len(raw_samples))
+    return [run_benchmark(
+        "find_max_subaction",
+        lambda i: find_max_subaction(raw_samples[i % len(raw_samples)], window_size=1),
+        1,
+        calls,
+    )]
+
+def bench_predict(samples: list[AnnotatedAction], model_path: Path, batch_sizes: tuple[int, ...], repeat: int) -> list[BenchmarkResult]:
+    import joblib
+    from ml.model import PunchClassifier
+    classifier = PunchClassifier()
+    classifier.model = joblib.load(model_path)
+
+    results = []
+    for batch_size in batch_sizes:
+        batches = [
+            [samples[(start + j) % len(samples)] for j in range(batch_size)]
+            for start in range(0, max(len(samples), batch_size), batch_size)
+        ]
+        results.append(run_benchmark(
+            f"predict[batch={batch_size}]",
+            lambda i: classifier.predict(batches[i % len(batches)]),
+            batch_size,
+            repeat,
+        ))
+    return results
+
+def bench_load_samples(data_root: Path, workers: int | None, repeat: int) -> list[BenchmarkResult]:
+    """The progress bar and the dataset statistics are turned off, so only the decode is timed."""
+    items = len(glob.glob(os.path.join(data_root, "*.json")))
+    dataset_logger = logging.getLogger("data_module.dataset")
+    level = dataset_logger.level
+    dataset_logger.setLevel(logging.WARNING)
+    results = []
+    try:
+        for columnar in (False, True):
+            results.append(run_benchmark(
+                f"load_samples_from_path[columnar={columnar}]",
+                lambda i: PunchDataset.load_samples_from_path(data_root, columnar=columnar, workers=workers, progress=False),
+                items,
+                repeat,
+            ))
+    finally:
+        dataset_logger.setLevel(level)
+    return results
+
+STORAGE_BENCHMARK_BACKENDS = ("firestore", "sqlite")
+
+def bench_storage(raw_samples: list, repeat: int, backends: tuple[str, ...] = STORAGE_BENCHMARK_BACKENDS) -> list[BenchmarkResult]:
+    """Write and read paths of the storage backends.
+
+    'firestore' is `DBManager` on an `InMemoryFirestoreClient`, so the batched and retried
+    commits, the chunked acceleration writes, the transactions and the paged queries run
+    without network; 'sqlite' is `SQLiteDBManager` on a database in a temporary folder.
+    Every call works on a new session of the same user, so the reads of the session list
+    grow with `repeat` like they would in production.
+    """
+    results = []
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            try:
+                results += _bench_storage_backend(raw_samples, repeat, backend, tmp_dir)
+            except ImportError as e:
+                print(f"Skipping storage[{backend}]: {e}", file=sys.stderr)
+    return results
+
+def _bench_storage_backend(raw_samples: list, repeat: int, backend: str, tmp_dir: str) -> list[BenchmarkResult]:
+    from storage_backend import create_storage_backend
+    series = [
+        np.asarray(ColumnarRawAnnotatedAction.from_raw_annotated_action(sample).data, dtype=np.float32)
+        for sample in raw_samples
+    ]
+    points_per_buffer = int(np.mean([len(s) for s in series]))
+
+    if backend == "firestore":
+        from in_memory_firestore import InMemoryFirestoreClient
+        db_manager = create_storage_backend("firestore", client=InMemoryFirestoreClient())
+    else:
+        db_manager = create_storage_backend("sqlite", path=os.path.join(tmp_dir, "benchmark.db"))
+    db_manager.create_user("benchmark", "benchmark", "benchmark@example.com")
+    user_id = db_manager.authenticate_user("benchmark", "benchmark").id
+    session_ids = []
+
+    def write(i):
+        session_id = db_manager.create_training_session(user_id, f"2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}")
+        session_ids.append(session_id)
+        data = series[i % len(series)]
+        timestamps = np.arange(len(data), dtype=np.int64) * 16
+        db_manager.save_acceleration_arrays(session_id, data[:, 0], data[:, 1], data[:, 2], timestamps)
+        db_manager.update_session_stats(session_id, 1, float(np.linalg.norm(data, axis=1).max()))
+
+    def read(i):
+        session_id = session_ids[i % len(session_ids)]
+        db_manager.get_session_acceleration_series(session_id)
+        db_manager.get_user_sessions_page(user_id)
+        db_manager.get_user_stats(user_id)
+
+    return [
+        run_benchmark(f"storage_write[{backend}]", write, points_per_buffer, repeat),
+        run_benchmark(f"storage_read[{backend}]", read, points_per_buffer, repeat),
+    ]
+
+def compare_with_baseline(results: list[BenchmarkResult], baseline: dict, threshold: float) -> list[dict]:
+    """Returns the benchmarks whose p50 latency grew more than `threshold` over the baseline.
+    Benchmarks missing from the baseline are not compared."""
+    baseline_results = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        reference = baseline_results.get(result.name)
+        if reference is None:
+            continue
+        ratio = result.p50_ms / reference["p50_ms"] if reference["p50_ms"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append({
+                "name": result.name,
+                "baseline_p50_ms": reference["p50_ms"],
+                "p50_ms": result.p50_ms,
+                "ratio": ratio,
+            })
+    return regressions
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+BENCHMARKS = ("features", "find_max_subaction", "predict", "load_samples", "storage")
+
+def run(args) -> dict:
+    data_root = Path(args.data)
+    files = sorted(glob.glob(os.path.join(data_root, "*.json")))
+    if not files:
+        raise FileNotFoundError(f"No JSON recordings in {data_root}")
+    raw_samples = load_recordings(files, workers=args.workers, progress=False)
+    samples = [AnnotatedAction.from_raw_annotated_action(sample) for sample in raw_samples]
+
+    results = []
+    if "features" in args.only:
+        results += bench_features(samples, args.repeat)
+    if "find_max_subaction" in args.only:
+        results += bench_find_max_subaction(raw_samples, args.repeat)
+    if "predict" in args.only:
+        if Path(args.model).exists():
+            results += bench_predict(samples, Path(args.model), tuple(args.batch_sizes), args.repeat)
+        else:
+            print(f"Skipping predict: {args.model} not found", file=sys.stderr)
+    if "load_samples" in args.only:
+        results += bench_load_samples(data_root, args.workers, args.load_repeat)
+    if "storage" in args.only:
+        results += bench_storage(raw_samples, args.repeat, tuple(args.storage_backends))
+
+    report = {
+        "environment": environment(),
+        "data": str(data_root),
+        "recordings": len(files),
+        "results": [asdict(result) for result in results],
+    }
+    if args.baseline and Path(args.baseline).exists():
+        with open(args.baseline) as f:
+            report["regressions"] = compare_with_baseline(results, json.load(f), args.threshold)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the feature, segmentation, inference and storage hot paths")
+    parser.add_argument("--data", default="data/filtered_training_data", help="folder of JSON recordings")
+    parser.add_argument("--model", default="trained_model.pkl", help="model loaded by PunchClassifier.predict")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per benchmark")
+    parser.add_argument("--load-repeat", type=int, default=5, help="timed calls of load_samples_from_path")
+    parser.add_argument("--storage-backends", nargs="+", choices=STORAGE_BENCHMARK_BACKENDS,
+                        default=list(STORAGE_BENCHMARK_BACKENDS))
+    parser.add_argument("--workers", type=int, default=None, help="parsing processes of the loader")
+    parser.add_argument("--output", default=None, help="JSON report, printed to stdout if omitted")
+    parser.add_argument("--baseline", default=None, help="report of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed p50 slowdown, 0.2 = 20%%")
+    parser.add_argument("--save-baseline", action="store_true", help="write the report to --baseline")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+    if args.save_baseline and args.baseline:
+        Path(args.baseline).write_text(text)
+
+    for result in report["results"]:
+        print(
+            f"{result['name']:<40} {result['throughput']:>12.1f} items/s  "
+            f"p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms  "
+            f"peak {result['peak_memory_kb']:>9.1f} KiB",
+            file=sys.stderr,
+        )
+    regressions = report.get("regressions", [])
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['name']}: p50 {regression['p50_ms']:.3f} ms vs "
+            f"{regression['baseline_p50_ms']:.3f} ms (x{regression['ratio']:.2f})",
+            file=sys.stderr,
+        )
+    sys.exit(1 if regressions else 0)
@@ -1,27 +1,42 @@
 import glob
-import json
 from logging import getLogger
 import random
 import numpy as np
 from log import configure_logger
-from data_module.types import AnnotatedAction, Label, RawAnnotatedAction
+from data_module.loader import DEFAULT_CHUNK_SIZE, LazyRecordings, load_recordings
+from data_module.shard import PunchShard
+from data_module.types import AnnotatedAction, ColumnarRawAnnotatedAction, Label, RawAnnotatedAction
 from pathlib import Path
-from tqdm import tqdm
 logger = getLogger(__name__)
 
 class PunchDataset:
-    def __init__(self, samples: list[RawAnnotatedAction], split: tuple[float, float] = (0.8, 0.2)):
+    def __init__(
+        self,
+        samples: list[RawAnnotatedAction] | list[ColumnarRawAnnotatedAction],
+        split: tuple[float, float] = (0.8, 0.2),
+    ):
         self.data = samples
-        self.punch_count = sum(1 for s in samples if s.label == Label.PUNCH)
-        self.non_punch_count = sum(1 for s in samples if s.label == Label.NOT_PUNCH)
+        # A single pass over the samples, so that a LazyRecordings is decoded only once
+        self.punch_count = 0
+        self.non_punch_count = 0
+        self._processed_samples = []
+        for sample in samples:
+            self._count_label(sample)
+            self._processed_samples.append(AnnotatedAction.from_raw_annotated_action(action=sample))
         self.print_stats()
         self.train_data = None
         self.test_data = None
         self.split_data(split)
 
+    def _count_label(self, sample: RawAnnotatedAction | ColumnarRawAnnotatedAction) -> None:
+        if sample.label == Label.PUNCH:
+            self.punch_count += 1
+        elif sample.label == Label.NOT_PUNCH:
+            self.non_punch_count += 1
+
     def split_data(self, split: tuple[float, float]) -> None:
         train_size = int(len(self.data) * split[0])
-        new_data = self.processed_samples
+        new_data = list(self.processed_samples)
         random.shuffle(new_data)
         self.train_data = new_data[:train_size]
         self.test_data = new_data[train_size:]
@@ -37,26 +52,55 @@ class PunchDataset:
         return self.test_data
 
     @classmethod
-    def load_samples_from_path(cls, path: Path, split: tuple[float, float]=(0.8, 0.2)) -> 'PunchDataset':
-        samples = []
+    def load_samples_from_path(
+        cls,
+        path: Path,
+        split: tuple[float, float]=(0.8, 0.2),
+        columnar: bool = False,
+        workers: int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: bool = True,
+    ) -> 'PunchDataset':
+        """Loads every JSON recording in `path`, parsing the files in parallel.
+
+        Args:
+            path: folder with the JSON recordings
+            split: train and test fractions
+            columnar: load the recordings as ColumnarRawAnnotatedAction
+            workers: number of parsing processes, defaults to the number of CPUs
+            chunk_size: number of files parsed by a single work unit
+            progress: show a progress bar while parsing
+        """
         files = glob.glob(str(path / "*.json"))
-        for file_path in tqdm(files, desc="Loading JSON files", total=len(files)):
-            with open(file_path, 'r') as f:
-                # Parse the JSON file into RawAnnotatedAction objects
-                data = json.load(f)
-                action = RawAnnotatedAction.from_json(data, file_path)
-                samples.append(action)
+        samples = load_recordings(files, columnar=columnar, workers=workers, chunk_size=chunk_size, progress=progress)
         return cls(samples, split=split)
 
+    @classmethod
+    def from_shard(cls, path: Path, split: tuple[float, float]=(0.8, 0.2)) -> 'PunchDataset':
+        """Loads a shard written by `data_module.shard.write_shard`.
+        The samples are ColumnarRawAnnotatedAction views over the memory mapped shard."""
+        return cls(list(PunchShard(path)), split=split)
+
+    @staticmethod
+    def iter_samples_from_path(path: Path, columnar: bool = False) -> LazyRecordings:
+        """Lazy alternative to `load_samples_from_path`: the recordings are decoded one at a time
+        only when iterated, so streaming consumers never hold the whole dataset in memory."""
+        return LazyRecordings(glob.glob(str(path / "*.json")), columnar=columnar)
+
     @property
     def processed_samples(self) -> list[AnnotatedAction]:
-        return [
-            AnnotatedAction.from_raw_annotated_action(action=sample)
-            for sample in self.data
-        ]
+        """The samples converted to AnnotatedAction, computed once and kept until `add_sample`."""
+        if self._processed_samples is None:
+            self._processed_samples = [
+                AnnotatedAction.from_raw_annotated_action(action=sample)
+                for sample in self.data
+            ]
+        return self._processed_samples
 
-    def add_sample(self, sample: RawAnnotatedAction) -> None:
+    def add_sample(self, sample: RawAnnotatedAction | ColumnarRawAnnotatedAction) -> None:
         self.data.append(sample)
+        self._count_label(sample)
+        self._processed_samples = None
 
     def __len__(self):
         return len(self.data)
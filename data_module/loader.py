@@ -1,9 +1,19 @@
 import glob
 import json
+import os
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Any
 
-def load_data(path: Path) -> list[dict[str, Any]]:
+from tqdm import tqdm
+from data_module.types import ColumnarRawAnnotatedAction, RawAnnotatedAction
+
+# Below this many files the process pool start up costs more than the parsing
+MIN_FILES_PER_POOL = 256
+DEFAULT_CHUNK_SIZE = 64
+
+def load_data(path: Path, workers: int | None = None) -> list[dict[str, Any]]:
     """This function loads data from a folder with JSON files"""
     if not path.exists():
         raise FileNotFoundError(f"Il file {path} non esiste.")
@@ -12,10 +22,89 @@ def load_data(path: Path) -> list[dict[str, Any]]:
     if not json_files:
         raise ValueError(f"Nessun file JSON trovato in {path}.")
 
+    return _map_chunks(_load_json_chunk, json_files, workers=workers)
+
+def load_recordings(
+    files: list[str],
+    columnar: bool = False,
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: bool = True,
+) -> list[RawAnnotatedAction] | list[ColumnarRawAnnotatedAction]:
+    """Parses the recordings in `files` fanning the work out to a process pool.
+
+    Args:
+        files: paths of the JSON recordings, the output follows their order
+        columnar: if True the recordings are decoded into ColumnarRawAnnotatedAction
+        workers: number of processes, defaults to the number of CPUs. With 1 worker,
+            or less than MIN_FILES_PER_POOL files, everything is parsed in this process
+        chunk_size: number of files parsed by a single work unit
+        progress: show a progress bar over the work units
+    """
+    if columnar:
+        return _map_chunks(_load_columnar_chunk, files, workers, chunk_size, progress)
+    return _map_chunks(_load_raw_chunk, files, workers, chunk_size, progress)
+
+def read_recording(file_path: str, columnar: bool = False) -> RawAnnotatedAction | ColumnarRawAnnotatedAction:
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+    if columnar:
+        return ColumnarRawAnnotatedAction.from_json(data, file_path)
+    return RawAnnotatedAction.from_json(data, file_path)
+
+class LazyRecordings(Sequence):
+    """Sequence of recordings that are decoded from disk only when accessed.
+    Nothing is cached, so iterating holds a single recording in memory at a time."""
+
+    def __init__(self, files: list[str], columnar: bool = False):
+        self.files = list(files)
+        self.columnar = columnar
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return LazyRecordings(self.files[idx], columnar=self.columnar)
+        return read_recording(self.files[idx], columnar=self.columnar)
+
+    def __iter__(self) -> Iterator[RawAnnotatedAction | ColumnarRawAnnotatedAction]:
+        for file_path in self.files:
+            yield read_recording(file_path, columnar=self.columnar)
+
+def _map_chunks(
+    load_chunk,
+    files: list[str],
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: bool = False,
+) -> list:
+    workers = workers or os.cpu_count() or 1
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    bar = tqdm(desc="Loading JSON files", total=len(files), disable=not progress)
+    results = []
+    if workers == 1 or len(files) < MIN_FILES_PER_POOL:
+        for chunk in chunks:
+            results.extend(load_chunk(chunk))
+            bar.update(len(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            # map keeps the order of the chunks
+            for chunk, loaded in zip(chunks, executor.map(load_chunk, chunks)):
+                results.extend(loaded)
+                bar.update(len(chunk))
+    bar.close()
+    return results
+
+def _load_json_chunk(files: list[str]) -> list[dict[str, Any]]:
     data = []
-    for json_file in json_files:
+    for json_file in files:
         with open(json_file, 'r') as f:
-            json_data = json.load(f)
-            data.append(json_data)
-
+            data.append(json.load(f))
     return data
+
+def _load_raw_chunk(files: list[str]) -> list[RawAnnotatedAction]:
+    return [read_recording(file_path) for file_path in files]
+
+def _load_columnar_chunk(files: list[str]) -> list[ColumnarRawAnnotatedAction]:
+    return [read_recording(file_path, columnar=True) for file_path in files]
@@ -0,0 +1,128 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+from data_module.loader import load_recordings
+from data_module.types import ColumnarRawAnnotatedAction, Label, RawAnnotatedAction
+
+SHARD_VERSION = 1
+SAMPLES_FILE = "samples.npy"
+TIMESTAMPS_FILE = "timestamps.npy"
+OFFSETS_FILE = "offsets.npy"
+LABELS_FILE = "labels.npy"
+METADATA_FILE = "metadata.json"
+
+class PunchShard(Sequence):
+    """Read only, memory mapped view of a packed dataset shard.
+
+    A shard is a folder holding the impulses of every recording in one contiguous
+    (n_impulses, 3) float32 array, their int64 timestamps, an offsets index of
+    n_recordings + 1 entries, an int8 label array and a JSON metadata table with the
+    timestamp and the source path of each recording. The arrays are opened with
+    `mmap_mode="r"`, so several processes reading the same shard share the page cache.
+
+    Args:
+        path: the shard folder written by `write_shard`
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / METADATA_FILE, "r") as f:
+            metadata = json.load(f)
+        if metadata["version"] != SHARD_VERSION:
+            raise ValueError(f"Unsupported shard version {metadata['version']} in {self.path}")
+        self.timestamps = metadata["timestamps"]
+        self.file_paths = metadata["file_paths"]
+        self.samples = np.load(self.path / SAMPLES_FILE, mmap_mode="r")
+        self.impulse_timestamps = np.load(self.path / TIMESTAMPS_FILE, mmap_mode="r")
+        self.offsets = np.load(self.path / OFFSETS_FILE)
+        self.labels = np.load(self.path / LABELS_FILE)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        # Slicing the memory mapped arrays returns views, no impulse is copied
+        return ColumnarRawAnnotatedAction(
+            data=self.samples[start:end],
+            impulse_timestamps=self.impulse_timestamps[start:end],
+            label=Label(int(self.labels[idx])),
+            timestamp=self.timestamps[idx],
+            file_path=self.file_paths[idx],
+        )
+
+    def __iter__(self) -> Iterator[ColumnarRawAnnotatedAction]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+def write_shard(
+    recordings: Iterable[RawAnnotatedAction | ColumnarRawAnnotatedAction],
+    path: Path,
+) -> Path:
+    """Packs the recordings into a shard folder at `path`, replacing any existing shard.
+    The shard is written next to its destination and renamed in place once complete."""
+    path = Path(path)
+    samples, impulse_timestamps, lengths, labels = [], [], [], []
+    timestamps, file_paths = [], []
+    for recording in recordings:
+        if isinstance(recording, RawAnnotatedAction):
+            recording = ColumnarRawAnnotatedAction.from_raw_annotated_action(recording)
+        samples.append(recording.data)
+        impulse_timestamps.append(recording.impulse_timestamps)
+        lengths.append(len(recording))
+        labels.append(recording.label.value)
+        timestamps.append(recording.timestamp)
+        file_paths.append(recording.file_path)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    np.save(tmp_path / SAMPLES_FILE, np.concatenate([np.empty((0, 3), np.float32), *samples]))
+    np.save(tmp_path / TIMESTAMPS_FILE, np.concatenate([np.empty(0, np.int64), *impulse_timestamps]))
+    np.save(tmp_path / OFFSETS_FILE, offsets)
+    np.save(tmp_path / LABELS_FILE, np.array(labels, dtype=np.int8))
+    with open(tmp_path / METADATA_FILE, "w") as f:
+        json.dump({"version": SHARD_VERSION, "timestamps": timestamps, "file_paths": file_paths}, f)
+
+    if path.exists():
+        old_path = path.with_name(path.name + ".old")
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+def pack_directory(src: Path, dst: Path, workers: int | None = None) -> Path:
+    """Packs every JSON recording of the folder `src` into the shard `dst`."""
+    files = sorted(glob.glob(str(Path(src) / "*.json")))
+    if not files:
+        raise ValueError(f"Nessun file JSON trovato in {src}.")
+    return write_shard(load_recordings(files, columnar=True, workers=workers), dst)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a folder of JSON recordings into a dataset shard")
+    parser.add_argument("src", type=Path, help="folder with the JSON recordings")
+    parser.add_argument("dst", type=Path, help="shard folder to write, e.g. data/filtered_training_data.shard")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    shard_path = pack_directory(args.src, args.dst, workers=args.workers)
+    print(f"Shard written to {shard_path} ({len(PunchShard(shard_path))} recordings)")
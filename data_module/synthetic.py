@@ -0,0 +1,332 @@
+import argparse
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import glob
+from itertools import islice
+import json
+from pathlib import Path
+
+import numpy as np
+from data_module.loader import load_recordings
+from data_module.shard import write_shard
+from data_module.types import ColumnarRawAnnotatedAction, Label, RawAnnotatedAction
+
+# Points of the intensity envelope of a recording, resampled over its duration
+ENVELOPE_POINTS = 32
+# Samples with a lower intensity are considered rest when fitting the sessions (resample.DEFAULT_THRESHOLD)
+REST_THRESHOLD = 25.0
+# Used when the source recordings hold too few rest samples, e.g. the filtered ones
+DEFAULT_REST_LEVEL = 9.81
+DEFAULT_REST_NOISE = 1.0
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S_%f"
+SEGMENTS_FILE = "segments.json"
+
+@dataclass
+class LabelProfile:
+    """Statistics of the recordings of one label.
+
+    Args:
+        lengths: number of samples of every source recording, drawn with replacement
+        envelopes: (n_recordings, ENVELOPE_POINTS) intensity of every source recording divided by its peak
+        log_peak_mean: mean of the log of the peak intensities
+        log_peak_std: standard deviation of the log of the peak intensities
+        noise: relative standard deviation of the intensity around its 3 samples moving average
+        direction_mean: mean unit vector of the accelerations
+        direction_std: standard deviation of each component of the unit vectors
+        intervals: distinct intervals in ms between consecutive samples
+        interval_probabilities: frequency of each interval
+    """
+    lengths: np.ndarray
+    envelopes: np.ndarray
+    log_peak_mean: float
+    log_peak_std: float
+    noise: float
+    direction_mean: np.ndarray
+    direction_std: np.ndarray
+    intervals: np.ndarray
+    interval_probabilities: np.ndarray
+
+    @classmethod
+    def fit(cls, recordings: list[ColumnarRawAnnotatedAction]) -> 'LabelProfile':
+        grid = np.linspace(0.0, 1.0, ENVELOPE_POINTS)
+        envelopes, peaks, residuals, directions, intervals = [], [], [], [], []
+        for recording in recordings:
+            intensity = recording.intensity.astype(np.float64)
+            peak = intensity.max()
+            if peak <= 0:
+                continue
+            peaks.append(peak)
+            envelopes.append(np.interp(grid, np.linspace(0.0, 1.0, len(intensity)), intensity / peak))
+            if len(intensity) >= 3:
+                smooth = np.convolve(intensity, np.ones(3) / 3, mode="valid")
+                residuals.append((intensity[1:-1] - smooth) / peak)
+            nonzero = intensity > 0
+            directions.append(recording.data[nonzero] / intensity[nonzero, None])
+            intervals.append(np.diff(recording.impulse_timestamps))
+        if not peaks:
+            raise ValueError("No recording with a non zero intensity")
+
+        directions = np.concatenate(directions)
+        log_peaks = np.log(peaks)
+        intervals = np.concatenate(intervals)
+        intervals = intervals[intervals >= 0]
+        if len(intervals) == 0:
+            intervals = np.array([16])
+        values, counts = np.unique(intervals, return_counts=True)
+        return cls(
+            lengths=np.array([len(recording) for recording in recordings], dtype=np.int64),
+            envelopes=np.array(envelopes),
+            log_peak_mean=float(log_peaks.mean()),
+            log_peak_std=float(log_peaks.std()),
+            noise=float(np.concatenate(residuals).std()) if residuals else 0.0,
+            direction_mean=directions.mean(axis=0),
+            direction_std=directions.std(axis=0),
+            intervals=values,
+            interval_probabilities=counts / counts.sum(),
+        )
+
+    def to_dict(self) -> dict:
+        return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in vars(self).items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LabelProfile':
+        return cls(**{key: np.array(value) if isinstance(value, list) else value for key, value in data.items()})
+
+@dataclass
+class WorkloadProfile:
+    """Per label statistics plus the level of the rest between the punches of a session."""
+    labels: dict[Label, LabelProfile]
+    punch_fraction: float
+    rest_level: float
+    rest_noise: float
+
+    @classmethod
+    def fit(cls, recordings: Iterable[RawAnnotatedAction | ColumnarRawAnnotatedAction]) -> 'WorkloadProfile':
+        recordings = [
+            ColumnarRawAnnotatedAction.from_raw_annotated_action(recording)
+            if isinstance(recording, RawAnnotatedAction) else recording
+            for recording in recordings
+        ]
+        labels = {}
+        for label in Label:
+            labelled = [recording for recording in recordings if recording.label == label and len(recording)]
+            if labelled:
+                labels[label] = LabelProfile.fit(labelled)
+        if not labels:
+            raise ValueError("No recording to fit the profile on")
+
+        intensity = np.concatenate([recording.intensity for recording in recordings])
+        rest = intensity[intensity < REST_THRESHOLD]
+        punches = sum(recording.label == Label.PUNCH for recording in recordings)
+        return cls(
+            labels=labels,
+            punch_fraction=punches / len(recordings),
+            rest_level=float(np.median(rest)) if len(rest) >= 10 else DEFAULT_REST_LEVEL,
+            rest_noise=float(rest.std()) if len(rest) >= 10 else DEFAULT_REST_NOISE,
+        )
+
+    def save(self, path: Path) -> None:
+        with open(path, "w") as f:
+            json.dump({
+                "labels": {str(label): profile.to_dict() for label, profile in self.labels.items()},
+                "punch_fraction": self.punch_fraction,
+                "rest_level": self.rest_level,
+                "rest_noise": self.rest_noise,
+            }, f)
+
+    @classmethod
+    def load(cls, path: Path) -> 'WorkloadProfile':
+        with open(path) as f:
+            data = json.load(f)
+        return cls(
+            labels={Label.from_json_label(label): LabelProfile.from_dict(profile) for label, profile in data["labels"].items()},
+            punch_fraction=data["punch_fraction"],
+            rest_level=data["rest_level"],
+            rest_noise=data["rest_noise"],
+        )
+
+class SyntheticRecordingGenerator:
+    """Draws recordings and sessions from a `WorkloadProfile`.
+
+    Every recording takes the length and the normalized intensity envelope of a random
+    source recording of its label, a log-normal peak, multiplicative noise, a jittered
+    direction and sampling intervals drawn from the observed ones. The same seed always
+    produces the same recordings.
+
+    Args:
+        profile: the fitted statistics
+        seed: seed of the random generator
+        start_time: time of the first recording, the clock advances with every recording
+    """
+
+    def __init__(self, profile: WorkloadProfile, seed: int = 0, start_time: datetime = datetime(2025, 1, 1)):
+        self.profile = profile
+        self.rng = np.random.default_rng(seed)
+        self._clock = start_time
+        self._grid = np.linspace(0.0, 1.0, ENVELOPE_POINTS)
+
+    def recording(self, label: Label) -> ColumnarRawAnnotatedAction:
+        profile = self.profile.labels[label]
+        n = int(self.rng.choice(profile.lengths))
+        data, intervals = self._samples(profile, n)
+        return self._action(data, intervals, label)
+
+    def recordings(self, count: int, punch_fraction: float | None = None) -> Iterator[ColumnarRawAnnotatedAction]:
+        """Yields `count` recordings, punches with probability `punch_fraction`
+        (the fraction of the source recordings by default)."""
+        punch_fraction = self.profile.punch_fraction if punch_fraction is None else punch_fraction
+        available = list(self.profile.labels)
+        for _ in range(count):
+            label = Label.PUNCH if self.rng.random() < punch_fraction else Label.NOT_PUNCH
+            if label not in self.profile.labels:
+                label = available[0]
+            yield self.recording(label)
+
+    def session(
+        self,
+        punches: int,
+        rest_ms: tuple[int, int] = (300, 1500),
+        non_punch_fraction: float = 0.2,
+    ) -> tuple[ColumnarRawAnnotatedAction, np.ndarray]:
+        """A long recording of `punches` punches separated by rest, with some non punch movements.
+
+        Args:
+            punches: number of punches in the session
+            rest_ms: range of the rest before every movement
+            non_punch_fraction: probability of a non punch movement before every punch
+
+        Returns:
+            The session, labelled as punch, and a (n_movements, 3) array with start (inclusive),
+            end (exclusive) and label of every movement
+        """
+        rest_interval = max(1, int(np.median(np.concatenate([
+            profile.intervals for profile in self.profile.labels.values()
+        ]))))
+        parts, part_intervals, segments = [], [], []
+        count = 0
+        movements = []
+        for _ in range(punches):
+            if Label.NOT_PUNCH in self.profile.labels and self.rng.random() < non_punch_fraction:
+                movements.append(Label.NOT_PUNCH)
+            movements.append(Label.PUNCH)
+        for label in movements:
+            rest_samples = max(1, int(self.rng.integers(rest_ms[0], rest_ms[1] + 1)) // rest_interval)
+            parts.append(self._rest(rest_samples))
+            part_intervals.append(np.full(rest_samples, rest_interval, dtype=np.int64))
+            count += rest_samples
+
+            profile = self.profile.labels[label]
+            n = int(self.rng.choice(profile.lengths))
+            data, intervals = self._samples(profile, n)
+            parts.append(data)
+            part_intervals.append(intervals)
+            segments.append((count, count + n, label.value))
+            count += n
+        data = np.concatenate([np.empty((0, 3), np.float32), *parts])
+        intervals = np.concatenate([np.empty(0, np.int64), *part_intervals])
+        return self._action(data, intervals, Label.PUNCH), np.array(segments, dtype=np.int64).reshape(-1, 3)
+
+    def sessions(self, count: int, punches: int, **kwargs) -> Iterator[tuple[ColumnarRawAnnotatedAction, np.ndarray]]:
+        for _ in range(count):
+            yield self.session(punches, **kwargs)
+
+    def _samples(self, profile: LabelProfile, n: int) -> tuple[np.ndarray, np.ndarray]:
+        envelope = profile.envelopes[self.rng.integers(len(profile.envelopes))]
+        shape = np.interp(np.linspace(0.0, 1.0, n), self._grid, envelope)
+        peak = np.exp(self.rng.normal(profile.log_peak_mean, profile.log_peak_std))
+        intensity = np.maximum(peak * shape * (1.0 + profile.noise * self.rng.standard_normal(n)), 0.0)
+
+        # One direction per recording, jittered sample by sample
+        base = profile.direction_mean + profile.direction_std * self.rng.standard_normal(3)
+        directions = base + 0.25 * profile.direction_std * self.rng.standard_normal((n, 3))
+        directions /= np.maximum(np.linalg.norm(directions, axis=1, keepdims=True), 1e-9)
+
+        intervals = self.rng.choice(profile.intervals, size=n, p=profile.interval_probabilities).astype(np.int64)
+        return (intensity[:, None] * directions).astype(np.float32), intervals
+
+    def _rest(self, n: int) -> np.ndarray:
+        # Gravity on a slowly drifting axis plus sensor noise
+        axis = np.array([0.0, 0.0, 1.0]) + 0.1 * self.rng.standard_normal(3)
+        axis /= np.linalg.norm(axis)
+        noise = self.profile.rest_noise * self.rng.standard_normal((n, 3))
+        return (self.profile.rest_level * axis + noise).astype(np.float32)
+
+    def _action(self, data: np.ndarray, intervals: np.ndarray, label: Label) -> ColumnarRawAnnotatedAction:
+        start_ms = int(self._clock.timestamp() * 1000)
+        impulse_timestamps = start_ms + np.cumsum(intervals) - (intervals[0] if len(intervals) else 0)
+        timestamp = self._clock.strftime(TIMESTAMP_FORMAT)
+        duration_ms = int(impulse_timestamps[-1] - start_ms) if len(intervals) else 0
+        self._clock += timedelta(milliseconds=duration_ms + 1000)
+        return ColumnarRawAnnotatedAction(
+            data=data,
+            impulse_timestamps=impulse_timestamps.astype(np.int64),
+            label=label,
+            timestamp=timestamp,
+            file_path="",
+        )
+
+def write_json(recordings: Iterable[ColumnarRawAnnotatedAction], output_dir: Path) -> int:
+    """Writes every recording to `output_dir` as `<label>_<timestamp>.json`, like the recorded data."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for recording in recordings:
+        data = recording.to_dict()
+        del data["file_path"]
+        with open(output_dir / f"{recording.label}_{recording.timestamp}.json", "w") as f:
+            json.dump(data, f)
+        written += 1
+    return written
+
+def write_shards(recordings: Iterable[ColumnarRawAnnotatedAction], output_dir: Path, shard_size: int = 100_000) -> list[Path]:
+    """Packs the recordings into shards of at most `shard_size` recordings,
+    named `part-00000.shard`, `part-00001.shard`, ..."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    recordings = iter(recordings)
+    paths = []
+    while batch := list(islice(recordings, shard_size)):
+        paths.append(write_shard(batch, output_dir / f"part-{len(paths):05d}.shard"))
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic accelerometer recordings from the statistics of real ones")
+    parser.add_argument("output", type=Path, help="folder to write")
+    parser.add_argument("--source", type=Path, default=Path("data/filtered_training_data"), help="folder with the JSON recordings to fit")
+    parser.add_argument("--profile", type=Path, default=None, help="load the profile from this file instead of fitting it")
+    parser.add_argument("--save-profile", type=Path, default=None, help="write the fitted profile to this file")
+    parser.add_argument("--count", type=int, default=1000, help="number of recordings")
+    parser.add_argument("--punch-fraction", type=float, default=None)
+    parser.add_argument("--sessions", type=int, default=0, help="number of multi punch sessions, written instead of recordings")
+    parser.add_argument("--punches", type=int, default=100, help="punches per session")
+    parser.add_argument("--format", choices=("json", "shard"), default="json")
+    parser.add_argument("--shard-size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.profile:
+        profile = WorkloadProfile.load(args.profile)
+    else:
+        files = sorted(glob.glob(str(args.source / "*.json")))
+        if not files:
+            raise ValueError(f"No JSON recordings in {args.source}")
+        profile = WorkloadProfile.fit(load_recordings(files, columnar=True))
+    if args.save_profile:
+        profile.save(args.save_profile)
+
+    generator = SyntheticRecordingGenerator(profile, seed=args.seed)
+    if args.sessions:
+        sessions = list(generator.sessions(args.sessions, args.punches))
+        recordings = [recording for recording, _ in sessions]
+        args.output.mkdir(parents=True, exist_ok=True)
+        with open(args.output / SEGMENTS_FILE, "w") as f:
+            json.dump({recording.timestamp: segments.tolist() for recording, segments in sessions}, f)
+    else:
+        recordings = generator.recordings(args.count, punch_fraction=args.punch_fraction)
+
+    if args.format == "json":
+        print(f"Written {write_json(recordings, args.output)} recordings to {args.output}")
+    else:
+        paths = write_shards(recordings, args.output, args.shard_size)
+        print(f"Written {len(paths)} shards to {args.output}")
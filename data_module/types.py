@@ -85,6 +85,99 @@ class RawAnnotatedAction:
             self._max_impulse = max(self.impulses, key=lambda x: x.intensity).intensity
         return self._max_impulse
 
+@dataclass
+class ColumnarRawAnnotatedAction:
+    """
+    Array backed version of RawAnnotatedAction, it holds no Python object per impulse.
+
+    The accelerations are stored row major in a single (n, 3) float32 array so that
+    x, y, z are column views and the conversion to AnnotatedAction shares the memory.
+
+    Args:
+        data: A (n, 3) float32 array with the x, y, z accelerations of each impulse.
+        impulse_timestamps: A (n,) int64 array with the timestamp in ms of each impulse.
+        label: The label associated with the action.
+        timestamp: The timestamp of the action.
+    """
+    data: np.ndarray
+    impulse_timestamps: np.ndarray
+    label: Label
+    timestamp: str
+    file_path: str
+
+    @classmethod
+    def from_json(cls, data: dict, file_path: str) -> 'ColumnarRawAnnotatedAction':
+        impulses = data.get("data", [])
+        values = np.fromiter(
+            (value for impulse in impulses for value in (impulse["x"], impulse["y"], impulse["z"])),
+            dtype=np.float32,
+            count=3 * len(impulses),
+        ).reshape(-1, 3)
+        impulse_timestamps = np.fromiter(
+            (impulse["timestamp"] for impulse in impulses), dtype=np.int64, count=len(impulses)
+        )
+        label = Label.from_json_label(data.get("label", "NOT_PUNCH"))
+        timestamp = data.get("timestamp", "")
+        return cls(
+            data=values,
+            impulse_timestamps=impulse_timestamps,
+            label=label,
+            timestamp=timestamp,
+            file_path=file_path,
+        )
+
+    @classmethod
+    def from_raw_annotated_action(cls, action: RawAnnotatedAction) -> 'ColumnarRawAnnotatedAction':
+        return cls(
+            data=np.array([[m.x, m.y, m.z] for m in action.impulses], dtype=np.float32).reshape(-1, 3),
+            impulse_timestamps=np.array([int(m.timestamp) for m in action.impulses], dtype=np.int64),
+            label=action.label,
+            timestamp=action.timestamp,
+            file_path=action.file_path,
+        )
+
+    def to_raw_annotated_action(self) -> RawAnnotatedAction:
+        impulses = [
+            RawImpulseMeasure(timestamp=t, x=x, y=y, z=z)
+            for t, (x, y, z) in zip(self.impulse_timestamps.tolist(), self.data.tolist())
+        ]
+        return RawAnnotatedAction(impulses=impulses, label=self.label, timestamp=self.timestamp, file_path=self.file_path)
+
+    def to_dict(self):
+        return {
+            "label": str(self.label),
+            "timestamp": self.timestamp,
+            "file_path": self.file_path,
+            "data": [
+                {"timestamp": t, "x": x, "y": y, "z": z}
+                for t, (x, y, z) in zip(self.impulse_timestamps.tolist(), self.data.tolist())
+            ],
+        }
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.data[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.data[:, 1]
+
+    @property
+    def z(self) -> np.ndarray:
+        return self.data[:, 2]
+
+    @property
+    def intensity(self) -> np.ndarray:
+        """The norm of the acceleration of each impulse."""
+        return np.sqrt(np.einsum("ij,ij->i", self.data, self.data))
+
+    @property
+    def max_impulse(self) -> float:
+        return float(self.intensity.max())
+
 @dataclass
 class AnnotatedAction:
     """This class holds the annotated action data after passing through the feature extractor."""
@@ -93,8 +186,11 @@ class AnnotatedAction:
     timestamp: str
 
     @classmethod
-    def from_raw_annotated_action(cls, action: RawAnnotatedAction) -> 'AnnotatedAction':
-        """Convert a RawAnnotatedAction to an AnnotatedAction."""
+    def from_raw_annotated_action(cls, action: RawAnnotatedAction | ColumnarRawAnnotatedAction) -> 'AnnotatedAction':
+        """Convert a RawAnnotatedAction to an AnnotatedAction.
+        A ColumnarRawAnnotatedAction is converted without copying its impulses."""
+        if isinstance(action, ColumnarRawAnnotatedAction):
+            return cls(data=action.data, label=action.label, timestamp=action.timestamp)
         data = np.array([[measure.x, measure.y, measure.z] for measure in action.impulses])
         return cls(
             data=data, 
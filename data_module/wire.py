@@ -0,0 +1,68 @@
+import struct
+
+import numpy as np
+from data_module.types import ColumnarRawAnnotatedAction, Label
+
+MIMETYPE = "application/x-boxe-frame"
+MAGIC = b"BXFR"
+VERSION = 1
+
+# magic, version, label, sample count, action timestamp; padded to 24 bytes
+# so that the int64 timestamps that follow are 8-byte aligned
+HEADER = struct.Struct("<4sBB2xIq4x")
+
+class WireFormatError(ValueError):
+    """Raised when a binary sensor frame is truncated or malformed."""
+
+def encode_frame(
+    data: np.ndarray,
+    impulse_timestamps: np.ndarray,
+    label: Label = Label.NOT_PUNCH,
+    timestamp: int = 0,
+) -> bytes:
+    """Packs a window of samples into the binary upload format.
+
+    The frame is a little-endian header followed by the n int64 sample timestamps (ms)
+    and by the n * 3 float32 accelerations, interleaved as x, y, z.
+
+    Args:
+        data: (n, 3) accelerations
+        impulse_timestamps: (n,) timestamps in ms
+        label: the label of the window
+        timestamp: the window timestamp, the digits of the JSON "timestamp" string
+    """
+    data = np.ascontiguousarray(data, dtype="<f4").reshape(-1, 3)
+    impulse_timestamps = np.ascontiguousarray(impulse_timestamps, dtype="<i8")
+    if len(data) != len(impulse_timestamps):
+        raise WireFormatError(f"{len(data)} samples but {len(impulse_timestamps)} timestamps")
+    header = HEADER.pack(MAGIC, VERSION, label.value, len(data), timestamp)
+    return header + impulse_timestamps.tobytes() + data.tobytes()
+
+def decode_frame(buffer: bytes, file_path: str = "") -> ColumnarRawAnnotatedAction:
+    """Decodes a frame written by `encode_frame` without creating a Python object per sample.
+
+    The arrays are read only views on `buffer`.
+    """
+    if len(buffer) < HEADER.size:
+        raise WireFormatError(f"Frame too short: {len(buffer)} bytes")
+    magic, version, label, count, timestamp = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise WireFormatError(f"Bad magic {magic!r}")
+    if version != VERSION:
+        raise WireFormatError(f"Unsupported frame version {version}")
+    expected = HEADER.size + count * (8 + 3 * 4)
+    if len(buffer) != expected:
+        raise WireFormatError(f"Frame of {count} samples should be {expected} bytes, got {len(buffer)}")
+    impulse_timestamps = np.frombuffer(buffer, dtype="<i8", count=count, offset=HEADER.size)
+    data = np.frombuffer(buffer, dtype="<f4", count=3 * count, offset=HEADER.size + 8 * count).reshape(-1, 3)
+    try:
+        label = Label(label)
+    except ValueError:
+        raise WireFormatError(f"Unknown label {label}")
+    return ColumnarRawAnnotatedAction(
+        data=data,
+        impulse_timestamps=impulse_timestamps,
+        label=label,
+        timestamp=str(timestamp),
+        file_path=file_path,
+    )
@@ -1,46 +1,85 @@
 from google.cloud import firestore
-from flask_login import UserMixin
-from datetime import datetime
+from google.api_core import exceptions as api_exceptions
 from typing import List, Dict, Optional, Tuple
-
-
-class User(UserMixin):
-    """Classe User per Flask-Login"""
-
-    def __init__(self, user_id: str, username: str, email: str):
-        self.id = user_id
-        self.username = username
-        self.email = email
-
-    def __repr__(self):
-        return f'<User {self.username}>'
-
-
-class DBManager:
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+import numpy as np
+
+from storage_backend import (
+    ACCELERATION_CHUNK_MAX_SAMPLES,
+    SESSION_LIST_FIELDS,
+    SESSION_PAGE_SIZE,
+    SESSION_STATS_FIELDS,
+    StorageBackend,
+    User,
+    add_session_contribution,
+    apply_punch_stats,
+    concatenate_acceleration_chunks,
+    decode_acceleration_chunk,
+    empty_user_stats,
+    encode_acceleration_chunk,
+    user_stats_summary,
+)
+
+# Numero massimo di operazioni in un singolo WriteBatch di Firestore
+FIRESTORE_BATCH_LIMIT = 500
+# Documenti 'acceleration_chunks' per batch, per restare sotto i 10 MiB per richiesta
+ACCELERATION_CHUNKS_PER_BATCH = 50
+# Errori per cui ha senso ripetere il commit di un batch
+TRANSIENT_ERRORS = (
+    api_exceptions.Aborted,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.TooManyRequests,
+)
+
+
+class DBManager(StorageBackend):
     """Classe per gestire tutte le operazioni con Firestore"""
 
-    def __init__(self, credentials_path: str = 'credentials.json', database: str = 'boxeproject'):
+    def __init__(self, credentials_path: str = 'credentials.json', database: str = 'boxeproject',
+                 user_cache_size: int = 1024, user_cache_ttl: float = 60.0, client=None):
         """
         Inizializza il client Firestore
 
         Args:
             credentials_path: Percorso del file delle credenziali
             database: Nome del database Firestore
+            user_cache_size: Numero massimo di utenti tenuti in memoria da load_user
+            user_cache_ttl: Secondi dopo i quali un utente in cache viene riletto
+            client: Client già creato da usare al posto di quello delle credenziali,
+                ad esempio InMemoryFirestoreClient nei benchmark
         """
-        self.db = firestore.Client.from_service_account_json(credentials_path, database=database)
+        super().__init__(user_cache_size=user_cache_size, user_cache_ttl=user_cache_ttl)
+        if client is None:
+            client = firestore.Client.from_service_account_json(credentials_path, database=database)
+        self.db = client
 
     # ==================== USER OPERATIONS ====================
 
-    def load_user(self, user_id: str) -> Optional[User]:
+    def update_user(self, user_id: str, updates: Dict) -> bool:
         """
-        Carica un utente dal database per Flask-Login
+        Aggiorna il profilo di un utente e lo scarta dalla cache
 
         Args:
             user_id: ID dell'utente
+            updates: Dizionario con i campi da aggiornare
 
         Returns:
-            User object o None se non trovato
+            True se aggiornamento riuscito, False altrimenti
         """
+        try:
+            self.db.collection('users').document(user_id).update(updates)
+            return True
+        except Exception as e:
+            print(f"Error updating user: {e}")
+            return False
+        finally:
+            self.invalidate_user(user_id)
+
+    def _read_user(self, user_id: str) -> Optional[User]:
         try:
             user_doc = self.db.collection('users').document(user_id).get()
             if user_doc.exists:
@@ -172,49 +211,129 @@ class DBManager:
             print(f"Error getting user sessions: {e}")
             return []
 
-    def get_user_stats(self, user_id: str) -> Dict:
+    def get_user_sessions_page(self, user_id: str, page_size: int = SESSION_PAGE_SIZE,
+                               cursor: Optional[str] = None,
+                               with_duration: bool = False) -> Tuple[List[Dict], Optional[str]]:
         """
-        Calcola le statistiche dell'utente
+        Recupera una pagina delle sessioni con pugni di un utente, dalla più recente
+
+        Filtro, ordinamento e proiezione sono eseguiti da Firestore, che restituisce solo
+        i campi in SESSION_LIST_FIELDS; richiede l'indice composto
+        (user_id ASC, date DESC, punch_count ASC) sulla collezione 'training_sessions',
+        e (user_id ASC, date DESC, duration ASC, punch_count ASC) con with_duration.
 
         Args:
             user_id: ID dell'utente
+            page_size: Numero massimo di sessioni nella pagina
+            cursor: ID dell'ultima sessione della pagina precedente, None per la prima pagina
+            with_duration: Esclude anche le sessioni con durata 0
 
         Returns:
-            Dizionario con statistiche (session_count, total_punches, avg_intensity)
+            Tupla (lista di dizionari con i dati delle sessioni, cursore della pagina
+            successiva o None se non ci sono altre sessioni)
         """
         try:
-            sessions_data = self.get_user_sessions(user_id)
+            sessions_query = (
+                self.db.collection('training_sessions')
+                .where('user_id', '==', user_id)
+                .where('punch_count', '>', 0)
+            )
+            if with_duration:
+                sessions_query = sessions_query.where('duration', '>', 0)
+            sessions_query = (
+                sessions_query
+                .order_by('date', direction=firestore.Query.DESCENDING)
+                .select(list(SESSION_LIST_FIELDS))
+            )
+            if cursor:
+                cursor_doc = self.db.collection('training_sessions').document(cursor).get()
+                if not cursor_doc.exists or cursor_doc.to_dict().get('user_id') != user_id:
+                    return [], None
+                sessions_query = sessions_query.start_after(cursor_doc)
+
+            # Un documento in più dice se esiste una pagina successiva
+            sessions = list(sessions_query.limit(page_size + 1).stream())
+            has_next = len(sessions) > page_size
+            sessions = sessions[:page_size]
 
-            valid_sessions = []
-            total_punches = 0
-            total_intensity = 0
-            intensity_count = 0
-
-            for session in sessions_data:
-                punch_count = session.get('punch_count', 0)
+            sessions_data = []
+            for sess in sessions:
+                session_data = sess.to_dict()
+                sessions_data.append({
+                    'id': sess.id,
+                    'date': session_data.get('date', ''),
+                    'duration': session_data.get('duration', 0),
+                    'punch_count': session_data.get('punch_count', 0),
+                    'avg_intensity': session_data.get('avg_intensity', 0)
+                })
 
-                if punch_count == 0:
-                    continue
+            next_cursor = sessions_data[-1]['id'] if has_next else None
+            return sessions_data, next_cursor
+        except Exception as e:
+            print(f"Error getting user sessions page: {e}")
+            return [], None
 
-                valid_sessions.append(session)
-                total_punches += punch_count
+    def get_user_stats(self, user_id: str) -> Dict:
+        """
+        Legge le statistiche dell'utente dal documento aggregato 'user_stats'
 
-                if session.get('avg_intensity', 0) > 0:
-                    total_intensity += session.get('avg_intensity', 0)
-                    intensity_count += 1
+        Il documento viene aggiornato a ogni modifica delle sessioni, quindi la lettura
+        costa un solo documento. Se manca (utenti precedenti all'aggregato) viene ricostruito.
 
-            session_count = len(valid_sessions)
-            avg_intensity = round(total_intensity / intensity_count, 2) if intensity_count > 0 else 0
+        Args:
+            user_id: ID dell'utente
 
-            return {
-                'session_count': session_count,
-                'total_punches': total_punches,
-                'avg_intensity': avg_intensity
-            }
+        Returns:
+            Dizionario con statistiche (session_count, total_punches, avg_intensity)
+        """
+        try:
+            stats_doc = self.db.collection('user_stats').document(user_id).get()
+            if stats_doc.exists:
+                return user_stats_summary(stats_doc.to_dict())
+            return user_stats_summary(self.rebuild_user_stats(user_id))
         except Exception as e:
             print(f"Error calculating user stats: {e}")
             return {'session_count': 0, 'total_punches': 0, 'avg_intensity': 0}
 
+    def rebuild_user_stats(self, user_id: str) -> Dict:
+        """
+        Ricalcola da zero il documento aggregato di un utente leggendo tutte le sue sessioni
+
+        Args:
+            user_id: ID dell'utente
+
+        Returns:
+            Il documento aggregato scritto
+        """
+        totals = empty_user_stats()
+        for session_data in self.get_user_sessions(user_id):
+            add_session_contribution(totals, session_data, 1)
+        self.db.collection('user_stats').document(user_id).set(totals)
+        return totals
+
+    def rebuild_all_user_stats(self) -> int:
+        """
+        Ricalcola i documenti aggregati di tutti gli utenti con una sola lettura delle sessioni
+
+        Returns:
+            Numero di documenti aggregati scritti
+        """
+        totals_by_user: Dict[str, Dict] = {}
+        for user in self.db.collection('users').select([]).stream():
+            totals_by_user[user.id] = empty_user_stats()
+        for sess in self.db.collection('training_sessions').select(['user_id', *SESSION_STATS_FIELDS]).stream():
+            session_data = sess.to_dict()
+            totals = totals_by_user.setdefault(session_data.get('user_id'), empty_user_stats())
+            add_session_contribution(totals, session_data, 1)
+        totals_by_user.pop(None, None)
+
+        stats_ref = self.db.collection('user_stats')
+        operations = [(stats_ref.document(user_id), totals) for user_id, totals in totals_by_user.items()]
+        report = self._commit_in_batches(operations, FIRESTORE_BATCH_LIMIT)
+        if report['failed']:
+            print(f"Error rebuilding user stats: {report['failed']} of {len(operations)} not saved")
+        return report['written']
+
     def create_training_session(self, user_id: str, date_str: str) -> Optional[str]:
         """
         Crea una nuova sessione di allenamento
@@ -231,6 +350,7 @@ class DBManager:
                 'user_id': user_id,
                 'date': date_str,
                 'avg_intensity': 0,
+                'intensity_sum': 0,
                 'duration': 0,
                 'punch_count': 0
             }
@@ -275,6 +395,9 @@ class DBManager:
         """
         try:
             session_ref = self.db.collection('training_sessions').document(session_id)
+            if any(field in updates for field in SESSION_STATS_FIELDS):
+                # Cambiano le statistiche: aggiorna anche l'aggregato dell'utente
+                return self._change_session(session_ref, lambda session_data: updates)
             session_ref.update(updates)
             return True
         except Exception as e:
@@ -293,66 +416,37 @@ class DBManager:
         """
         try:
             session_ref = self.db.collection('training_sessions').document(session_id)
-            session_ref.delete()
+            self._change_session(session_ref, lambda session_data: None)
             return True
         except Exception as e:
             print(f"Error deleting training session: {e}")
             return False
 
-    def calculate_session_duration(self, session_id: str) -> Optional[float]:
-        """
-        Calcola e aggiorna la durata di una sessione
-
-        Args:
-            session_id: ID della sessione
-
-        Returns:
-            Durata in minuti o None se errore
-        """
-        try:
-            session_data = self.get_training_session(session_id)
-            if not session_data:
-                return None
-
-            start_time_str = session_data.get('date')
-            start_time = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
-            end_time = datetime.now()
-            duration_seconds = int((end_time - start_time).total_seconds())
-            duration_minutes = round(duration_seconds / 60, 2)
-
-            # Aggiorna la sessione con la durata
-            self.update_training_session(session_id, {'duration': duration_minutes})
-
-            return duration_minutes
-        except Exception as e:
-            print(f"Error calculating session duration: {e}")
-            return None
-
     # ==================== ACCELERATION DATA OPERATIONS ====================
 
-    def save_accelerations(self, accelerations: List[Dict]) -> bool:
+    def save_accelerations_bulk(self, accelerations: List[Dict], workers: int = 4, max_retries: int = 3) -> Dict:
         """
-        Salva un batch di accelerazioni
+        Salva un numero qualsiasi di accelerazioni in batch da FIRESTORE_BATCH_LIMIT documenti
+
+        I batch vengono inviati in parallelo da al massimo `workers` thread; un batch fallito
+        per un errore transitorio viene ripetuto fino a `max_retries` volte con backoff esponenziale.
 
         Args:
             accelerations: Lista di dizionari con i dati delle accelerazioni
+            workers: Numero di batch inviati contemporaneamente
+            max_retries: Tentativi aggiuntivi per batch
 
         Returns:
-            True se salvataggio riuscito, False altrimenti
+            Dizionario con documenti scritti ('written') e non scritti ('failed'),
+            batch totali ('batches') e falliti ('failed_batches')
         """
-        try:
-            accelerations_ref = self.db.collection('accelerations')
-            batch = self.db.batch()
-
-            for acceleration in accelerations:
-                doc_ref = accelerations_ref.document()
-                batch.set(doc_ref, acceleration)
-
-            batch.commit()
-            return True
-        except Exception as e:
-            print(f"Error saving accelerations: {e}")
-            return False
+        accelerations_ref = self.db.collection('accelerations')
+        # Gli ID sono generati dal client, ripetere un batch non duplica i documenti
+        operations = [(accelerations_ref.document(), acceleration) for acceleration in accelerations]
+        report = self._commit_in_batches(operations, FIRESTORE_BATCH_LIMIT, workers, max_retries)
+        if report['failed']:
+            print(f"Error saving accelerations: {report['failed']} of {len(accelerations)} not saved")
+        return report
 
     def get_session_accelerations(self, session_id: str) -> List[Dict]:
         """
@@ -380,66 +474,138 @@ class DBManager:
             print(f"Error getting session accelerations: {e}")
             return []
 
-    def delete_session_accelerations(self, session_id: str) -> bool:
+    def save_acceleration_arrays(self, session_id: str, x: np.ndarray, y: np.ndarray,
+                                 z: np.ndarray, timestamps: np.ndarray) -> bool:
         """
-        Elimina tutte le accelerazioni di una sessione
+        Salva una serie di accelerazioni in documenti di al massimo ACCELERATION_CHUNK_MAX_SAMPLES campioni
 
         Args:
             session_id: ID della sessione
+            x, y, z: Accelerazioni lungo i tre assi
+            timestamps: Timestamp in ms di ogni campione
 
         Returns:
-            True se eliminazione riuscita, False altrimenti
+            True se salvataggio riuscito, False altrimenti
+        """
+        chunks_ref = self.db.collection('acceleration_chunks')
+        operations = []
+        for start in range(0, len(timestamps), ACCELERATION_CHUNK_MAX_SAMPLES):
+            end = start + ACCELERATION_CHUNK_MAX_SAMPLES
+            chunk = encode_acceleration_chunk(session_id, x[start:end], y[start:end], z[start:end], timestamps[start:end])
+            operations.append((chunks_ref.document(), chunk))
+        report = self._commit_in_batches(operations, ACCELERATION_CHUNKS_PER_BATCH)
+        if report['failed']:
+            print(f"Error saving acceleration chunks: {report['failed']} of {len(operations)} not saved")
+        return report['failed'] == 0
+
+    def get_session_acceleration_series(self, session_id: str) -> Dict[str, np.ndarray]:
+        """
+        Ricostruisce la serie temporale delle accelerazioni di una sessione
+
+        Args:
+            session_id: ID della sessione
+
+        Returns:
+            Dizionario con gli array 'timestamp', 'x', 'y', 'z' ordinati per timestamp
         """
         try:
-            accelerations_ref = self.db.collection('accelerations')
-            accelerations_query = accelerations_ref.where('training_session_id', '==', session_id)
-            accelerations_docs = list(accelerations_query.stream())
+            chunks_query = self.db.collection('acceleration_chunks').where('training_session_id', '==', session_id)
+            chunks = [decode_acceleration_chunk(chunk_doc.to_dict()) for chunk_doc in chunks_query.stream()]
+        except Exception as e:
+            print(f"Error getting session acceleration series: {e}")
+            chunks = []
+        return concatenate_acceleration_chunks(chunks)
 
-            for acc_doc in accelerations_docs:
-                acc_doc.reference.delete()
+    def delete_session_accelerations(self, session_id: str, workers: int = 4) -> bool:
+        """
+        Elimina tutte le accelerazioni di una sessione
 
-            return True
+        I documenti vengono eliminati con WriteBatch da FIRESTORE_BATCH_LIMIT operazioni,
+        inviati in parallelo da `workers` thread.
+
+        Args:
+            session_id: ID della sessione
+            workers: Numero di batch inviati contemporaneamente
+
+        Returns:
+            True se eliminazione riuscita, False altrimenti
+        """
+        try:
+            references = []
+            for collection in ('accelerations', 'acceleration_chunks'):
+                accelerations_ref = self.db.collection(collection)
+                accelerations_query = accelerations_ref.where('training_session_id', '==', session_id)
+                # Servono solo i riferimenti, la proiezione vuota non scarica i campi
+                references.extend(acc_doc.reference for acc_doc in accelerations_query.select([]).stream())
+
+            operations = [(reference, None) for reference in references]
+            return self._commit_in_batches(operations, FIRESTORE_BATCH_LIMIT, workers)['failed'] == 0
         except Exception as e:
             print(f"Error deleting session accelerations: {e}")
             return False
 
-    # ==================== UTILITY METHODS ====================
-
-    def process_punch_data(self, data: List[Dict], session_id: str) -> Tuple[List[Dict], int, float]:
+    def _commit_in_batches(self, operations: List[Tuple], batch_size: int,
+                           workers: int = 4, max_retries: int = 3) -> Dict:
         """
-        Processa i dati dei pugni e prepara le accelerazioni
+        Scrive le operazioni in WriteBatch da `batch_size` inviati in parallelo
 
         Args:
-            data: Lista di punti con coordinate x, y, z
-            session_id: ID della sessione
+            operations: Lista di (riferimento, dati); dati None indica un'eliminazione
+            batch_size: Operazioni per batch, al massimo FIRESTORE_BATCH_LIMIT
+            workers: Numero di batch inviati contemporaneamente
+            max_retries: Tentativi aggiuntivi per un batch fallito con un errore transitorio
 
         Returns:
-            Tupla con (accelerazioni, nuovo_count_pugni, intensità_totale_nuova)
-        """
-        new_accelerations = []
-        total_new_intensity = 0
-
-        for point in data:
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-            x = point.get('x', 0)
-            y = point.get('y', 0)
-            z = point.get('z', 0)
-
-            new_acceleration = {
-                'training_session_id': session_id,
-                'timestamp': now,
-                'acceleration_x': x,
-                'acceleration_y': y,
-                'acceleration_z': z,
-            }
-            new_accelerations.append(new_acceleration)
+            Dizionario con 'written', 'failed', 'batches', 'failed_batches'
+        """
+        batch_size = min(batch_size, FIRESTORE_BATCH_LIMIT)
+        chunks = [operations[i:i + batch_size] for i in range(0, len(operations), batch_size)]
+
+        def commit(chunk) -> bool:
+            for attempt in range(max_retries + 1):
+                batch = self.db.batch()
+                for reference, data in chunk:
+                    if data is None:
+                        batch.delete(reference)
+                    else:
+                        batch.set(reference, data)
+                try:
+                    batch.commit()
+                    return True
+                except TRANSIENT_ERRORS as e:
+                    if attempt == max_retries:
+                        print(f"Error committing batch after {attempt + 1} attempts: {e}")
+                        return False
+                    time.sleep(0.1 * 2 ** attempt * (1 + random.random()))
+                except Exception as e:
+                    print(f"Error committing batch: {e}")
+                    return False
+            return False
 
-        return new_accelerations, len(new_accelerations), total_new_intensity
+        if len(chunks) <= 1 or workers <= 1:
+            results = [commit(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                results = list(executor.map(commit, chunks))
+
+        failed = sum(len(chunk) for chunk, success in zip(chunks, results) if not success)
+        return {
+            'written': len(operations) - failed,
+            'failed': failed,
+            'batches': len(chunks),
+            'failed_batches': results.count(False),
+        }
+
+    # ==================== UTILITY METHODS ====================
 
     def update_session_stats(self, session_id: str, new_punch_count: int, new_intensity: float) -> bool:
         """
         Aggiorna le statistiche di una sessione con nuovi dati
 
+        La lettura e la scrittura avvengono in una transazione, così aggiornamenti
+        concorrenti della stessa sessione non perdono incrementi. Nella stessa
+        transazione viene aggiornato il documento aggregato dell'utente.
+
         Args:
             session_id: ID della sessione
             new_punch_count: Numero di nuovi pugni
@@ -449,25 +615,50 @@ class DBManager:
             True se aggiornamento riuscito, False altrimenti
         """
         try:
-            session_data = self.get_training_session(session_id)
-            if not session_data:
-                return False
+            session_ref = self.db.collection('training_sessions').document(session_id)
 
-            # Dati attuali
-            current_punch_count = session_data.get('punch_count', 0)
-            current_total_intensity = session_data.get('avg_intensity',
-                                                       0) * current_punch_count if current_punch_count > 0 else 0
-
-            # Nuovi totali
-            total_punches = current_punch_count + new_punch_count
-            total_intensity = current_total_intensity + new_intensity
-            avg_intensity = round(total_intensity / total_punches, 2) if total_punches > 0 else 0
-
-            # Aggiorna la sessione
-            return self.update_training_session(session_id, {
-                'avg_intensity': avg_intensity,
-                'punch_count': total_punches
-            })
+            return self._change_session(
+                session_ref, lambda session_data: apply_punch_stats(session_data, new_punch_count, new_intensity))
         except Exception as e:
             print(f"Error updating session stats: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def _change_session(self, session_ref, compute_updates) -> bool:
+        """
+        Aggiorna o elimina una sessione e l'aggregato del suo utente in una transazione
+
+        Args:
+            session_ref: Riferimento alla sessione
+            compute_updates: Funzione che riceve i dati attuali della sessione e restituisce
+                i campi da aggiornare, oppure None per eliminarla
+
+        Returns:
+            True se la sessione esisteva, False altrimenti
+        """
+        @firestore.transactional
+        def apply_change(transaction) -> bool:
+            session_doc = session_ref.get(transaction=transaction)
+            if not session_doc.exists:
+                return False
+            session_data = session_doc.to_dict()
+            stats_ref = self.db.collection('user_stats').document(session_data.get('user_id', ''))
+            # Firestore richiede che tutte le letture precedano le scritture
+            stats_doc = stats_ref.get(transaction=transaction)
+
+            updates = compute_updates(session_data)
+            if updates is None:
+                transaction.delete(session_ref)
+            else:
+                transaction.update(session_ref, updates)
+
+            # Senza aggregato non c'è nulla da correggere: get_user_stats lo ricostruirà
+            if stats_doc.exists:
+                totals = stats_doc.to_dict()
+                add_session_contribution(totals, session_data, -1)
+                if updates is not None:
+                    add_session_contribution(totals, {**session_data, **updates}, 1)
+                transaction.set(stats_ref, totals)
+            return True
+
+        return apply_change(self.db.transaction())
+
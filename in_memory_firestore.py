@@ -0,0 +1,222 @@
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+# Stesso valore di google.cloud.firestore.Query.DESCENDING
+DESCENDING = 'DESCENDING'
+# Operazioni massime di un WriteBatch, come Firestore
+MAX_BATCH_OPERATIONS = 500
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+class InMemoryFirestoreClient:
+    """Client Firestore in memoria, per misurare DBManager senza rete né credenziali
+
+    Implementa solo la parte dell'API usata da DBManager: collection, document, add, where,
+    order_by, select, start_after, limit, stream, batch e transaction. Le query seguono le
+    regole di Firestore (documenti senza i campi filtrati o ordinati esclusi, parità risolte
+    per ID del documento); i documenti sono copiati in scrittura e in lettura.
+    """
+
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, dict]] = {}
+        self._lock = threading.RLock()
+        self.commits = 0
+
+    def collection(self, name: str) -> 'InMemoryCollection':
+        with self._lock:
+            self._collections.setdefault(name, {})
+        return InMemoryCollection(self, name)
+
+    def batch(self) -> 'InMemoryWriteBatch':
+        return InMemoryWriteBatch(self)
+
+    def transaction(self) -> 'InMemoryTransaction':
+        return InMemoryTransaction(self)
+
+    def _documents(self, collection: str) -> Dict[str, dict]:
+        return self._collections[collection]
+
+    def _apply(self, writes: List[Tuple[str, 'InMemoryDocumentReference', Optional[dict]]]) -> None:
+        with self._lock:
+            for operation, reference, data in writes:
+                documents = self._documents(reference.collection)
+                if operation == 'set':
+                    documents[reference.id] = dict(data)
+                elif operation == 'update':
+                    if reference.id not in documents:
+                        raise KeyError(f"Documento {reference.path} inesistente")
+                    documents[reference.id].update(data)
+                else:
+                    documents.pop(reference.id, None)
+            self.commits += 1
+
+
+class InMemoryDocumentSnapshot:
+    def __init__(self, reference: 'InMemoryDocumentReference', data: Optional[dict], fields: Optional[List[str]] = None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and fields is not None:
+            data = {field: data[field] for field in fields if field in data}
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return dict(self._data) if self._data is not None else None
+
+
+class InMemoryDocumentReference:
+    def __init__(self, client: InMemoryFirestoreClient, collection: str, document_id: str):
+        self._client = client
+        self.collection = collection
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection}/{self.id}"
+
+    def get(self, transaction: Optional['InMemoryTransaction'] = None) -> InMemoryDocumentSnapshot:
+        with self._client._lock:
+            return InMemoryDocumentSnapshot(self, self._client._documents(self.collection).get(self.id))
+
+    def set(self, data: dict) -> None:
+        self._client._apply([('set', self, data)])
+
+    def update(self, data: dict) -> None:
+        self._client._apply([('update', self, data)])
+
+    def delete(self) -> None:
+        self._client._apply([('delete', self, None)])
+
+
+class InMemoryQuery:
+    def __init__(self, client: InMemoryFirestoreClient, collection: str, filters: tuple = (),
+                 order: Optional[Tuple[str, str]] = None, fields: Optional[List[str]] = None,
+                 after: Optional[InMemoryDocumentSnapshot] = None, max_results: Optional[int] = None):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._order = order
+        self._fields = fields
+        self._after = after
+        self._max_results = max_results
+
+    def _copy(self, **changes) -> 'InMemoryQuery':
+        state = dict(filters=self._filters, order=self._order, fields=self._fields,
+                     after=self._after, max_results=self._max_results)
+        state.update(changes)
+        return InMemoryQuery(self._client, self._collection, **state)
+
+    def where(self, field: str, operator: str, value) -> 'InMemoryQuery':
+        if operator not in _OPERATORS:
+            raise ValueError(f"Operatore non supportato: {operator}")
+        return self._copy(filters=self._filters + ((field, operator, value),))
+
+    def order_by(self, field: str, direction: str = 'ASCENDING') -> 'InMemoryQuery':
+        return self._copy(order=(field, direction))
+
+    def select(self, fields: List[str]) -> 'InMemoryQuery':
+        return self._copy(fields=list(fields))
+
+    def start_after(self, snapshot: InMemoryDocumentSnapshot) -> 'InMemoryQuery':
+        return self._copy(after=snapshot)
+
+    def limit(self, count: int) -> 'InMemoryQuery':
+        return self._copy(max_results=count)
+
+    def stream(self) -> List[InMemoryDocumentSnapshot]:
+        with self._client._lock:
+            items = [
+                (document_id, dict(data))
+                for document_id, data in self._client._documents(self._collection).items()
+                if all(field in data and _OPERATORS[operator](data[field], value)
+                       for field, operator, value in self._filters)
+            ]
+        if self._order is not None:
+            field, direction = self._order
+            items = [item for item in items if field in item[1]]
+            items.sort(key=lambda item: (item[1][field], item[0]), reverse=direction == DESCENDING)
+        else:
+            items.sort(key=lambda item: item[0])
+        if self._after is not None:
+            ids = [document_id for document_id, _ in items]
+            items = items[ids.index(self._after.id) + 1:] if self._after.id in ids else []
+        if self._max_results is not None:
+            items = items[:self._max_results]
+        return [
+            InMemoryDocumentSnapshot(InMemoryDocumentReference(self._client, self._collection, document_id), data, self._fields)
+            for document_id, data in items
+        ]
+
+
+class InMemoryCollection(InMemoryQuery):
+    def __init__(self, client: InMemoryFirestoreClient, name: str):
+        super().__init__(client, name)
+
+    def document(self, document_id: Optional[str] = None) -> InMemoryDocumentReference:
+        # Come Firestore, senza ID viene generato un ID casuale di 20 caratteri
+        return InMemoryDocumentReference(self._client, self._collection, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, data: dict) -> Tuple[None, InMemoryDocumentReference]:
+        reference = self.document()
+        reference.set(data)
+        return None, reference
+
+
+class InMemoryWriteBatch:
+    def __init__(self, client: InMemoryFirestoreClient):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference: InMemoryDocumentReference, data: dict) -> None:
+        self._writes.append(('set', reference, data))
+
+    def update(self, reference: InMemoryDocumentReference, data: dict) -> None:
+        self._writes.append(('update', reference, data))
+
+    def delete(self, reference: InMemoryDocumentReference) -> None:
+        self._writes.append(('delete', reference, None))
+
+    def commit(self) -> None:
+        if len(self._writes) > MAX_BATCH_OPERATIONS:
+            raise ValueError(f"Un batch può contenere al massimo {MAX_BATCH_OPERATIONS} operazioni")
+        self._client._apply(self._writes)
+        self._writes = []
+
+
+class InMemoryTransaction(InMemoryWriteBatch):
+    """Transazione compatibile con il decoratore firestore.transactional
+
+    Le scritture sono applicate insieme al commit; gli attributi e i metodi con underscore
+    sono quelli che il decoratore chiama sulla transazione.
+    """
+
+    _max_attempts = 1
+    _read_only = False
+
+    def __init__(self, client: InMemoryFirestoreClient):
+        super().__init__(client)
+        self._id = None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id: Optional[bytes] = None) -> None:
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self) -> list:
+        self.commit()
+        self._clean_up()
+        return []
+
+    def _rollback(self) -> None:
+        self._clean_up()
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+INGESTION_POLICIES = ('reject', 'shed')
+
+
+class IngestionQueueFull(Exception):
+    """Sollevata da submit con politica 'reject' quando la coda è piena"""
+
+
+class AccelerationIngestionQueue:
+    """Coda limitata dei buffer di accelerazioni, scritti sul database da thread in background
+
+    /upload_data_buffer risponde appena il buffer è in coda, così i picchi di latenza del
+    database non diventano latenza delle richieste. Quando la coda contiene `max_queue_depth`
+    buffer la politica 'reject' rifiuta il nuovo buffer (IngestionQueueFull), la politica
+    'shed' scarta il buffer più vecchio in attesa. /end_session deve chiamare drain(session_id)
+    prima di leggere o eliminare le accelerazioni della sessione.
+    """
+
+    def __init__(self, write: Callable[[str, List[Dict]], bool], workers: int = 2,
+                 max_queue_depth: int = 1024, policy: str = 'reject'):
+        """
+        Args:
+            write: Funzione che scrive il buffer di una sessione, restituisce False se fallisce
+            workers: Numero di thread che scrivono in parallelo
+            max_queue_depth: Buffer in attesa oltre i quali si applica la politica
+            policy: 'reject' o 'shed'
+        """
+        if policy not in INGESTION_POLICIES:
+            raise ValueError(f"Politica sconosciuta: {policy}, disponibili: {', '.join(INGESTION_POLICIES)}")
+        self.write = write
+        self.max_queue_depth = max_queue_depth
+        self.policy = policy
+        self._queue = deque()  # (session_id, buffer, istante di accodamento)
+        self._condition = threading.Condition()
+        # Buffer accodati o in scrittura per sessione, usati da drain
+        self._in_flight: Dict[str, int] = {}
+        self._stopped = False
+        self._metrics = {
+            'submitted': 0,
+            'written': 0,
+            'failed': 0,
+            'rejected': 0,
+            'shed': 0,
+            'total_lag_ms': 0.0,
+            'max_lag_ms': 0.0,
+        }
+        self._workers = [
+            threading.Thread(target=self._run, name=f'ingestion-writer-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, session_id: str, data: List[Dict]) -> None:
+        """
+        Accoda un buffer senza attendere la scrittura
+
+        Args:
+            session_id: ID della sessione
+            data: Lista di punti con coordinate x, y, z ed eventuale timestamp in ms
+        """
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("La coda di ingestione è stata chiusa")
+            if len(self._queue) >= self.max_queue_depth:
+                if self.policy == 'reject':
+                    self._metrics['rejected'] += 1
+                    raise IngestionQueueFull(f"Coda di ingestione piena ({self.max_queue_depth} buffer in attesa)")
+                shed_session_id, _, _ = self._queue.popleft()
+                self._metrics['shed'] += 1
+                self._done(shed_session_id)
+            self._queue.append((session_id, data, time.perf_counter()))
+            self._in_flight[session_id] = self._in_flight.get(session_id, 0) + 1
+            self._metrics['submitted'] += 1
+            self._condition.notify_all()
+
+    def drain(self, session_id: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Attende che i buffer in coda siano scritti
+
+        Args:
+            session_id: Sessione da attendere, tutte se None
+            timeout: Secondi massimi di attesa, None per attendere senza limite
+
+        Returns:
+            True se non restano buffer in attesa, False se è scaduto il timeout
+        """
+        with self._condition:
+            if session_id is None:
+                return self._condition.wait_for(lambda: not self._in_flight, timeout=timeout)
+            return self._condition.wait_for(lambda: session_id not in self._in_flight, timeout=timeout)
+
+    def metrics(self) -> Dict[str, float]:
+        """Contatori dall'avvio, più profondità della coda, età del buffer più vecchio e ritardo medio"""
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics['queue_depth'] = len(self._queue)
+            metrics['oldest_pending_ms'] = (time.perf_counter() - self._queue[0][2]) * 1000 if self._queue else 0.0
+        processed = metrics['written'] + metrics['failed']
+        metrics['avg_lag_ms'] = metrics['total_lag_ms'] / processed if processed else 0.0
+        return metrics
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Smette di accettare buffer e ferma i thread dopo aver scritto quelli in coda"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+
+    def _done(self, session_id: str) -> None:
+        # Chiamata con il lock acquisito
+        remaining = self._in_flight[session_id] - 1
+        if remaining:
+            self._in_flight[session_id] = remaining
+        else:
+            del self._in_flight[session_id]
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._stopped)
+                if not self._queue:
+                    return
+                session_id, data, enqueued_at = self._queue.popleft()
+
+            try:
+                success = self.write(session_id, data)
+            except Exception as e:
+                print(f"Errore nella scrittura del buffer della sessione {session_id}: {e}")
+                success = False
+
+            lag_ms = (time.perf_counter() - enqueued_at) * 1000
+            with self._condition:
+                self._metrics['written' if success else 'failed'] += 1
+                self._metrics['total_lag_ms'] += lag_ms
+                self._metrics['max_lag_ms'] = max(self._metrics['max_lag_ms'], lag_ms)
+                self._done(session_id)
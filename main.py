@@ -1,34 +1,136 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from datetime import datetime
 import json
-import joblib
+import traceback
 from flask_login import LoginManager, current_user, login_user, logout_user, login_required
-from data_module.types import AnnotatedAction, RawAnnotatedAction
-from ml.model import PunchClassifier
+from data_module.types import AnnotatedAction, ColumnarRawAnnotatedAction
+from data_module import wire
+from ml.inference_queue import InferenceBatcher, InferenceQueueFull
+from ml.numpy_predictor import NumpyPunchClassifier
 from secret import secret_key
-from db_manager import DBManager
+from storage_backend import acceleration_points_to_arrays, create_storage_backend
+from session_timeseries import SessionTimeSeriesStore
+from session_stats import SessionStatsAggregator
+from resample import StreamSegmenter
+from ingestion_queue import AccelerationIngestionQueue, IngestionQueueFull
+import atexit
 import os
 
+# Il canale WebSocket è opzionale: senza flask-sock il browser usa le richieste HTTP
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secret_key
 
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
-# Inizializzazione DBManager
-db_manager = DBManager('credentials.json', 'boxeproject')
+sock = Sock(app) if Sock is not None else None
+
+# Inizializzazione del database: Firestore, oppure SQLite locale con STORAGE_BACKEND=sqlite
+if os.environ.get('STORAGE_BACKEND', 'firestore') == 'sqlite':
+    db_manager = create_storage_backend('sqlite', path=os.environ.get('SQLITE_PATH', 'data/boxeproject.db'))
+else:
+    db_manager = create_storage_backend('firestore', credentials_path='credentials.json', database='boxeproject')
+
+# Con TIMESERIES_ROOT le accelerazioni grezze vanno in file locali per sessione invece che nel database
+timeseries_store = SessionTimeSeriesStore(os.environ['TIMESERIES_ROOT']) if os.environ.get('TIMESERIES_ROOT') else None
+
+
+def write_acceleration_buffer(session_id, data):
+    # Il formato binario arriva già decodificato in array, il JSON come lista di punti
+    if isinstance(data, ColumnarRawAnnotatedAction):
+        arrays = (data.x, data.y, data.z, data.impulse_timestamps)
+    else:
+        arrays = acceleration_points_to_arrays(data)
+    if timeseries_store is not None:
+        # Aggiunge il buffer in coda ai file della sessione
+        timeseries_store.append(session_id, *arrays)
+        return True
+    # Salva l'intero buffer come un unico documento compatto
+    return db_manager.save_acceleration_arrays(session_id, *arrays)
+
+
+# I buffer di /upload_data_buffer vengono scritti in background, la risposta non li aspetta
+INGESTION_WORKERS = 2
+INGESTION_MAX_QUEUE_DEPTH = 1024
+INGESTION_POLICY = 'reject'  # 'shed' scarta il buffer più vecchio invece di rifiutare il nuovo
+INGESTION_DRAIN_TIMEOUT = 10
+ingestion_queue = AccelerationIngestionQueue(
+    write_acceleration_buffer,
+    workers=INGESTION_WORKERS,
+    max_queue_depth=INGESTION_MAX_QUEUE_DEPTH,
+    policy=INGESTION_POLICY,
+)
+atexit.register(ingestion_queue.close)
+
+# I pugni vengono accumulati in memoria e scritti sul database a intervalli
+session_stats = SessionStatsAggregator(db_manager, flush_interval=2.0, max_pending_punches=20)
+atexit.register(session_stats.close)
 
 # Caricamento modello ML
-model = PunchClassifier()
-model.model = joblib.load("trained_model.pkl")  # path relativo al file salvato
+# Il modello esportato in .npz non richiede sklearn, il .pkl resta come alternativa
+if os.path.exists("trained_model.npz"):
+    model = NumpyPunchClassifier.load("trained_model.npz")
+else:
+    import joblib
+    from ml.model import PunchClassifier
+    model = PunchClassifier()
+    model.model = joblib.load("trained_model.pkl")  # path relativo al file salvato
 print("Modello caricato, pronto per predizioni.")
 
-
-# Funzione per caricare l'utente (ora usa DBManager)
+# Le finestre delle sessioni concorrenti vengono raggruppate in un'unica predizione
+INFERENCE_MAX_BATCH_SIZE = 64
+INFERENCE_MAX_WAIT_MS = 5
+INFERENCE_MAX_QUEUE_DEPTH = 1024
+inference_batcher = InferenceBatcher(
+    model,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    max_queue_depth=INFERENCE_MAX_QUEUE_DEPTH,
+)
+# Segmentazione lato server del canale /stream_session, come HIGH_INTENSITY_THRESHOLD del browser
+STREAM_WINDOW_SIZE = 1
+STREAM_THRESHOLD = 25.0
+STREAM_MAX_RUN_LENGTH = 600  # 10 secondi a 60 Hz
+
+# Sessioni per pagina nei grafici di /training
+TRAINING_PAGE_SIZE = 100
+
+
+# Funzione per caricare l'utente (il backend tiene gli utenti in una cache con scadenza)
 @login_manager.user_loader
 def load_user(user_id):
     return db_manager.load_user(user_id)
 
+def classify_action(raw_action, features=None):
+    """Classifica una finestra e, se è un pugno, lo aggiunge alla sessione attiva
+
+    Con `features` (AnnotatedFeatures già accumulate da StreamSegmenter) la finestra non
+    viene riletta per estrarre le feature.
+    """
+    if features is None:
+        features = AnnotatedAction.from_raw_annotated_action(raw_action)
+    prediction = inference_batcher.predict(features)  # 0 o 1
+    label_str = "non_punch" if prediction == 0 else "punch"
+
+    if label_str == "punch":
+        # AGGIORNAMENTO DATABASE: Aggiorna il database con il pugno rilevato dal modello ML
+        if 'training_session_id' in session:
+            session_id = session['training_session_id']
+
+            # Calcola intensità massima dal buffer dei dati
+            peak_intensity = raw_action.max_impulse
+            session_stats.add_punch(session_id, peak_intensity)
+            print(f"Pugno registrato: +1 pugno, intensità {peak_intensity:.2f}")
+
+    return label_str
+
 def clear_training_session():
     keys_to_remove = [
         'training_user_id',
@@ -128,20 +230,15 @@ def dashboard():
 def stats():
     user_id = current_user.id
 
-    # Prendi SOLO le training sessions dell'utente con pugni (valid_only=True)
-    sessions_data = db_manager.get_user_sessions(user_id, valid_only=True)
-
-    # Filtro aggiuntivo per essere sicuri di escludere sessioni con 0 pugni o durata 0
-    valid_sessions = []
-    for session in sessions_data:
-        if session.get('punch_count', 0) > 0 and session.get('duration', 0) > 0:
-            valid_sessions.append(session)
+    cursor = request.args.get('cursor')
 
-    # Ordina per data (più recenti prima)
-    valid_sessions.sort(key=lambda x: x['date'], reverse=True)
+    # Una pagina di sessioni con pugni e durata, già filtrate e ordinate dal database
+    sessions_data, next_cursor = db_manager.get_user_sessions_page(user_id, cursor=cursor, with_duration=True)
 
     return render_template('stats.html',
-                           sessions=valid_sessions,
+                           sessions=sessions_data,
+                           next_cursor=next_cursor,
+                           is_first_page=cursor is None,
                            username=current_user.username)
 
 
@@ -164,7 +261,8 @@ def start_session():
 @login_required
 def active_training():
     return render_template('active_training.html',
-                           username=current_user.username)
+                           username=current_user.username,
+                           streaming_enabled=sock is not None)
 
 
 @app.route('/create_actual_session', methods=['POST'])
@@ -200,6 +298,11 @@ def end_session():
 
     if 'training_session_id' in session:
         session_id = session['training_session_id']
+        # Attende i buffer di accelerazioni ancora in coda
+        if not ingestion_queue.drain(session_id, timeout=INGESTION_DRAIN_TIMEOUT):
+            print(f"Buffer della sessione {session_id} ancora in coda dopo {INGESTION_DRAIN_TIMEOUT} s")
+        # Scrive i pugni ancora in memoria prima di leggere il conteggio
+        session_stats.flush(session_id)
         session_data = db_manager.get_training_session(session_id)
 
         if not session_data:
@@ -211,11 +314,14 @@ def end_session():
         duration_seconds = data.get("duration_seconds")
 
         if session_data.get('punch_count', 0) == 0 or duration_seconds is None:
-            db_manager.delete_session_accelerations(session_id)
+            # Le accelerazioni vengono eliminate in background, la risposta non le aspetta
+            deletion_job_id = db_manager.delete_session_accelerations_async(session_id)
+            if timeseries_store is not None:
+                timeseries_store.delete(session_id)
             db_manager.delete_training_session(session_id)
             flash('Nessun pugno rilevato, sessione eliminata.')
             clear_training_session()
-            return jsonify({'status': 'deleted', 'message': 'Sessione eliminata'}), 200
+            return jsonify({'status': 'deleted', 'message': 'Sessione eliminata', 'deletion_job_id': deletion_job_id}), 200
         else:
             if duration_seconds is not None:
                 duration_minutes = round(duration_seconds / 60, 2)
@@ -241,17 +347,21 @@ def upload_data_buffer():
         return 'No active session', 400
 
     try:
-        data = json.loads(request.values['data'])
+        if request.mimetype == wire.MIMETYPE:
+            try:
+                data = wire.decode_frame(request.get_data())
+            except wire.WireFormatError as e:
+                return f'Invalid frame: {e}', 400
+        else:
+            data = json.loads(request.values['data'])
         session_id = session['training_session_id']
 
-        # Processa i dati dei pugni usando DBManager
-        new_accelerations, new_punch_count, total_new_intensity = db_manager.process_punch_data(data, session_id)
-
-        # Salva le accelerazioni usando DBManager
-        if not db_manager.save_accelerations(new_accelerations):
-            return 'Error saving accelerations', 500
+        try:
+            ingestion_queue.submit(session_id, data)
+        except IngestionQueueFull:
+            return 'Server busy, retry later', 503
 
-        return 'Data saved successfully', 200
+        return 'Data queued', 202
 
     except Exception as e:
         print(f"Error saving data: {e}")
@@ -263,58 +373,163 @@ def upload_data_buffer():
 def training():
     user_id = current_user.id
 
-    # Prendi solo le sessioni valide (con pugni) usando DBManager
-    sessions_data = db_manager.get_user_sessions(user_id, valid_only=True)
-
-    # Ordina per data (più recenti prima)
-    sessions_data.sort(key=lambda x: x['date'], reverse=True)
+    # Solo le sessioni valide (con pugni): la prima pagina viene mostrata subito, le altre sono caricate dal browser da /sessions_page
+    sessions_data, next_cursor = db_manager.get_user_sessions_page(user_id, page_size=TRAINING_PAGE_SIZE)
 
     return render_template('training.html',
                            username=current_user.username,
-                           sessions=sessions_data)
+                           sessions=sessions_data,
+                           next_cursor=next_cursor)
+
+
+@app.route('/sessions_page')
+@login_required
+def sessions_page():
+    sessions_data, next_cursor = db_manager.get_user_sessions_page(
+        current_user.id, page_size=TRAINING_PAGE_SIZE, cursor=request.args.get('cursor'))
+    return jsonify({'sessions': sessions_data, 'next_cursor': next_cursor})
 
 
 @app.route('/save_high_intensity', methods=['POST'])
 def save_high_intensity():
     try:
-        data = request.get_json()
-        if data is None:
-            return jsonify({"status": "error", "message": "Nessun JSON ricevuto"}), 400
-
-        raw_action = RawAnnotatedAction.from_json(data, file_path="")
-        annotated_action = AnnotatedAction.from_raw_annotated_action(raw_action)
-
-        prediction = model.predict([annotated_action])[0]  # 0 o 1
-        label_str = "non_punch" if prediction == 0 else "punch"
-
-        if label_str == "punch":
-            # AGGIORNAMENTO DATABASE: Aggiorna il database con il pugno rilevato dal modello ML
-            if 'training_session_id' in session:
-                session_id = session['training_session_id']
+        if request.mimetype == wire.MIMETYPE:
+            # Frame binario: gli array sono letti direttamente dal corpo della richiesta
+            try:
+                raw_action = wire.decode_frame(request.get_data())
+            except wire.WireFormatError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
+        else:
+            data = request.get_json()
+            if data is None:
+                return jsonify({"status": "error", "message": "Nessun JSON ricevuto"}), 400
+            raw_action = ColumnarRawAnnotatedAction.from_json(data, file_path="")
 
-                # Calcola intensità massima dal buffer dei dati
-                peak_intensity = max(
-                    (point['x'] ** 2 + point['y'] ** 2 + point['z'] ** 2) ** 0.5
-                    for point in data['data']
-                )
-                if db_manager.update_session_stats(session_id, 1, peak_intensity):
-                    print(f"Database aggiornato: +1 pugno, intensità {peak_intensity:.2f}")
-                else:
-                    print("Errore nell'aggiornamento del database")
+        try:
+            label_str = classify_action(raw_action)
+        except InferenceQueueFull as e:
+            return jsonify({"status": "error", "message": str(e)}), 503
 
-        print(f"Predicted label: {label_str} for timestamp {data['timestamp']}")
+        print(f"Predicted label: {label_str} for timestamp {raw_action.timestamp}")
 
         return jsonify({
             "status": "predicted",
             "label": label_str,
-            "timestamp": data['timestamp']
+            "timestamp": raw_action.timestamp
         })
 
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def stream_session(ws):
+    """Canale WebSocket di una sessione di allenamento
+
+    Il browser invia i campioni grezzi come frame binari (data_module/wire.py). I campioni
+    vengono salvati come quelli di /upload_data_buffer e segmentati da StreamSegmenter;
+    ogni finestra viene classificata e il risultato inviato come messaggio JSON
+    {"type": "prediction", ...}. Il messaggio di testo {"type": "end"} chiude la finestra
+    aperta e viene confermato con {"type": "ended"}.
+    """
+    if not current_user.is_authenticated or not session.get('training_session_created', False):
+        ws.send(json.dumps({'type': 'error', 'message': 'Nessuna sessione attiva'}))
+        return
+    session_id = session['training_session_id']
+    # Le feature di ogni finestra vengono accumulate campione per campione mentre è aperta
+    segmenter = StreamSegmenter(STREAM_WINDOW_SIZE, STREAM_THRESHOLD, max_run_length=STREAM_MAX_RUN_LENGTH,
+                                features=True)
+
+    def send_error(message):
+        ws.send(json.dumps({'type': 'error', 'message': message}))
+
+    def classify_window(window, report_error):
+        """Classifica la finestra; gli errori vengono passati a report_error e restituisce None"""
+        raw_action = window.to_action(timestamp=str(window.impulse_timestamps[0]))
+        try:
+            return raw_action, classify_action(raw_action, window.to_features(timestamp=raw_action.timestamp))
+        except InferenceQueueFull as e:
+            report_error(str(e))
+        except FuturesTimeoutError:
+            report_error('Classificazione della finestra scaduta')
+        except Exception as e:
+            traceback.print_exc()
+            report_error(f'Errore nella classificazione della finestra: {e}')
+        return raw_action, None
+
+    def send_predictions(windows):
+        for window in windows:
+            raw_action, label_str = classify_window(window, send_error)
+            if label_str is None:
+                continue
+            ws.send(json.dumps({
+                'type': 'prediction',
+                'label': label_str,
+                'start': window.start,
+                'end': window.end,
+                'timestamp': raw_action.timestamp,
+                'peak_intensity': raw_action.max_impulse,
+            }))
+
+    try:
+        while True:
+            message = ws.receive()
+            if isinstance(message, str):
+                try:
+                    command = json.loads(message)
+                except json.JSONDecodeError as e:
+                    send_error(f'Messaggio di testo non valido: {e}')
+                    continue
+                if isinstance(command, dict) and command.get('type') == 'end':
+                    send_predictions(segmenter.flush())
+                    ws.send(json.dumps({'type': 'ended', 'samples': segmenter.samples_seen}))
+                continue
+            try:
+                frame = wire.decode_frame(message)
+            except wire.WireFormatError as e:
+                send_error(str(e))
+                continue
+            try:
+                ingestion_queue.submit(session_id, frame)
+            except IngestionQueueFull as e:
+                send_error(str(e))
+            send_predictions(segmenter.push(frame.data, frame.impulse_timestamps))
+    except ConnectionClosed:
+        # La finestra aperta viene comunque contata, senza poter inviare il risultato
+        for window in segmenter.flush():
+            classify_window(window, lambda message: print(f"Finestra non classificata dopo la chiusura: {message}"))
+
+
+if sock is not None:
+    sock.route('/stream_session')(stream_session)
+
+
+@app.route('/job_status/<job_id>')
+@login_required
+def job_status(job_id):
+    status = db_manager.get_job_status(job_id)
+    if status is None:
+        return jsonify({'status': 'error', 'message': 'Job non trovato'}), 404
+    return jsonify({'status': status}), 200
+
+
+@app.route('/inference_metrics')
+@login_required
+def inference_metrics():
+    return jsonify(inference_batcher.metrics())
+
+
+@app.route('/ingestion_metrics')
+@login_required
+def ingestion_metrics():
+    return jsonify(ingestion_queue.metrics())
+
+
+@app.route('/user_cache_metrics')
+@login_required
+def user_cache_metrics():
+    return jsonify(db_manager.user_cache.metrics())
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True, ssl_context="adhoc")
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from logging import getLogger
+from pathlib import Path
+
+import numpy as np
+from data_module.types import AnnotatedAction, AnnotatedFeatures, AnnotatedFeaturesCollection
+from ml.feature_extractor import StatisticalFeatureExtractor
+
+logger = getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+class FeatureCache:
+    """Persistent, content addressed cache of feature vectors.
+
+    Every action is keyed by a hash of its impulses and of the feature extractor version,
+    so renamed or relabelled recordings still hit while edited recordings are recomputed.
+    The features computed by a single `extract` call are stored together as one `.npy` shard
+    which is memory mapped on read. When the shards exceed `max_bytes` the least recently
+    used ones are deleted.
+
+    The cache is meant for a single writer, concurrent training runs should use separate folders.
+
+    Args:
+        path: folder holding the shards and the index
+        max_bytes: size bound of the shards on disk
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.shards = self._load_index()
+        self._locations = {
+            key: (shard, row)
+            for shard, info in self.shards.items()
+            for row, key in enumerate(info["keys"])
+        }
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def action_key(action: AnnotatedAction, extractor: StatisticalFeatureExtractor) -> str:
+        """Hash of the impulses of the action and of the version of the extractor."""
+        data = np.ascontiguousarray(action.data, dtype=np.float64)
+        digest = hashlib.sha1()
+        digest.update(f"{type(extractor).__name__}:{extractor.VERSION}:{data.shape}".encode())
+        digest.update(data.tobytes())
+        return digest.hexdigest()
+
+    def extract(
+        self,
+        extractor: StatisticalFeatureExtractor,
+        data: list[AnnotatedAction],
+    ) -> AnnotatedFeaturesCollection:
+        """Same as `extractor.extract_features(data)`, computing only the features missing from the cache."""
+        assert len(data) > 0, "Data must not be empty"
+        keys = [self.action_key(action, extractor) for action in data]
+        features = [None] * len(data)
+        missing = []
+        opened = {}
+        for i, key in enumerate(keys):
+            location = self._locations.get(key)
+            if location is None:
+                missing.append(i)
+                continue
+            shard, row = location
+            if shard not in opened:
+                opened[shard] = self._read_shard(shard)
+            features[i] = opened[shard][row]
+        touched = set(opened)
+        self.hits += len(data) - len(missing)
+        self.misses += len(missing)
+        logger.info("Feature cache: %d hits, %d misses", len(data) - len(missing), len(missing))
+
+        if missing:
+            matrix = extractor.extract_feature_matrix([data[i] for i in missing])
+            for row, i in enumerate(missing):
+                features[i] = matrix[row]
+            # Duplicated recordings would otherwise be stored twice in the same shard
+            new_rows = {}
+            for row, i in enumerate(missing):
+                new_rows.setdefault(keys[i], row)
+            shard = self._write_shard(list(new_rows), matrix[list(new_rows.values())])
+            touched.add(shard)
+
+        now = time.time()
+        for shard in touched:
+            self.shards[shard]["last_access"] = now
+        self._evict(keep=touched)
+        self._save_index()
+
+        return AnnotatedFeaturesCollection(data=[
+            AnnotatedFeatures(features=np.asarray(feature), label=action.label, timestamp=action.timestamp)
+            for feature, action in zip(features, data)
+        ])
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(info["bytes"] for info in self.shards.values())
+
+    def clear(self) -> None:
+        """Delete every shard."""
+        for shard in list(self.shards):
+            self._remove_shard(shard)
+        self._save_index()
+
+    def _read_shard(self, shard: str) -> np.ndarray:
+        return np.load(self.path / shard, mmap_mode="r")
+
+    def _write_shard(self, keys: list[str], matrix: np.ndarray) -> str:
+        shard = f"shard_{uuid.uuid4().hex}.npy"
+        tmp_path = self.path / f"{shard}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix))
+        os.replace(tmp_path, self.path / shard)
+        self.shards[shard] = {
+            "keys": keys,
+            "bytes": (self.path / shard).stat().st_size,
+            "last_access": time.time(),
+        }
+        for row, key in enumerate(keys):
+            self._locations[key] = (shard, row)
+        return shard
+
+    def _remove_shard(self, shard: str) -> None:
+        info = self.shards.pop(shard)
+        for key in info["keys"]:
+            if self._locations.get(key, (None,))[0] == shard:
+                del self._locations[key]
+        (self.path / shard).unlink(missing_ok=True)
+
+    def _evict(self, keep: set[str]) -> None:
+        """Removes the least recently used shards until the cache fits in `max_bytes`.
+        The shards used by the current call are kept even if they alone exceed the bound."""
+        by_age = sorted(self.shards, key=lambda shard: self.shards[shard]["last_access"])
+        total = self.size_bytes
+        for shard in by_age:
+            if total <= self.max_bytes:
+                break
+            if shard in keep:
+                continue
+            total -= self.shards[shard]["bytes"]
+            logger.debug("Evicting feature shard %s", shard)
+            self._remove_shard(shard)
+
+    def _load_index(self) -> dict[str, dict]:
+        index_path = self.path / INDEX_FILE
+        if not index_path.exists():
+            return {}
+        with open(index_path, "r") as f:
+            shards = json.load(f)
+        # Shards deleted by hand are dropped from the index
+        return {shard: info for shard, info in shards.items() if (self.path / shard).exists()}
+
+    def _save_index(self) -> None:
+        tmp_path = self.path / f"{INDEX_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.shards, f)
+        os.replace(tmp_path, self.path / INDEX_FILE)
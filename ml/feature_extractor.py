@@ -1,34 +1,72 @@
-import pandas as pd
-from typing import Any
 import numpy as np
-from scipy import stats
-from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
 from data_module.types import AnnotatedAction, AnnotatedFeatures, AnnotatedFeaturesCollection
 
 class StatisticalFeatureExtractor:
+    # Bump whenever the features change, it invalidates the entries of FeatureCache
+    VERSION = 1
+
     def __call__(self, data: list[AnnotatedAction]) -> AnnotatedFeaturesCollection:
         return self.extract_features(data)
 
     def extract_features(self, data: list[AnnotatedAction]) -> AnnotatedFeaturesCollection:
         """Estrae features da una serie temporale di accelerazioni"""
         assert len(data) > 0, "Data must not be empty"
-        annotated_features = []
-        for action in data:
-            action_features = self.extract_features_from_action(action)
-            annotated_features.append(AnnotatedFeatures(
-                features=action_features,
+        feature_matrix = self.extract_feature_matrix(data)
+        annotated_features = [
+            AnnotatedFeatures(
+                features=feature_matrix[i],
                 label=action.label,
                 timestamp=action.timestamp
-            ))
+            )
+            for i, action in enumerate(data)
+        ]
         return AnnotatedFeaturesCollection(data=annotated_features)
 
+    def extract_feature_matrix(self, data: list[AnnotatedAction], batch_size: int = 1024) -> np.ndarray:
+        """Computes the features of a batch of actions with vectorized NumPy passes.
+
+        Actions are sorted by length and processed in chunks of `batch_size`, each chunk is
+        zero padded to its longest action and a mask excludes the padding from every statistic.
+        The result matches `extract_features_from_action` row by row.
+
+        Args:
+            data: the actions to extract the features from, with any number of impulses each
+            batch_size: number of actions padded together, bounds the memory of a single pass
+
+        Returns:
+            A contiguous (n_actions, n_features) matrix, rows follow the order of `data`
+        """
+        assert len(data) > 0, "Data must not be empty"
+        lengths = np.array([len(action.data) for action in data])
+        assert np.all(lengths > 0), "Data must not be empty"
+
+        order = np.argsort(lengths, kind="stable")
+        feature_matrix = None
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            chunk_lengths = lengths[chunk]
+            padded = np.zeros((len(chunk), chunk_lengths[-1], 3))
+            for row, idx in enumerate(chunk):
+                padded[row, :chunk_lengths[row]] = data[idx].data
+            features = self.get_batch_feature_dict(padded, chunk_lengths)
+            chunk_matrix = np.concatenate(
+                [value.reshape(len(chunk), -1) for value in features.values()], axis=1
+            )
+            if feature_matrix is None:
+                feature_matrix = np.empty((len(data), chunk_matrix.shape[1]))
+            feature_matrix[chunk] = chunk_matrix
+
+        nan_mask = np.isnan(feature_matrix)
+        if np.any(nan_mask):
+            print(f"NaNs found in {np.count_nonzero(nan_mask)} feature values, replaced with 0")
+            feature_matrix[nan_mask] = 0.0
+        return feature_matrix
+
     def extract_features_from_action(self, action: AnnotatedAction) -> np.ndarray:
         """Estrae features da un'azione annotata.
         action.data is a 2D numpy array, we must compute the values for each dimension """
         data = action.data
         assert len(data) > 0, "Data must not be empty"
-        self.get_feature_dict(data[-1])
         features_3d = self.get_feature_dict(data)
         flattened_features = []
         for key, value in features_3d.items():
@@ -37,6 +75,8 @@ class StatisticalFeatureExtractor:
         return np.concatenate(flattened_features)
 
     def get_feature_dict(self, data: np.ndarray) -> dict[str, float]:
+        # scipy is only needed here, the batched path and the serving workers do not import it
+        from scipy import stats
         features = {}
         # Compute statistics for each dimension
         ## Basic stats
@@ -107,12 +147,123 @@ class StatisticalFeatureExtractor:
 
         return features
 
+    def get_batch_feature_dict(self, data: np.ndarray, lengths: np.ndarray) -> dict[str, np.ndarray]:
+        """Batched version of `get_feature_dict`.
+
+        Args:
+            data: zero padded impulses of shape (n_actions, max_length, 3)
+            lengths: number of valid impulses of each action, shape (n_actions,)
+
+        Returns:
+            The same keys of `get_feature_dict`, each value has a leading n_actions axis.
+            NaNs are left in place, the caller is responsible for replacing them.
+        """
+        n_actions, max_length, n_dims = data.shape
+        n = lengths[:, None].astype(np.float64)
+        positions = np.arange(max_length)
+        mask = (positions[None, :] < lengths[:, None])[:, :, None]
+
+        features = {}
+        ## Basic stats
+        features['mean'] = data.sum(axis=1) / n
+        features['max'] = np.where(mask, data, -np.inf).max(axis=1)
+        features['min'] = np.where(mask, data, np.inf).min(axis=1)
+        centered = np.where(mask, data - features['mean'][:, None, :], 0.0)
+        variance = np.sum(centered ** 2, axis=1) / n
+        features['std'] = np.sqrt(variance)
+        features['var'] = variance
+        # Padding is pushed to the end of every column so that the valid values stay sorted
+        sorted_data = np.sort(np.where(mask, data, np.inf), axis=1)
+        features['median'] = _masked_median(sorted_data, lengths)
+        features['range'] = features['max'] - features['min']
+
+        ## Percentiles
+        features['q25'] = _masked_percentile(sorted_data, lengths, 25)
+        features['q75'] = _masked_percentile(sorted_data, lengths, 75)
+        features['iqr'] = features['q75'] - features['q25']
+
+        ## Signal shape features, same degenerate case handling as scipy.stats (biased estimators)
+        m2 = features['var']
+        m3 = np.sum(centered ** 3, axis=1) / n
+        m4 = np.sum(centered ** 4, axis=1) / n
+        constant = m2 <= (np.finfo(np.float64).resolution * features['mean']) ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features['skewness'] = np.where(constant, np.nan, m3 / m2 ** 1.5)
+            features['kurtosis'] = np.where(constant, np.nan, m4 / m2 ** 2 - 3.0)
+
+        ## Derivatives
+        derivatives = np.diff(data, axis=1)
+        derivative_lengths = lengths - 1
+        derivative_mask = (positions[None, :-1] < derivative_lengths[:, None])[:, :, None]
+        has_derivatives = derivative_lengths[:, None] > 0
+        n_derivatives = np.maximum(derivative_lengths, 1)[:, None]
+        derivatives = np.where(derivative_mask, derivatives, 0.0)
+        mean_derivative = derivatives.sum(axis=1) / n_derivatives
+        centered_derivatives = np.where(derivative_mask, derivatives - mean_derivative[:, None, :], 0.0)
+        features['mean_derivative'] = np.where(has_derivatives, mean_derivative, 0.0)
+        features['max_derivative'] = np.abs(derivatives).max(axis=1, initial=0.0)
+        features['std_derivative'] = np.where(
+            has_derivatives, np.sqrt(np.sum(centered_derivatives ** 2, axis=1) / n_derivatives), 0.0
+        )
+
+        features['energy'] = np.sum(data ** 2, axis=1)
+        features['rms'] = np.sqrt(features['energy'] / n)
+
+        ## Zero crossing rate
+        # Same as the per action version: the sign changes are counted across the x, y, z columns
+        signs = np.sign(data - features['mean'][:, None, :])
+        crossings = np.diff(signs, axis=2) != 0
+        features['zero_crossing_rate'] = np.sum(crossings & mask, axis=(1, 2)) / lengths
+
+        # FFT features, the spectrum depends on the length so actions are grouped by it
+        features['fft_mean'] = np.empty((n_actions, n_dims))
+        features['fft_max'] = np.empty((n_actions, n_dims))
+        features['fft_std'] = np.empty((n_actions, n_dims))
+        for length in np.unique(lengths):
+            group = lengths == length
+            fft_vals = np.abs(np.fft.fft(data[group, :length], axis=1))
+            features['fft_mean'][group] = np.mean(fft_vals, axis=1)
+            features['fft_max'][group] = np.max(fft_vals, axis=1)
+            features['fft_std'][group] = np.std(fft_vals, axis=1)
+
+        peak_idx = np.argmax(np.where(mask, data, -np.inf), axis=1)
+        features['peak_position'] = peak_idx / n
+
+        features['peak_to_mean_ratio'] = features['max'] / (features['mean'] + 1e-8)
+        threshold = features['mean'] + features['std']
+        peaks = np.sum(mask & (data > threshold[:, None, :]), axis=1)
+        features['peak_count'] = peaks
+        features['above_threshold_count'] = peaks / n
+
+        return features
+
+def _masked_percentile(sorted_data: np.ndarray, lengths: np.ndarray, q: float) -> np.ndarray:
+    """Linear interpolation percentile (numpy's default method) over the valid prefix of each action."""
+    virtual_index = q / 100 * (lengths - 1)
+    lower = np.floor(virtual_index).astype(np.int64)
+    upper = np.minimum(lower + 1, lengths - 1)
+    gamma = (virtual_index - lower)[:, None]
+    below = np.take_along_axis(sorted_data, lower[:, None, None], axis=1)[:, 0]
+    above = np.take_along_axis(sorted_data, upper[:, None, None], axis=1)[:, 0]
+    diff = above - below
+    return np.where(gamma >= 0.5, above - diff * (1 - gamma), below + diff * gamma)
+
+def _masked_median(sorted_data: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Median over the valid prefix of each action, the mean of the two middle values for even lengths."""
+    lower = (lengths - 1) // 2
+    upper = lengths // 2
+    below = np.take_along_axis(sorted_data, lower[:, None, None], axis=1)[:, 0]
+    above = np.take_along_axis(sorted_data, upper[:, None, None], axis=1)[:, 0]
+    return np.where((lengths % 2 == 1)[:, None], below, (below + above) / 2)
+
 def compute_tsne(
     feature_collection: AnnotatedFeaturesCollection,
     do_pca: bool = True,
 ) -> np.ndarray:
     """Compute t-SNE for the given features.
     Returns an ndarray component-1, component-2"""
+    from sklearn.decomposition import PCA
+    from sklearn.manifold import TSNE
     tnse = TSNE(n_components=2, random_state=42, verbose=1, perplexity=10)
     if do_pca:
         pca = PCA(n_components=10)
@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from data_module.types import AnnotatedAction, AnnotatedFeatures
+from ml.numpy_predictor import NumpyPunchClassifier
+
+if TYPE_CHECKING:
+    from ml.model import PunchClassifier
+
+class InferenceQueueFull(Exception):
+    """Raised when a window is submitted while the queue already holds `max_queue_depth` windows."""
+
+@dataclass
+class _PendingPrediction:
+    data: AnnotatedAction | AnnotatedFeatures
+    future: Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+class InferenceBatcher:
+    """Coalesces the windows submitted by concurrent requests into batched `PunchClassifier.predict` calls.
+
+    A background thread waits for the first pending window, then keeps collecting windows
+    for at most `max_wait_ms` or until `max_batch_size` windows are pending, runs a single
+    prediction over all of them and hands every result back to the waiting request.
+
+    Args:
+        classifier: the trained classifier shared by every request, anything with a batched `predict`
+        max_batch_size: maximum number of windows predicted together
+        max_wait_ms: how long the first window of a batch waits for others to join it
+        max_queue_depth: pending windows above which `submit` raises InferenceQueueFull
+    """
+
+    def __init__(
+        self,
+        classifier: 'PunchClassifier | NumpyPunchClassifier',
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_queue_depth: int = 1024,
+    ):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'submitted': 0,
+            'rejected': 0,
+            'failed': 0,
+            'batches': 0,
+            'predicted': 0,
+            'max_batch_size': 0,
+            'total_queue_wait_ms': 0.0,
+            'total_predict_ms': 0.0,
+        }
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, data: AnnotatedAction | AnnotatedFeatures) -> Future:
+        """Queues a window, the returned future resolves to its predicted label (0 or 1)."""
+        if self._stopped.is_set():
+            raise RuntimeError("The inference batcher has been closed")
+        pending = _PendingPrediction(data=data, future=Future())
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            self._record(rejected=1)
+            raise InferenceQueueFull(f"Inference queue full ({self._queue.maxsize} pending windows)")
+        self._record(submitted=1)
+        return pending.future
+
+    def predict(self, data: AnnotatedAction | AnnotatedFeatures, timeout: float | None = 5.0) -> int:
+        """Blocking version of `submit`."""
+        return self.submit(data).result(timeout=timeout)
+
+    def metrics(self) -> dict[str, float]:
+        """Counters since start up, plus the current queue depth and the average batch size and latencies."""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        batches = max(metrics['batches'], 1)
+        predicted = max(metrics['predicted'], 1)
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['avg_batch_size'] = metrics['predicted'] / batches
+        metrics['avg_queue_wait_ms'] = metrics['total_queue_wait_ms'] / predicted
+        metrics['avg_predict_ms'] = metrics['total_predict_ms'] / batches
+        return metrics
+
+    def close(self, timeout: float | None = None) -> None:
+        """Stops the worker once the windows already queued have been predicted."""
+        self._stopped.set()
+        self._worker.join(timeout=timeout)
+
+    def _record(self, **increments) -> None:
+        with self._metrics_lock:
+            for key, value in increments.items():
+                self._metrics[key] += value
+
+    def _next_batch(self) -> list[_PendingPrediction]:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Whatever is already queued joins the batch even after the deadline
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stopped.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            queue_wait_ms = sum(start - pending.enqueued_at for pending in batch) * 1000
+            # The classifier expects a list of actions or a list of features, not a mix of both
+            actions = [pending for pending in batch if isinstance(pending.data, AnnotatedAction)]
+            features = [pending for pending in batch if not isinstance(pending.data, AnnotatedAction)]
+            for group in (actions, features):
+                if not group:
+                    continue
+                try:
+                    predictions = self.classifier.predict([pending.data for pending in group])
+                except Exception as e:
+                    for pending in group:
+                        pending.future.set_exception(e)
+                    self._record(failed=len(group))
+                    continue
+                for pending, prediction in zip(group, predictions):
+                    pending.future.set_result(int(prediction))
+            predict_ms = (time.perf_counter() - start) * 1000
+            with self._metrics_lock:
+                self._metrics['batches'] += 1
+                self._metrics['predicted'] += len(batch)
+                self._metrics['max_batch_size'] = max(self._metrics['max_batch_size'], len(batch))
+                self._metrics['total_queue_wait_ms'] += queue_wait_ms
+                self._metrics['total_predict_ms'] += predict_ms
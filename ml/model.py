@@ -1,11 +1,9 @@
-import glob
-import os
 import joblib
 import numpy as np
-import pandas as pd
 from sklearn.metrics import classification_report, roc_auc_score
 from sklearn.svm import SVC
 from ml.feature_extractor import StatisticalFeatureExtractor
+from ml.numpy_predictor import NumpyPunchClassifier
 from data_module.types import AnnotatedAction, AnnotatedFeaturesCollection, AnnotatedFeatures
 
 class PunchClassifier():
@@ -62,3 +60,63 @@ class PunchClassifier():
         y_proba = self.model.predict_proba(feature_collection.features)[:, 1]
         print(classification_report(feature_collection.labels_as_int, y_pred))
         print("ROC AUC Score:", roc_auc_score(feature_collection.labels_as_int, y_proba))
+
+    def export_numpy(self, path: str, verify_data: list[AnnotatedAction] | list[AnnotatedFeatures] | None = None) -> NumpyPunchClassifier:
+        """
+        Write the parameters of the trained SVC to a `.npz` file loadable by `NumpyPunchClassifier`.
+
+        The exported gamma is the one the SVC was fitted with, so 'scale' and 'auto' keep the value
+        computed on the training split.
+
+        Args:
+            path: destination of the `.npz` file
+            verify_data: if given, the NumPy decision function is checked against `SVC.decision_function` on it
+        """
+        if self.model.kernel not in ("rbf", "linear"):
+            raise ValueError(f"Unsupported kernel: {self.model.kernel}")
+        if len(self.model.classes_) != 2:
+            raise ValueError("Only binary classifiers can be exported")
+        np.savez(
+            path,
+            support_vectors=self.model.support_vectors_,
+            dual_coef=self.model.dual_coef_[0],
+            intercept=self.model.intercept_[0],
+            gamma=fitted_gamma(self.model),
+            classes=self.model.classes_,
+            kernel=self.model.kernel,
+        )
+        predictor = NumpyPunchClassifier.load(path)
+        if verify_data is not None:
+            X = np.stack(self._from_data_to_feature_collection(verify_data).features)
+            expected = self.model.decision_function(X)
+            actual = predictor.decision_function(X)
+            if not np.allclose(actual, expected, rtol=1e-9, atol=1e-9):
+                raise ValueError(
+                    f"Exported model differs from the SVC, max error {np.max(np.abs(actual - expected))}"
+                )
+        return predictor
+
+def fitted_gamma(model: SVC) -> float:
+    """
+    The numeric kernel coefficient a fitted SVC uses, also when its `gamma` parameter is 'scale' or 'auto'.
+
+    scikit-learn resolves 'scale' from the variance of the training features at fit time and only keeps
+    the result on the fitted model, so it cannot be recomputed without the exact training split.
+    """
+    if not hasattr(model, "_gamma"):
+        raise ValueError("The SVC is not fitted")
+    return float(model._gamma)
+
+if __name__ == "__main__":
+    # Converte un modello salvato con joblib nel formato .npz usato per servire le predizioni
+    # e verifica che la funzione di decisione esportata coincida con quella dell'SVC sulla cartella di dati
+    import sys
+    from pathlib import Path
+    from data_module.dataset import PunchDataset
+    classifier = PunchClassifier()
+    classifier.model = joblib.load(sys.argv[1] if len(sys.argv) > 1 else "trained_model.pkl")
+    data_path = Path(sys.argv[3] if len(sys.argv) > 3 else "data/filtered_training_data")
+    verify_data = PunchDataset.load_samples_from_path(data_path, split=(1.0, 0.0)).train_data
+    if not verify_data:
+        raise FileNotFoundError(f"No JSON recordings in {data_path}, needed to verify the export")
+    classifier.export_numpy(sys.argv[2] if len(sys.argv) > 2 else "trained_model.npz", verify_data=verify_data)
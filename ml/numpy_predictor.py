@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import numpy as np
+from data_module.types import AnnotatedAction, AnnotatedFeatures
+from ml.feature_extractor import StatisticalFeatureExtractor
+
+SUPPORTED_KERNELS = ("rbf", "linear")
+
+class NumpyPunchClassifier:
+    """Pure NumPy replacement of `PunchClassifier.predict` for serving.
+
+    It evaluates the decision function of the trained SVC from the arrays written by
+    `PunchClassifier.export_numpy`, so neither sklearn nor scipy are imported by the web workers.
+
+    Args:
+        support_vectors: (n_support_vectors, n_features) matrix
+        dual_coef: (n_support_vectors,) dual coefficients, with the sign of `SVC.dual_coef_`
+        intercept: the intercept of the decision function, as in `SVC.intercept_`
+        gamma: the numeric kernel coefficient the SVC was fitted with, see `fitted_gamma` in ml/model.py
+        classes: the two labels, `classes[1]` is predicted for a positive decision
+        kernel: "rbf" or "linear"
+    """
+
+    def __init__(
+        self,
+        support_vectors: np.ndarray,
+        dual_coef: np.ndarray,
+        intercept: float,
+        gamma: float,
+        classes: np.ndarray,
+        kernel: str = "rbf",
+    ):
+        if kernel not in SUPPORTED_KERNELS:
+            raise ValueError(f"Unsupported kernel: {kernel}")
+        self.feature_extractor = StatisticalFeatureExtractor()
+        self.support_vectors = np.ascontiguousarray(support_vectors, dtype=np.float64)
+        self.dual_coef = np.asarray(dual_coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.gamma = float(gamma)
+        self.classes = np.asarray(classes)
+        self.kernel = kernel
+        self._support_vectors_sq = np.einsum("ij,ij->i", self.support_vectors, self.support_vectors)
+
+    @classmethod
+    def load(cls, path: Path) -> 'NumpyPunchClassifier':
+        with np.load(path) as model:
+            return cls(
+                support_vectors=model["support_vectors"],
+                dual_coef=model["dual_coef"],
+                intercept=model["intercept"].item(),
+                gamma=model["gamma"].item(),
+                classes=model["classes"],
+                kernel=str(model["kernel"]),
+            )
+
+    def _features(self, data: list[AnnotatedAction] | list[AnnotatedFeatures]) -> np.ndarray:
+        if isinstance(data[0], AnnotatedAction):
+            return self.feature_extractor.extract_feature_matrix(data)
+        return np.stack([np.asarray(feature.features, dtype=np.float64) for feature in data])
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        """Same as `SVC.decision_function` for a (n_samples, n_features) matrix."""
+        X = np.asarray(X, dtype=np.float64)
+        dot = X @ self.support_vectors.T
+        if self.kernel == "rbf":
+            # Same expansion of the squared distance used by libsvm
+            sq_dist = np.einsum("ij,ij->i", X, X)[:, None] + self._support_vectors_sq[None, :] - 2 * dot
+            kernel = np.exp(-self.gamma * np.maximum(sq_dist, 0.0))
+        else:
+            kernel = dot
+        return kernel @ self.dual_coef + self.intercept
+
+    def predict(self, data: list[AnnotatedAction] | list[AnnotatedFeatures]) -> np.ndarray:
+        """
+        Predict the class labels for the given data.
+            0 for non-punch actions, 1 for punch actions
+        Args:
+            data: the input data to predict on
+        """
+        decision = self.decision_function(self._features(data))
+        return self.classes[(decision > 0).astype(int)]
@@ -0,0 +1,71 @@
+import numpy as np
+from data_module.types import AnnotatedFeatures, Label
+from ml.feature_extractor import StatisticalFeatureExtractor
+
+class StreamingFeatureAccumulator:
+    """Collects the impulses of a live window and returns its `StatisticalFeatureExtractor` feature vector.
+
+    Impulses are appended to a growing buffer, one at a time or a whole chunk with a single copy,
+    so adding a sample costs amortized O(1) without any per-sample Python arithmetic. When the
+    window is read, the features are computed in one vectorized pass of `get_batch_feature_dict`,
+    the same code path of `extract_feature_matrix`, so they match `get_feature_dict` exactly
+    (up to floating point rounding). Median, percentiles and FFT need every impulse anyway,
+    so keeping running statistics would only move cost into the per-sample path.
+
+    Args:
+        capacity: initial size of the impulse buffer, it doubles whenever it fills up
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._buffer = np.empty((capacity, 3))
+        self._extractor = StatisticalFeatureExtractor()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop every impulse seen so far, keeping the allocated buffer."""
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def data(self) -> np.ndarray:
+        """The impulses seen so far as a (count, 3) view of the buffer."""
+        return self._buffer[:self.count]
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self._buffer):
+            buffer = np.empty((max(size, 2 * len(self._buffer)), 3))
+            buffer[:self.count] = self.data
+            self._buffer = buffer
+
+    def update(self, x: float, y: float, z: float) -> None:
+        """Add a single impulse to the window."""
+        self._reserve(self.count + 1)
+        self._buffer[self.count] = (x, y, z)
+        self.count += 1
+
+    def update_many(self, data: np.ndarray) -> None:
+        """Add a chunk of impulses of shape (n, 3) to the window."""
+        data = np.asarray(data).reshape(-1, 3)
+        self._reserve(self.count + len(data))
+        self._buffer[self.count:self.count + len(data)] = data
+        self.count += len(data)
+
+    def _batch_feature_dict(self) -> dict[str, np.ndarray]:
+        assert self.count > 0, "Data must not be empty"
+        return self._extractor.get_batch_feature_dict(self.data[None], np.array([self.count]))
+
+    def feature_dict(self) -> dict[str, np.ndarray]:
+        """Returns the features of the current window with the keys of `get_feature_dict`."""
+        return {key: np.nan_to_num(value[0], nan=0.0) for key, value in self._batch_feature_dict().items()}
+
+    def features(self) -> np.ndarray:
+        """Returns the flattened feature vector, same layout as `extract_features_from_action`."""
+        features = np.concatenate([np.ravel(value) for value in self._batch_feature_dict().values()])
+        features[np.isnan(features)] = 0.0
+        return features
+
+    def to_annotated_features(self, label: Label, timestamp: str) -> AnnotatedFeatures:
+        """Wraps the current feature vector so that it can be passed to `PunchClassifier`."""
+        return AnnotatedFeatures(features=self.features(), label=label, timestamp=timestamp)
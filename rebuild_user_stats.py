@@ -0,0 +1,21 @@
+import argparse
+
+from storage_backend import STORAGE_BACKENDS, create_storage_backend
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ricostruisce le statistiche aggregate degli utenti dalle sessioni")
+    parser.add_argument("--user", default=None, help="utente da ricostruire, tutti se omesso")
+    parser.add_argument("--backend", choices=STORAGE_BACKENDS, default="firestore")
+    parser.add_argument("--credentials", default="credentials.json", help="credenziali Firestore")
+    parser.add_argument("--sqlite-path", default="data/boxeproject.db", help="database SQLite")
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        db_manager = create_storage_backend("sqlite", path=args.sqlite_path)
+    else:
+        db_manager = create_storage_backend("firestore", credentials_path=args.credentials)
+    if args.user:
+        totals = db_manager.rebuild_user_stats(args.user)
+        print(f"Statistiche di {args.user} ricostruite: {totals}")
+    else:
+        print(f"Statistiche ricostruite per {db_manager.rebuild_all_user_stats()} utenti")
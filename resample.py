@@ -1,12 +1,18 @@
-from dataclasses import asdict
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+import glob
+import hashlib
 import os
 import json
-import math
 from pathlib import Path
 
-from tqdm import tqdm
-from data_module.dataset import PunchDataset
-from data_module.types import RawAnnotatedAction
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from data_module.loader import load_recordings
+from data_module.types import AnnotatedFeatures, ColumnarRawAnnotatedAction, Label, RawAnnotatedAction
+from ml.streaming_features import StreamingFeatureAccumulator
 
 DEFAULT_THRESHOLD = 25.0  # valore di esempio, puoi modificarla
 
@@ -27,66 +33,424 @@ class CircularArray():
         return self.sum / self.size
 
 def find_max_subaction(
-    action: RawAnnotatedAction,
+    action: RawAnnotatedAction | ColumnarRawAnnotatedAction,
     window_size: int = 3,
     threshold: float = DEFAULT_THRESHOLD
-) -> RawAnnotatedAction | None:
-    """""" 
-    window = CircularArray(size=window_size)
-    highest_subaction = None
-    max_intensity = -1
-    consecutive_impulses = []
-    impulses = action.impulses
-    impulses.append(impulses[0]) # This value will never be added, it is just to avoid indexing out of the array
-    i = 0
-    while i < len(impulses):
-        impulse = impulses[i]
-        intensity_average = window.update_and_mean(impulse.intensity)
-        
-        while intensity_average > threshold and i < len(impulses) - 1:
-            consecutive_impulses.append(impulse)
-
-            i += 1
-            impulse = impulses[i]
-            intensity_average = window.update_and_mean(impulse.intensity)
-        if consecutive_impulses:
-            new_action = RawAnnotatedAction(
-                impulses=consecutive_impulses,
-                label=action.label,
-                timestamp=action.timestamp,
-                file_path=action.file_path,
-            )
-            if new_action.max_impulse > max_intensity:
-                highest_subaction = new_action
-                max_intensity = new_action.max_impulse
-            window = CircularArray(size=window_size)
-            consecutive_impulses = []
-        else:
-            i += 1
+) -> RawAnnotatedAction | ColumnarRawAnnotatedAction | None:
+    """Returns the run of impulses whose moving average of the intensity stays above
+    `threshold` and that holds the highest impulse, None if no run exists.
 
-    return highest_subaction
+    The moving average uses a `window_size` window that restarts from zeros after every run,
+    and the impulse that closes a run is fed again to the new window. The input action is
+    not modified and the returned action has the same type, sharing its impulses.
+    """
+    if isinstance(action, ColumnarRawAnnotatedAction):
+        intensity = action.intensity.astype(np.float64)
+    else:
+        intensity = np.fromiter((impulse.intensity for impulse in action.impulses), dtype=np.float64, count=len(action.impulses))
 
-if __name__ == "__main__":
-    INPUT_DIR = "training_data"
-    OUTPUT_DIR = "filtered_training_data"
-
-    punch_dataset = PunchDataset.load_samples_from_path("data" / Path(INPUT_DIR))
-    
-    filtered_dataset = [
-        find_max_subaction(action, window_size=1) for action in tqdm(
-            punch_dataset.data, 
-            desc="Filtering dataset",
-            total=len(punch_dataset)
+    runs = find_runs_above_threshold(intensity, window_size, threshold)
+    if len(runs) == 0:
+        return None
+
+    # Maximum of every run in one reduction (the odd entries cover the gaps between runs),
+    # argmax keeps the first run on ties like the strict comparison of the loop it replaces
+    run_max = np.maximum.reduceat(np.append(intensity, 0.0), runs.ravel())[::2]
+    start, end = runs[np.argmax(run_max)]
+
+    if isinstance(action, ColumnarRawAnnotatedAction):
+        return ColumnarRawAnnotatedAction(
+            data=action.data[start:end],
+            impulse_timestamps=action.impulse_timestamps[start:end],
+            label=action.label,
+            timestamp=action.timestamp,
+            file_path=action.file_path,
+        )
+    return RawAnnotatedAction(
+        impulses=action.impulses[start:end],
+        label=action.label,
+        timestamp=action.timestamp,
+        file_path=action.file_path,
+    )
+
+def find_runs_above_threshold(
+    intensity: np.ndarray,
+    window_size: int = 3,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> np.ndarray:
+    """Vectorized equivalent of feeding `intensity` to a `CircularArray` one value at a time.
+
+    A run starts at the first impulse whose moving average is above `threshold` and stops
+    before the first following impulse whose average is not. After a run the window restarts
+    from zeros at the impulse that stopped it.
+
+    The sums of the full windows are computed once for the whole recording, so every run costs
+    two binary searches. `CircularArray` keeps a running sum that drifts by a few ulps, hence
+    the averages that fall within a rounding error bound of the threshold are recomputed with
+    the exact sequence of additions of `CircularArray` to return exactly the same runs.
+
+    Returns:
+        A (n_runs, 2) int array with the start (inclusive) and end (exclusive) of each run
+    """
+    if window_size == 0:
+        raise ValueError("Cannot pass zero as size")
+    intensity = np.asarray(intensity, dtype=np.float64)
+    n = len(intensity)
+    if n == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    level = threshold * window_size
+    eps = np.finfo(np.float64).eps
+    margin = 4 * eps * ((n + window_size) * (window_size + 1) * np.abs(intensity).max() + abs(level))
+    full_sums = np.full(n, np.nan)
+    if n >= window_size:
+        full_sums[window_size - 1:] = sliding_window_view(intensity, window_size).sum(axis=1)
+    # Python lists and bisect keep the per run overhead low, the per impulse work is done above
+    values = intensity.tolist()
+    sums = full_sums.tolist()
+    maybe_above = np.flatnonzero(full_sums > level - margin).tolist()
+    maybe_below = np.flatnonzero(full_sums <= level + margin).tolist()
+
+    def first_with_decision(above: bool, first: int, window_start: int) -> int | None:
+        # Until the window is full nothing leaves it, the sums are computed exactly
+        full_from = min(window_start + window_size - 1, n)
+        running_sum = 0
+        for k in range(window_start, full_from):
+            running_sum += values[k] - 0.0
+            if k >= first and (running_sum / window_size > threshold) == above:
+                return k
+        candidates = maybe_above if above else maybe_below
+        for idx in range(bisect_left(candidates, max(first, full_from)), len(candidates)):
+            k = candidates[idx]
+            if abs(sums[k] - level) > margin:
+                return k
+            exact_sum = _window_sums(intensity, window_start, k + 1, window_size)[-1]
+            if (exact_sum / window_size > threshold) == above:
+                return k
+        return None
+
+    runs = []
+    window_start = 0
+    while window_start < n:
+        run_start = first_with_decision(True, window_start, window_start)
+        if run_start is None:
+            break
+        run_end = first_with_decision(False, run_start + 1, window_start)
+        if run_end is None:
+            run_end = n
+        runs.append((run_start, run_end))
+        window_start = run_end
+    return np.array(runs, dtype=np.int64).reshape(-1, 2)
+
+def _window_sums(intensity: np.ndarray, window_start: int, stop: int, window_size: int) -> np.ndarray:
+    """Running sums of a `CircularArray` filled from `window_start`, for the impulses up to `stop`.
+    The cumulative sum repeats its `sum += value - oldest` additions in the same order."""
+    idx = np.arange(window_start, stop)
+    lagged = idx - window_size
+    leaving = np.where(lagged >= window_start, intensity[np.maximum(lagged, 0)], 0.0)
+    return np.cumsum(intensity[window_start:stop] - leaving)
+
+@dataclass
+class StreamWindow:
+    """A run emitted by `StreamSegmenter`, `start` and `end` count the samples pushed since the
+    segmenter was created or reset (end exclusive). A run within one pushed chunk shares its
+    arrays with the chunk. `features` is the feature vector of the run when the segmenter
+    accumulates them."""
+    start: int
+    end: int
+    data: np.ndarray
+    impulse_timestamps: np.ndarray
+    features: np.ndarray | None = None
+
+    def to_action(self, label: Label = Label.NOT_PUNCH, timestamp: str = "") -> ColumnarRawAnnotatedAction:
+        return ColumnarRawAnnotatedAction(
+            data=self.data,
+            impulse_timestamps=self.impulse_timestamps,
+            label=label,
+            timestamp=timestamp,
+            file_path="",
+        )
+
+    def to_features(self, label: Label = Label.NOT_PUNCH, timestamp: str = "") -> AnnotatedFeatures:
+        if self.features is None:
+            raise ValueError("The segmenter did not accumulate the features of this window")
+        return AnnotatedFeatures(features=self.features, label=label, timestamp=timestamp)
+
+class StreamSegmenter:
+    """Cuts a live stream of samples into runs with the `CircularArray` logic of
+    `find_runs_above_threshold`.
+
+    Samples are pushed in chunks of any size, down to a single sample; a run is returned as
+    soon as the sample that closes it arrives. Every sample costs one moving average update
+    and only the chunks that overlap the open run are kept. With the default `exit_threshold`
+    and without `max_run_length` the runs are exactly those that `find_runs_above_threshold`
+    returns for the concatenation of all the chunks, the last one included if `flush` is
+    called at the end of the stream.
+
+    Args:
+        window_size: size of the moving average window
+        threshold: a run starts when the moving average of the intensity goes above it
+        exit_threshold: a run lasts while the moving average stays above it, defaults to
+            `threshold`; a lower value keeps a punch whose intensity dips briefly in one run
+        max_run_length: if set, a run that reaches this many samples is closed as if its
+            next sample had dropped below the threshold, bounding the memory held per stream
+        features: feed the samples of the open run to a `StreamingFeatureAccumulator`, one
+            slice per chunk, so that every window carries its feature vector when it is returned
+    """
+
+    def __init__(
+        self,
+        window_size: int = 1,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_run_length: int | None = None,
+        exit_threshold: float | None = None,
+        features: bool = False,
+    ):
+        if window_size == 0:
+            raise ValueError("Cannot pass zero as size")
+        if exit_threshold is not None and exit_threshold > threshold:
+            raise ValueError(f"exit_threshold {exit_threshold} is above threshold {threshold}")
+        self.window_size = window_size
+        self.threshold = threshold
+        self.exit_threshold = threshold if exit_threshold is None else exit_threshold
+        self.max_run_length = max_run_length
+        self._accumulator = StreamingFeatureAccumulator() if features else None
+        self.reset()
+
+    def reset(self) -> None:
+        """Drops the open run and restarts the sample count, to segment a new stream."""
+        self._average = CircularArray(self.window_size)
+        self._count = 0
+        self._run_start: int | None = None
+        # Chunks that hold the samples of the open run, as (index of their first sample, data, timestamps)
+        self._tail: list[tuple[int, np.ndarray, np.ndarray]] = []
+        if self._accumulator is not None:
+            self._accumulator.reset()
+
+    @property
+    def samples_seen(self) -> int:
+        return self._count
+
+    @property
+    def in_run(self) -> bool:
+        return self._run_start is not None
+
+    def push(self, data: np.ndarray, impulse_timestamps: np.ndarray) -> list[StreamWindow]:
+        """Feeds a (n, 3) chunk of accelerations and returns the runs it closes."""
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 3)
+        impulse_timestamps = np.asarray(impulse_timestamps, dtype=np.int64)
+        # Same intensity as ColumnarRawAnnotatedAction.intensity, in float64 like find_max_subaction
+        intensity = np.sqrt(np.einsum("ij,ij->i", data, data)).astype(np.float64)
+        chunk = (self._count, data, impulse_timestamps)
+        if self._run_start is not None:
+            self._tail.append(chunk)
+        # First sample of the chunk not yet fed to the accumulator
+        self._unfed = 0
+
+        windows = []
+        for i, value in enumerate(intensity.tolist()):
+            k = self._count + i
+            if self._run_start is not None and self.max_run_length is not None and k - self._run_start >= self.max_run_length:
+                windows.append(self._close_run(k, data[self._unfed:i]))
+            mean = self._average.update_and_mean(value)
+            if self._run_start is None:
+                if mean > self.threshold:
+                    self._open_run(k, chunk)
+            elif mean <= self.exit_threshold:
+                windows.append(self._close_run(k, data[self._unfed:i]))
+                # The sample that closed the run is fed again to a fresh window
+                if self._average.update_and_mean(value) > self.threshold:
+                    self._open_run(k, chunk)
+        if self._accumulator is not None and self._run_start is not None:
+            self._accumulator.update_many(data[self._unfed:])
+        self._count += len(data)
+        return windows
+
+    def flush(self) -> list[StreamWindow]:
+        """Closes the open run, if any, at the end of the stream."""
+        if self._run_start is None:
+            return []
+        window = self._close_run(self._count)
+        self._average = CircularArray(self.window_size)
+        return [window]
+
+    def _open_run(self, start: int, chunk: tuple[int, np.ndarray, np.ndarray]) -> None:
+        self._run_start = start
+        self._unfed = start - chunk[0]
+        self._tail.append(chunk)
+
+    def _close_run(self, end: int, unfed: np.ndarray | None = None) -> StreamWindow:
+        """`unfed` holds the samples of the run in the current chunk not yet passed to the accumulator."""
+        first = self._tail[0][0]
+        if len(self._tail) == 1:
+            # A run within one chunk is a view on it, without copies
+            _, data, timestamps = self._tail[0]
+        else:
+            data = np.concatenate([tail_data for _, tail_data, _ in self._tail])
+            timestamps = np.concatenate([tail_timestamps for _, _, tail_timestamps in self._tail])
+        window = StreamWindow(
+            start=self._run_start,
+            end=end,
+            data=data[self._run_start - first:end - first],
+            impulse_timestamps=timestamps[self._run_start - first:end - first],
         )
-    ]
-    
-    os.makedirs("data" / Path(OUTPUT_DIR), exist_ok=True)
-    for action in filtered_dataset:
-        if action is None:
+        if self._accumulator is not None:
+            if unfed is not None:
+                self._accumulator.update_many(unfed)
+            window.features = self._accumulator.features()
+            self._accumulator.reset()
+        self._run_start = None
+        self._tail = []
+        self._average = CircularArray(self.window_size)
+        return window
+
+def find_max_subactions(
+    actions: list[RawAnnotatedAction] | list[ColumnarRawAnnotatedAction],
+    window_size: int = 3,
+    threshold: float = DEFAULT_THRESHOLD,
+    workers: int | None = None,
+    chunk_size: int = 64,
+) -> list[RawAnnotatedAction | ColumnarRawAnnotatedAction | None]:
+    """Applies `find_max_subaction` to every action, fanning chunks of actions out to a process pool.
+    The output follows the order of `actions`."""
+    filter_chunk = partial(_find_max_subaction_chunk, window_size=window_size, threshold=threshold)
+    chunks = [actions[i:i + chunk_size] for i in range(0, len(actions), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        return [subaction for chunk in chunks for subaction in filter_chunk(chunk)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        return [subaction for filtered in executor.map(filter_chunk, chunks) for subaction in filtered]
+
+def _find_max_subaction_chunk(actions, window_size: int, threshold: float):
+    return [find_max_subaction(action, window_size=window_size, threshold=threshold) for action in actions]
+
+# Written next to the output folder, so that the loaders globbing "*.json" inside it never see it
+MANIFEST_SUFFIX = ".manifest"
+# Manifest name of the older versions, inside the output folder
+LEGACY_MANIFEST_FILE = ".resample_manifest.json"
+# Changed recordings filtered together, the manifest is saved after every batch
+RESAMPLE_BATCH_SIZE = 1024
+
+def resample_directory(
+    input_dir: Path,
+    output_dir: Path,
+    window_size: int = 1,
+    threshold: float = DEFAULT_THRESHOLD,
+    force: bool = False,
+    manifest_path: Path | None = None,
+    workers: int | None = None,
+) -> dict[str, int]:
+    """Incrementally writes the max subaction of every recording of `input_dir` to `output_dir`.
+
+    A manifest records for every input its mtime, the sha256 of its content, the filter
+    parameters and the output it produced. Only new recordings, recordings whose content
+    changed and recordings filtered with other parameters are processed again, in batches
+    parsed and filtered in a process pool by `load_recordings` and `find_max_subactions`.
+    Outputs are written to a temporary file and renamed in place, and the outputs of deleted
+    recordings are removed.
+
+    Args:
+        input_dir: folder with the raw JSON recordings
+        output_dir: folder receiving the filtered recordings
+        window_size: size of the moving average window of `find_max_subaction`
+        threshold: intensity threshold of `find_max_subaction`
+        force: ignore the manifest and process every recording
+        manifest_path: where the manifest is kept, defaults to `<output_dir>.manifest`
+        workers: number of processes, defaults to the number of CPUs
+
+    Returns:
+        The number of processed, skipped and removed recordings
+    """
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = output_dir.with_name(output_dir.name + MANIFEST_SUFFIX)
+    manifest_path = Path(manifest_path)
+    legacy_manifest_path = output_dir / LEGACY_MANIFEST_FILE
+    manifest = {}
+    if not force:
+        for path in (manifest_path, legacy_manifest_path):
+            if path.exists():
+                with open(path, "r") as f:
+                    manifest = json.load(f)
+                break
+    params = {"window_size": window_size, "threshold": threshold}
+    stats = {"processed": 0, "skipped": 0, "removed": 0}
+
+    input_paths = sorted(Path(file_path) for file_path in glob.glob(os.path.join(input_dir, "*.json")))
+    input_names = {path.name for path in input_paths}
+    for name in [name for name in manifest if name not in input_names]:
+        _remove_output(output_dir, manifest.pop(name))
+        stats["removed"] += 1
+
+    changed = []  # (path, mtime, sha256)
+    for path in input_paths:
+        entry = manifest.get(path.name)
+        mtime = path.stat().st_mtime
+        if entry is not None and entry["params"] == params and entry["mtime"] == mtime:
+            stats["skipped"] += 1
+            continue
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if entry is not None and entry["params"] == params and entry["sha256"] == digest:
+            # Touched but not modified
+            entry["mtime"] = mtime
+            stats["skipped"] += 1
             continue
-        dst_path = action.file_path.replace(INPUT_DIR, OUTPUT_DIR, 1)
-        print(action.file_path)
-        print(dst_path)
-        with open(dst_path, 'w') as f:
-            json.dump(action.to_dict(), f)
-    
\ No newline at end of file
+        changed.append((path, mtime, digest))
+
+    for start in range(0, len(changed), RESAMPLE_BATCH_SIZE):
+        batch = changed[start:start + RESAMPLE_BATCH_SIZE]
+        actions = load_recordings([str(path) for path, _, _ in batch], workers=workers, progress=False)
+        subactions = find_max_subactions(actions, window_size=window_size, threshold=threshold, workers=workers)
+        for (path, mtime, digest), subaction in zip(batch, subactions):
+            entry = manifest.get(path.name)
+            if entry is not None:
+                _remove_output(output_dir, entry)
+            output = None
+            if subaction is not None:
+                output = path.name
+                tmp_path = output_dir / f"{output}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(subaction.to_dict(), f)
+                os.replace(tmp_path, output_dir / output)
+            manifest[path.name] = {"mtime": mtime, "sha256": digest, "params": params, "output": output}
+            stats["processed"] += 1
+        # Saving as we go lets an interrupted run resume where it stopped
+        _save_manifest(manifest_path, manifest)
+    _save_manifest(manifest_path, manifest)
+    legacy_manifest_path.unlink(missing_ok=True)
+    return stats
+
+def _remove_output(output_dir: Path, entry: dict) -> None:
+    if entry.get("output"):
+        (output_dir / entry["output"]).unlink(missing_ok=True)
+
+def _save_manifest(manifest_path: Path, manifest: dict) -> None:
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Write the max subaction of every new or changed recording")
+    parser.add_argument("--input", type=Path, default=Path("data/training_data"))
+    parser.add_argument("--output", type=Path, default=Path("data/filtered_training_data"))
+    parser.add_argument("--window-size", type=int, default=1)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--workers", type=int, default=None, help="processes used by find_max_subactions")
+    parser.add_argument("--manifest", type=Path, default=None, help="defaults to <output>.manifest")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest")
+    args = parser.parse_args()
+
+    stats = resample_directory(
+        args.input,
+        args.output,
+        window_size=args.window_size,
+        threshold=args.threshold,
+        force=args.force,
+        manifest_path=args.manifest,
+        workers=args.workers,
+    )
+    print(f"Processed {stats['processed']}, skipped {stats['skipped']}, removed {stats['removed']} recordings")
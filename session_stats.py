@@ -0,0 +1,104 @@
+import threading
+from typing import Dict, Optional
+
+from storage_backend import StorageBackend
+
+
+class SessionStatsAggregator:
+    """Accumula in memoria i pugni rilevati e li scrive sul database a intervalli
+
+    Ogni pugno aggiorna solo un contatore locale; un thread in background scrive i totali
+    di ogni sessione con una sola transazione (StorageBackend.update_session_stats) ogni
+    `flush_interval` secondi, oppure prima se una sessione accumula `max_pending_punches` pugni.
+    /end_session deve chiamare flush(session_id) prima di leggere le statistiche.
+    """
+
+    def __init__(self, db_manager: StorageBackend, flush_interval: float = 2.0, max_pending_punches: int = 20):
+        """
+        Args:
+            db_manager: Backend usato per scrivere le statistiche
+            flush_interval: Secondi massimi prima che un pugno venga scritto
+            max_pending_punches: Pugni in attesa oltre i quali la scrittura viene anticipata
+        """
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.max_pending_punches = max_pending_punches
+        self._pending: Dict[str, list] = {}  # session_id -> [pugni, intensità totale]
+        self._lock = threading.Lock()
+        # Serializza le scritture della stessa istanza, le transazioni gestiscono gli altri processi
+        self._flush_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='session-stats-flusher', daemon=True)
+        self._worker.start()
+
+    def add_punch(self, session_id: str, intensity: float) -> None:
+        """
+        Registra un pugno senza accedere al database
+
+        Args:
+            session_id: ID della sessione
+            intensity: Intensità del pugno
+        """
+        with self._lock:
+            pending = self._pending.setdefault(session_id, [0, 0.0])
+            pending[0] += 1
+            pending[1] += intensity
+            if pending[0] >= self.max_pending_punches:
+                self._wake_up.set()
+
+    def pending_punches(self, session_id: str) -> int:
+        with self._lock:
+            return self._pending.get(session_id, [0, 0.0])[0]
+
+    def flush(self, session_id: Optional[str] = None) -> bool:
+        """
+        Scrive sul database i pugni in attesa
+
+        Args:
+            session_id: Sessione da scrivere, tutte se None
+
+        Returns:
+            True se tutte le scritture sono riuscite, False altrimenti
+        """
+        with self._flush_lock:
+            with self._lock:
+                if session_id is None:
+                    to_flush = self._pending
+                    self._pending = {}
+                elif session_id in self._pending:
+                    to_flush = {session_id: self._pending.pop(session_id)}
+                else:
+                    to_flush = {}
+
+            success = True
+            for flushed_session_id, (punch_count, intensity_sum) in to_flush.items():
+                if not self.db_manager.update_session_stats(flushed_session_id, punch_count, intensity_sum):
+                    success = False
+                    if self.db_manager.get_training_session(flushed_session_id) is None:
+                        print(f"Sessione {flushed_session_id} non trovata, {punch_count} pugni scartati")
+                        continue
+                    # Rimette in coda i pugni non scritti per il prossimo tentativo
+                    with self._lock:
+                        pending = self._pending.setdefault(flushed_session_id, [0, 0.0])
+                        pending[0] += punch_count
+                        pending[1] += intensity_sum
+            return success
+
+    def discard(self, session_id: str) -> None:
+        """Scarta i pugni in attesa di una sessione eliminata"""
+        with self._lock:
+            self._pending.pop(session_id, None)
+
+    def close(self) -> None:
+        """Ferma il thread in background dopo un'ultima scrittura"""
+        self._stopped.set()
+        self._wake_up.set()
+        self._worker.join()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake_up.wait(timeout=self.flush_interval)
+            self._wake_up.clear()
+            self.flush()
+        self.flush()
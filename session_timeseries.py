@@ -0,0 +1,189 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SAMPLES_FILE = 'samples.f32'
+TIMESTAMPS_FILE = 'timestamps.i64'
+INDEX_FILE = 'index.i64'
+
+# Righe dell'indice: campione iniziale, numero di campioni, timestamp minimo e massimo del chunk
+INDEX_COLUMNS = 4
+SAMPLE_DTYPE = np.dtype('<f4')
+TIMESTAMP_DTYPE = np.dtype('<i8')
+
+
+class SessionTimeSeriesStore:
+    """Archivio locale, solo in aggiunta, delle accelerazioni grezze di ogni sessione
+
+    Ogni sessione è una cartella con tre file binari little-endian:
+    - samples.f32: campioni x, y, z interlacciati in float32
+    - timestamps.i64: timestamp in ms di ogni campione
+    - index.i64: una riga per ogni chunk aggiunto (primo campione, numero di campioni,
+      timestamp minimo, timestamp massimo)
+
+    Aggiungere un chunk scrive in coda ai tre file, con costo indipendente dalla lunghezza
+    della sessione. L'indice viene scritto per ultimo e fa da commit: i campioni oltre
+    l'ultimo chunk indicizzato (scrittura interrotta) vengono ignorati e sovrascritti.
+    """
+
+    def __init__(self, root: str = 'data/timeseries'):
+        """
+        Args:
+            root: Cartella che contiene una sottocartella per ogni sessione
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        # Campioni committati per sessione, così append non rilegge l'indice
+        self._counts: Dict[str, int] = {}
+        self._locks_lock = threading.Lock()
+
+    def _session_path(self, session_id: str) -> Path:
+        if not session_id or os.sep in session_id or session_id in ('.', '..'):
+            raise ValueError(f"ID di sessione non valido: {session_id!r}")
+        return self.root / session_id
+
+    def _lock(self, session_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    def __contains__(self, session_id: str) -> bool:
+        return (self._session_path(session_id) / INDEX_FILE).exists()
+
+    def sessions(self) -> List[str]:
+        """ID delle sessioni con almeno un chunk"""
+        return sorted(path.parent.name for path in self.root.glob(f'*/{INDEX_FILE}'))
+
+    def chunk_index(self, session_id: str) -> np.ndarray:
+        """
+        Indice dei chunk di una sessione
+
+        Returns:
+            Array (n_chunk, 4) int64 con primo campione, numero di campioni,
+            timestamp minimo e massimo di ogni chunk
+        """
+        path = self._session_path(session_id) / INDEX_FILE
+        if not path.exists():
+            return np.empty((0, INDEX_COLUMNS), dtype=np.int64)
+        index = np.fromfile(path, dtype=TIMESTAMP_DTYPE)
+        # Una riga incompleta è un commit interrotto
+        return index[:len(index) // INDEX_COLUMNS * INDEX_COLUMNS].reshape(-1, INDEX_COLUMNS)
+
+    def sample_count(self, session_id: str) -> int:
+        index = self.chunk_index(session_id)
+        return int(index[-1, 0] + index[-1, 1]) if len(index) else 0
+
+    def append(self, session_id: str, x: np.ndarray, y: np.ndarray,
+               z: np.ndarray, timestamps: np.ndarray) -> int:
+        """
+        Aggiunge un chunk di campioni in coda alla sessione
+
+        Args:
+            session_id: ID della sessione
+            x, y, z: Accelerazioni lungo i tre assi
+            timestamps: Timestamp in ms di ogni campione
+
+        Returns:
+            Numero totale di campioni della sessione dopo l'aggiunta
+        """
+        timestamps = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        samples = np.column_stack([x, y, z]).astype(SAMPLE_DTYPE, copy=False)
+        if len(samples) != len(timestamps):
+            raise ValueError(f"{len(samples)} campioni ma {len(timestamps)} timestamp")
+
+        path = self._session_path(session_id)
+        with self._lock(session_id):
+            path.mkdir(parents=True, exist_ok=True)
+            start = self._counts.get(session_id)
+            if start is None:
+                start = self.sample_count(session_id)
+            if len(timestamps) == 0:
+                return start
+            # Scrive dalla fine dell'ultimo chunk indicizzato, scartando eventuali code non committate
+            for file_name, values, item_size in (
+                (SAMPLES_FILE, samples, 3 * SAMPLE_DTYPE.itemsize),
+                (TIMESTAMPS_FILE, timestamps, TIMESTAMP_DTYPE.itemsize),
+            ):
+                with open(path / file_name, 'ab') as f:
+                    if f.tell() != start * item_size:
+                        f.truncate(start * item_size)
+                    f.write(values.tobytes())
+            index_row = np.array([start, len(timestamps), timestamps.min(), timestamps.max()], dtype=TIMESTAMP_DTYPE)
+            with open(path / INDEX_FILE, 'ab') as f:
+                f.truncate(f.tell() // (INDEX_COLUMNS * TIMESTAMP_DTYPE.itemsize) * INDEX_COLUMNS * TIMESTAMP_DTYPE.itemsize)
+                f.write(index_row.tobytes())
+            self._counts[session_id] = start + len(timestamps)
+            return start + len(timestamps)
+
+    def read_session(self, session_id: str) -> Dict[str, np.ndarray]:
+        """
+        Legge tutti i campioni di una sessione mappando i file in memoria
+
+        Returns:
+            Dizionario con 'timestamp' (int64) e 'x', 'y', 'z' (float32), nell'ordine di
+            arrivo; gli array sono viste in sola lettura sui file
+        """
+        count = self.sample_count(session_id)
+        if count == 0:
+            return _empty_series()
+        path = self._session_path(session_id)
+        samples = np.memmap(path / SAMPLES_FILE, dtype=SAMPLE_DTYPE, mode='r', shape=(count, 3))
+        timestamps = np.memmap(path / TIMESTAMPS_FILE, dtype=TIMESTAMP_DTYPE, mode='r', shape=(count,))
+        return {'timestamp': timestamps, 'x': samples[:, 0], 'y': samples[:, 1], 'z': samples[:, 2]}
+
+    def read_range(self, session_id: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Legge i campioni con timestamp in [start_ms, end_ms)
+
+        Vengono letti dal disco solo i chunk il cui intervallo di timestamp interseca la richiesta.
+
+        Args:
+            session_id: ID della sessione
+            start_ms: Timestamp iniziale incluso, None per l'inizio della sessione
+            end_ms: Timestamp finale escluso, None per la fine della sessione
+
+        Returns:
+            Dizionario con gli array 'timestamp', 'x', 'y', 'z' nell'ordine di arrivo
+        """
+        index = self.chunk_index(session_id)
+        selected = np.ones(len(index), dtype=bool)
+        if start_ms is not None:
+            selected &= index[:, 3] >= start_ms
+        if end_ms is not None:
+            selected &= index[:, 2] < end_ms
+        if not selected.any():
+            return _empty_series()
+
+        series = self.read_session(session_id)
+        parts = {key: [] for key in series}
+        for first, count, _, _ in index[selected]:
+            chunk_timestamps = np.asarray(series['timestamp'][first:first + count])
+            mask = np.ones(count, dtype=bool)
+            if start_ms is not None:
+                mask &= chunk_timestamps >= start_ms
+            if end_ms is not None:
+                mask &= chunk_timestamps < end_ms
+            for key, values in series.items():
+                parts[key].append(np.asarray(values[first:first + count])[mask])
+        return {key: np.concatenate(values) for key, values in parts.items()}
+
+    def delete(self, session_id: str) -> None:
+        """Elimina tutti i campioni di una sessione"""
+        with self._lock(session_id):
+            shutil.rmtree(self._session_path(session_id), ignore_errors=True)
+            self._counts.pop(session_id, None)
+        with self._locks_lock:
+            self._locks.pop(session_id, None)
+
+
+def _empty_series() -> Dict[str, np.ndarray]:
+    return {
+        'timestamp': np.empty(0, dtype=np.int64),
+        'x': np.empty(0, dtype=np.float32),
+        'y': np.empty(0, dtype=np.float32),
+        'z': np.empty(0, dtype=np.float32),
+    }
@@ -0,0 +1,449 @@
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+import sqlite3
+import threading
+import uuid
+import numpy as np
+
+from storage_backend import (
+    ACCELERATION_CHUNK_MAX_SAMPLES,
+    SESSION_PAGE_SIZE,
+    SESSION_STATS_FIELDS,
+    StorageBackend,
+    User,
+    add_session_contribution,
+    apply_punch_stats,
+    concatenate_acceleration_chunks,
+    decode_acceleration_chunk,
+    empty_user_stats,
+    encode_acceleration_chunk,
+    user_stats_summary,
+)
+
+# Colonne aggiornabili di una sessione, update_training_session rifiuta le altre
+SESSION_COLUMNS = ('user_id', 'date', 'duration', 'punch_count', 'avg_intensity', 'intensity_sum')
+ACCELERATION_COLUMNS = ('timestamp', 'acceleration_x', 'acceleration_y', 'acceleration_z')
+USER_STATS_COLUMNS = ('session_count', 'total_punches', 'avg_intensity_sum', 'avg_intensity_count')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS training_sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    duration REAL NOT NULL DEFAULT 0,
+    punch_count INTEGER NOT NULL DEFAULT 0,
+    avg_intensity REAL NOT NULL DEFAULT 0,
+    intensity_sum REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_training_sessions_user_date ON training_sessions (user_id, date);
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id TEXT PRIMARY KEY,
+    session_count INTEGER NOT NULL,
+    total_punches INTEGER NOT NULL,
+    avg_intensity_sum REAL NOT NULL,
+    avg_intensity_count INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS accelerations (
+    id INTEGER PRIMARY KEY,
+    training_session_id TEXT NOT NULL,
+    timestamp TEXT,
+    acceleration_x REAL,
+    acceleration_y REAL,
+    acceleration_z REAL
+);
+CREATE INDEX IF NOT EXISTS idx_accelerations_session ON accelerations (training_session_id);
+
+CREATE TABLE IF NOT EXISTS acceleration_chunks (
+    id INTEGER PRIMARY KEY,
+    training_session_id TEXT NOT NULL,
+    start_timestamp INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    timestamp_deltas BLOB NOT NULL,
+    x BLOB NOT NULL,
+    y BLOB NOT NULL,
+    z BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_acceleration_chunks_session ON acceleration_chunks (training_session_id);
+"""
+
+
+class SQLiteDBManager(StorageBackend):
+    """Classe per gestire tutte le operazioni con un database SQLite locale
+
+    Pensata per installazioni in una singola palestra e per i test di carico, senza
+    accessi alla rete. Il database è in modalità WAL, così le letture delle richieste
+    non aspettano le scritture; ogni thread usa la propria connessione.
+    """
+
+    def __init__(self, path: str = 'data/boxeproject.db', user_cache_size: int = 1024, user_cache_ttl: float = 60.0):
+        """
+        Inizializza il database SQLite, creando tabelle e indici se mancano
+
+        Args:
+            path: Percorso del file del database, ':memory:' non è supportato perché
+                ogni thread aprirebbe un database diverso
+            user_cache_size: Numero massimo di utenti tenuti in memoria da load_user
+            user_cache_ttl: Secondi dopo i quali un utente in cache viene riletto
+        """
+        super().__init__(user_cache_size=user_cache_size, user_cache_ttl=user_cache_ttl)
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # isolation_level=None: le transazioni sono aperte esplicitamente da _transaction
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """Transazione che prende subito il lock di scrittura, per le letture seguite da scritture"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    # ==================== USER OPERATIONS ====================
+
+    def update_user(self, user_id: str, updates: Dict) -> bool:
+        """
+        Aggiorna il profilo di un utente e lo scarta dalla cache
+
+        Args:
+            user_id: ID dell'utente
+            updates: Dizionario con i campi da aggiornare (username, password, email)
+
+        Returns:
+            True se aggiornamento riuscito, False altrimenti
+        """
+        try:
+            columns = [column for column in updates if column in ('username', 'password', 'email')]
+            if len(columns) != len(updates):
+                raise ValueError(f"Campi non validi: {set(updates) - set(columns)}")
+            assignments = ', '.join(f'{column} = ?' for column in columns)
+            with self._transaction() as connection:
+                connection.execute(f'UPDATE users SET {assignments} WHERE id = ?',
+                                   [updates[column] for column in columns] + [user_id])
+            return True
+        except Exception as e:
+            print(f"Error updating user: {e}")
+            return False
+        finally:
+            self.invalidate_user(user_id)
+
+    def _read_user(self, user_id: str) -> Optional[User]:
+        try:
+            row = self._connection().execute('SELECT username, email FROM users WHERE id = ?', (user_id,)).fetchone()
+            if row is not None:
+                return User(user_id, row['username'], row['email'])
+            return None
+        except Exception as e:
+            print(f"Error loading user: {e}")
+            return None
+
+    def check_username_exists(self, username: str) -> bool:
+        try:
+            return self._connection().execute('SELECT 1 FROM users WHERE id = ?', (username,)).fetchone() is not None
+        except Exception as e:
+            print(f"Error checking username: {e}")
+            return False
+
+    def check_email_exists(self, email: str) -> bool:
+        try:
+            return self._connection().execute('SELECT 1 FROM users WHERE email = ? LIMIT 1', (email,)).fetchone() is not None
+        except Exception as e:
+            print(f"Error checking email: {e}")
+            return False
+
+    def create_user(self, username: str, password: str, email: str) -> bool:
+        try:
+            with self._transaction() as connection:
+                # Come Firestore set(): un utente con lo stesso username viene sovrascritto
+                connection.execute('INSERT OR REPLACE INTO users (id, username, password, email) VALUES (?, ?, ?, ?)',
+                                   (username, username, password, email))
+            self.invalidate_user(username)
+            return True
+        except Exception as e:
+            print(f"Error creating user: {e}")
+            return False
+
+    def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        try:
+            row = self._connection().execute('SELECT password, email FROM users WHERE id = ?', (username,)).fetchone()
+            if row is not None and row['password'] == password:
+                return User(username, username, row['email'])
+            return None
+        except Exception as e:
+            print(f"Error during authentication: {e}")
+            return None
+
+    # ==================== TRAINING SESSION OPERATIONS ====================
+
+    def get_user_sessions(self, user_id: str, valid_only: bool = False) -> List[Dict]:
+        try:
+            query = 'SELECT id, date, duration, punch_count, avg_intensity FROM training_sessions WHERE user_id = ?'
+            if valid_only:
+                query += ' AND punch_count > 0'
+            return [dict(row) for row in self._connection().execute(query, (user_id,))]
+        except Exception as e:
+            print(f"Error getting user sessions: {e}")
+            return []
+
+    def get_user_sessions_page(self, user_id: str, page_size: int = SESSION_PAGE_SIZE,
+                               cursor: Optional[str] = None,
+                               with_duration: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Recupera una pagina delle sessioni con pugni di un utente, dalla più recente
+
+        Usa l'indice (user_id, date); a parità di data le sessioni sono ordinate per ID.
+
+        Args:
+            user_id: ID dell'utente
+            page_size: Numero massimo di sessioni nella pagina
+            cursor: ID dell'ultima sessione della pagina precedente, None per la prima pagina
+            with_duration: Esclude anche le sessioni con durata 0
+
+        Returns:
+            Tupla (lista di dizionari con i dati delle sessioni, cursore della pagina
+            successiva o None se non ci sono altre sessioni)
+        """
+        try:
+            connection = self._connection()
+            query = ('SELECT id, date, duration, punch_count, avg_intensity FROM training_sessions '
+                     'WHERE user_id = ? AND punch_count > 0')
+            params = [user_id]
+            if with_duration:
+                query += ' AND duration > 0'
+            if cursor:
+                cursor_row = connection.execute('SELECT date FROM training_sessions WHERE id = ? AND user_id = ?',
+                                                (cursor, user_id)).fetchone()
+                if cursor_row is None:
+                    return [], None
+                query += ' AND (date < ? OR (date = ? AND id < ?))'
+                params += [cursor_row['date'], cursor_row['date'], cursor]
+            query += ' ORDER BY date DESC, id DESC LIMIT ?'
+            # Una riga in più dice se esiste una pagina successiva
+            rows = connection.execute(query, params + [page_size + 1]).fetchall()
+
+            sessions_data = [dict(row) for row in rows[:page_size]]
+            next_cursor = sessions_data[-1]['id'] if len(rows) > page_size else None
+            return sessions_data, next_cursor
+        except Exception as e:
+            print(f"Error getting user sessions page: {e}")
+            return [], None
+
+    def get_user_stats(self, user_id: str) -> Dict:
+        try:
+            row = self._connection().execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+            if row is not None:
+                return user_stats_summary(dict(row))
+            return user_stats_summary(self.rebuild_user_stats(user_id))
+        except Exception as e:
+            print(f"Error calculating user stats: {e}")
+            return {'session_count': 0, 'total_punches': 0, 'avg_intensity': 0}
+
+    def rebuild_user_stats(self, user_id: str) -> Dict:
+        with self._transaction() as connection:
+            totals = empty_user_stats()
+            for row in connection.execute('SELECT punch_count, avg_intensity FROM training_sessions WHERE user_id = ?',
+                                          (user_id,)):
+                add_session_contribution(totals, dict(row), 1)
+            self._write_user_stats(connection, user_id, totals)
+        return totals
+
+    def rebuild_all_user_stats(self) -> int:
+        with self._transaction() as connection:
+            totals_by_user = {row['id']: empty_user_stats() for row in connection.execute('SELECT id FROM users')}
+            for row in connection.execute('SELECT user_id, punch_count, avg_intensity FROM training_sessions'):
+                totals = totals_by_user.setdefault(row['user_id'], empty_user_stats())
+                add_session_contribution(totals, dict(row), 1)
+            connection.executemany(
+                f'INSERT OR REPLACE INTO user_stats (user_id, {", ".join(USER_STATS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)',
+                [(user_id, *(totals[column] for column in USER_STATS_COLUMNS)) for user_id, totals in totals_by_user.items()]
+            )
+        return len(totals_by_user)
+
+    def create_training_session(self, user_id: str, date_str: str) -> Optional[str]:
+        try:
+            session_id = uuid.uuid4().hex
+            with self._transaction() as connection:
+                connection.execute('INSERT INTO training_sessions (id, user_id, date) VALUES (?, ?, ?)',
+                                   (session_id, user_id, date_str))
+            return session_id
+        except Exception as e:
+            print(f"Error creating training session: {e}")
+            return None
+
+    def get_training_session(self, session_id: str) -> Optional[Dict]:
+        try:
+            row = self._connection().execute(f'SELECT {", ".join(SESSION_COLUMNS)} FROM training_sessions WHERE id = ?',
+                                             (session_id,)).fetchone()
+            return dict(row) if row is not None else None
+        except Exception as e:
+            print(f"Error getting training session: {e}")
+            return None
+
+    def update_training_session(self, session_id: str, updates: Dict) -> bool:
+        try:
+            return self._change_session(session_id, lambda session_data: updates)
+        except Exception as e:
+            print(f"Error updating training session: {e}")
+            return False
+
+    def delete_training_session(self, session_id: str) -> bool:
+        try:
+            self._change_session(session_id, lambda session_data: None)
+            return True
+        except Exception as e:
+            print(f"Error deleting training session: {e}")
+            return False
+
+    def update_session_stats(self, session_id: str, new_punch_count: int, new_intensity: float) -> bool:
+        try:
+            return self._change_session(
+                session_id, lambda session_data: apply_punch_stats(session_data, new_punch_count, new_intensity))
+        except Exception as e:
+            print(f"Error updating session stats: {e}")
+            return False
+
+    def _change_session(self, session_id: str, compute_updates) -> bool:
+        """
+        Aggiorna o elimina una sessione e l'aggregato del suo utente in una transazione
+
+        Args:
+            session_id: ID della sessione
+            compute_updates: Funzione che riceve i dati attuali della sessione e restituisce
+                i campi da aggiornare, oppure None per eliminarla
+
+        Returns:
+            True se la sessione esisteva, False altrimenti
+        """
+        with self._transaction() as connection:
+            row = connection.execute(f'SELECT {", ".join(SESSION_COLUMNS)} FROM training_sessions WHERE id = ?',
+                                     (session_id,)).fetchone()
+            if row is None:
+                return False
+            session_data = dict(row)
+
+            updates = compute_updates(session_data)
+            if updates is None:
+                connection.execute('DELETE FROM training_sessions WHERE id = ?', (session_id,))
+            else:
+                invalid = set(updates) - set(SESSION_COLUMNS)
+                if invalid:
+                    raise ValueError(f"Campi non validi: {invalid}")
+                assignments = ', '.join(f'{column} = ?' for column in updates)
+                connection.execute(f'UPDATE training_sessions SET {assignments} WHERE id = ?',
+                                   [*updates.values(), session_id])
+
+            if updates is None or any(field in updates for field in SESSION_STATS_FIELDS):
+                stats_row = connection.execute('SELECT * FROM user_stats WHERE user_id = ?',
+                                               (session_data['user_id'],)).fetchone()
+                # Senza aggregato non c'è nulla da correggere: get_user_stats lo ricostruirà
+                if stats_row is not None:
+                    totals = dict(stats_row)
+                    add_session_contribution(totals, session_data, -1)
+                    if updates is not None:
+                        add_session_contribution(totals, {**session_data, **updates}, 1)
+                    self._write_user_stats(connection, session_data['user_id'], totals)
+            return True
+
+    @staticmethod
+    def _write_user_stats(connection: sqlite3.Connection, user_id: str, totals: Dict) -> None:
+        connection.execute(
+            f'INSERT OR REPLACE INTO user_stats (user_id, {", ".join(USER_STATS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)',
+            (user_id, *(totals[column] for column in USER_STATS_COLUMNS))
+        )
+
+    # ==================== ACCELERATION DATA OPERATIONS ====================
+
+    def save_accelerations_bulk(self, accelerations: List[Dict], workers: int = 4, max_retries: int = 3) -> Dict:
+        """
+        Salva le accelerazioni con un solo executemany in una transazione
+
+        workers e max_retries esistono per compatibilità con DBManager: SQLite ha un solo
+        scrittore e attende fino a 30 secondi un lock occupato.
+        """
+        try:
+            with self._transaction() as connection:
+                connection.executemany(
+                    f'INSERT INTO accelerations (training_session_id, {", ".join(ACCELERATION_COLUMNS)}) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(acceleration['training_session_id'], *(acceleration.get(column) for column in ACCELERATION_COLUMNS))
+                     for acceleration in accelerations]
+                )
+            return {'written': len(accelerations), 'failed': 0, 'batches': 1, 'failed_batches': 0}
+        except Exception as e:
+            print(f"Error saving accelerations: {e}")
+            return {'written': 0, 'failed': len(accelerations), 'batches': 1, 'failed_batches': 1}
+
+    def get_session_accelerations(self, session_id: str) -> List[Dict]:
+        try:
+            rows = self._connection().execute(
+                f'SELECT id, training_session_id, {", ".join(ACCELERATION_COLUMNS)} FROM accelerations '
+                'WHERE training_session_id = ? ORDER BY id', (session_id,))
+            return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error getting session accelerations: {e}")
+            return []
+
+    def save_acceleration_arrays(self, session_id: str, x: np.ndarray, y: np.ndarray,
+                                 z: np.ndarray, timestamps: np.ndarray) -> bool:
+        try:
+            chunks = []
+            for start in range(0, len(timestamps), ACCELERATION_CHUNK_MAX_SAMPLES):
+                end = start + ACCELERATION_CHUNK_MAX_SAMPLES
+                chunk = encode_acceleration_chunk(session_id, x[start:end], y[start:end], z[start:end], timestamps[start:end])
+                chunks.append((session_id, chunk['start_timestamp'], chunk['count'],
+                               chunk['timestamp_deltas'], chunk['x'], chunk['y'], chunk['z']))
+            with self._transaction() as connection:
+                connection.executemany(
+                    'INSERT INTO acceleration_chunks '
+                    '(training_session_id, start_timestamp, count, timestamp_deltas, x, y, z) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    chunks
+                )
+            return True
+        except Exception as e:
+            print(f"Error saving acceleration chunks: {e}")
+            return False
+
+    def get_session_acceleration_series(self, session_id: str) -> Dict[str, np.ndarray]:
+        try:
+            rows = self._connection().execute(
+                'SELECT start_timestamp, count, timestamp_deltas, x, y, z FROM acceleration_chunks '
+                'WHERE training_session_id = ?', (session_id,))
+            chunks = [decode_acceleration_chunk(dict(row)) for row in rows]
+        except Exception as e:
+            print(f"Error getting session acceleration series: {e}")
+            chunks = []
+        return concatenate_acceleration_chunks(chunks)
+
+    def delete_session_accelerations(self, session_id: str, workers: int = 4) -> bool:
+        try:
+            with self._transaction() as connection:
+                connection.execute('DELETE FROM accelerations WHERE training_session_id = ?', (session_id,))
+                connection.execute('DELETE FROM acceleration_chunks WHERE training_session_id = ?', (session_id,))
+            return True
+        except Exception as e:
+            print(f"Error deleting session accelerations: {e}")
+            return False
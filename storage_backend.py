@@ -0,0 +1,470 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+import threading
+import uuid
+
+import numpy as np
+from flask_login import UserMixin
+
+from user_cache import TTLCache
+
+# Stati dei job in background conservati, i più vecchi vengono dimenticati
+MAX_TRACKED_JOBS = 1024
+
+# Campioni per documento di 'acceleration_chunks': 20 byte a campione, ~160 KB,
+# ben sotto il limite di 1 MiB per documento di Firestore
+ACCELERATION_CHUNK_MAX_SAMPLES = 8192
+
+# Campi delle sessioni mostrati da /stats e /training
+SESSION_LIST_FIELDS = ('date', 'duration', 'punch_count', 'avg_intensity')
+# Sessioni per pagina nelle liste paginate
+SESSION_PAGE_SIZE = 20
+
+# Campi di una sessione che contribuiscono alle statistiche aggregate dell'utente
+SESSION_STATS_FIELDS = ('punch_count', 'avg_intensity')
+
+# Backend disponibili per create_storage_backend
+STORAGE_BACKENDS = ('firestore', 'sqlite')
+
+
+class User(UserMixin):
+    """Classe User per Flask-Login"""
+
+    def __init__(self, user_id: str, username: str, email: str):
+        self.id = user_id
+        self.username = username
+        self.email = email
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+
+class StorageBackend(ABC):
+    """Interfaccia comune ai database dell'applicazione
+
+    Le sottoclassi implementano le operazioni su utenti, sessioni e accelerazioni;
+    la cache degli utenti, i job in background e le utility sono condivisi.
+    Implementazioni: DBManager (Firestore) e SQLiteDBManager (SQLite locale).
+    """
+
+    def __init__(self, user_cache_size: int = 1024, user_cache_ttl: float = 60.0):
+        """
+        Args:
+            user_cache_size: Numero massimo di utenti tenuti in memoria da load_user
+            user_cache_ttl: Secondi dopo i quali un utente in cache viene riletto
+        """
+        self.user_cache = TTLCache(self._read_user, max_size=user_cache_size, ttl=user_cache_ttl)
+        # Esegue le operazioni lunghe fuori dal percorso delle richieste
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='db-background')
+        self._jobs: Dict[str, str] = OrderedDict()
+        self._jobs_lock = threading.Lock()
+
+    # ==================== USER OPERATIONS ====================
+
+    def load_user(self, user_id: str) -> Optional[User]:
+        """
+        Carica un utente per Flask-Login, dalla cache se letto da meno di user_cache_ttl secondi
+
+        Args:
+            user_id: ID dell'utente
+
+        Returns:
+            User object o None se non trovato
+        """
+        return self.user_cache.get(user_id)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Scarta l'utente dalla cache, da chiamare dopo ogni modifica del profilo"""
+        self.user_cache.invalidate(user_id)
+
+    @abstractmethod
+    def _read_user(self, user_id: str) -> Optional[User]:
+        """Legge un utente dal database, senza passare dalla cache"""
+
+    @abstractmethod
+    def update_user(self, user_id: str, updates: Dict) -> bool:
+        """Aggiorna il profilo di un utente, deve chiamare invalidate_user"""
+
+    @abstractmethod
+    def check_username_exists(self, username: str) -> bool:
+        """Controlla se un username esiste già"""
+
+    @abstractmethod
+    def check_email_exists(self, email: str) -> bool:
+        """Controlla se un'email esiste già"""
+
+    @abstractmethod
+    def create_user(self, username: str, password: str, email: str) -> bool:
+        """Crea un nuovo utente, con ID uguale allo username"""
+
+    @abstractmethod
+    def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        """Restituisce l'utente se username e password sono corretti"""
+
+    # ==================== TRAINING SESSION OPERATIONS ====================
+
+    @abstractmethod
+    def get_user_sessions(self, user_id: str, valid_only: bool = False) -> List[Dict]:
+        """Tutte le sessioni di un utente, solo quelle con pugni se valid_only"""
+
+    @abstractmethod
+    def get_user_sessions_page(self, user_id: str, page_size: int = SESSION_PAGE_SIZE,
+                               cursor: Optional[str] = None,
+                               with_duration: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """Una pagina delle sessioni con pugni (e durata se with_duration), dalla più recente,
+        e il cursore della successiva"""
+
+    @abstractmethod
+    def get_user_stats(self, user_id: str) -> Dict:
+        """Statistiche dell'utente (session_count, total_punches, avg_intensity)"""
+
+    @abstractmethod
+    def rebuild_user_stats(self, user_id: str) -> Dict:
+        """Ricalcola le statistiche aggregate di un utente dalle sue sessioni"""
+
+    @abstractmethod
+    def rebuild_all_user_stats(self) -> int:
+        """Ricalcola le statistiche aggregate di tutti gli utenti"""
+
+    @abstractmethod
+    def create_training_session(self, user_id: str, date_str: str) -> Optional[str]:
+        """Crea una sessione e ne restituisce l'ID"""
+
+    @abstractmethod
+    def get_training_session(self, session_id: str) -> Optional[Dict]:
+        """Dati di una sessione o None se non trovata"""
+
+    @abstractmethod
+    def update_training_session(self, session_id: str, updates: Dict) -> bool:
+        """Aggiorna i campi di una sessione e, se servono, le statistiche dell'utente"""
+
+    @abstractmethod
+    def delete_training_session(self, session_id: str) -> bool:
+        """Elimina una sessione e la toglie dalle statistiche dell'utente"""
+
+    @abstractmethod
+    def update_session_stats(self, session_id: str, new_punch_count: int, new_intensity: float) -> bool:
+        """Aggiunge pugni a una sessione in modo atomico, False se la sessione non esiste"""
+
+    def calculate_session_duration(self, session_id: str) -> Optional[float]:
+        """
+        Calcola e aggiorna la durata di una sessione
+
+        Args:
+            session_id: ID della sessione
+
+        Returns:
+            Durata in minuti o None se errore
+        """
+        try:
+            session_data = self.get_training_session(session_id)
+            if not session_data:
+                return None
+
+            start_time_str = session_data.get('date')
+            start_time = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
+            end_time = datetime.now()
+            duration_seconds = int((end_time - start_time).total_seconds())
+            duration_minutes = round(duration_seconds / 60, 2)
+
+            # Aggiorna la sessione con la durata
+            self.update_training_session(session_id, {'duration': duration_minutes})
+
+            return duration_minutes
+        except Exception as e:
+            print(f"Error calculating session duration: {e}")
+            return None
+
+    # ==================== ACCELERATION DATA OPERATIONS ====================
+
+    def save_accelerations(self, accelerations: List[Dict]) -> bool:
+        """
+        Salva un batch di accelerazioni
+
+        Args:
+            accelerations: Lista di dizionari con i dati delle accelerazioni
+
+        Returns:
+            True se salvataggio riuscito, False altrimenti
+        """
+        return self.save_accelerations_bulk(accelerations)['failed'] == 0
+
+    @abstractmethod
+    def save_accelerations_bulk(self, accelerations: List[Dict], workers: int = 4, max_retries: int = 3) -> Dict:
+        """Salva le accelerazioni, restituisce un report con 'written', 'failed', 'batches', 'failed_batches'"""
+
+    @abstractmethod
+    def get_session_accelerations(self, session_id: str) -> List[Dict]:
+        """Accelerazioni salvate da save_accelerations per una sessione"""
+
+    @abstractmethod
+    def save_acceleration_arrays(self, session_id: str, x: np.ndarray, y: np.ndarray,
+                                 z: np.ndarray, timestamps: np.ndarray) -> bool:
+        """Salva una serie di accelerazioni in chunk compatti"""
+
+    @abstractmethod
+    def get_session_acceleration_series(self, session_id: str) -> Dict[str, np.ndarray]:
+        """Serie 'timestamp', 'x', 'y', 'z' di una sessione ordinata per timestamp"""
+
+    @abstractmethod
+    def delete_session_accelerations(self, session_id: str, workers: int = 4) -> bool:
+        """Elimina accelerazioni e chunk di una sessione"""
+
+    def save_acceleration_chunk(self, data: List[Dict], session_id: str) -> bool:
+        """
+        Salva un buffer di accelerazioni come un unico documento compatto
+
+        Args:
+            data: Lista di punti con coordinate x, y, z ed eventuale timestamp in ms
+            session_id: ID della sessione
+
+        Returns:
+            True se salvataggio riuscito, False altrimenti
+        """
+        return self.save_acceleration_arrays(session_id, *acceleration_points_to_arrays(data))
+
+    def delete_session_accelerations_async(self, session_id: str) -> str:
+        """
+        Avvia l'eliminazione delle accelerazioni di una sessione in background
+
+        Args:
+            session_id: ID della sessione
+
+        Returns:
+            ID del job da passare a get_job_status
+        """
+        job_id = uuid.uuid4().hex
+        self._set_job_status(job_id, 'pending')
+
+        def run():
+            self._set_job_status(job_id, 'running')
+            success = self.delete_session_accelerations(session_id)
+            self._set_job_status(job_id, 'done' if success else 'failed')
+
+        self._background.submit(run)
+        return job_id
+
+    def get_job_status(self, job_id: str) -> Optional[str]:
+        """
+        Stato di un job in background
+
+        Returns:
+            'pending', 'running', 'done', 'failed' o None se il job non esiste
+        """
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def _set_job_status(self, job_id: str, status: str) -> None:
+        with self._jobs_lock:
+            self._jobs[job_id] = status
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+
+    # ==================== UTILITY METHODS ====================
+
+    def process_punch_data(self, data: List[Dict], session_id: str) -> Tuple[List[Dict], int, float]:
+        """
+        Processa i dati dei pugni e prepara le accelerazioni
+
+        Args:
+            data: Lista di punti con coordinate x, y, z
+            session_id: ID della sessione
+
+        Returns:
+            Tupla con (accelerazioni, nuovo_count_pugni, intensità_totale_nuova)
+        """
+        new_accelerations = []
+        total_new_intensity = 0
+
+        for point in data:
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+            x = point.get('x', 0)
+            y = point.get('y', 0)
+            z = point.get('z', 0)
+
+            new_acceleration = {
+                'training_session_id': session_id,
+                'timestamp': now,
+                'acceleration_x': x,
+                'acceleration_y': y,
+                'acceleration_z': z,
+            }
+            new_accelerations.append(new_acceleration)
+
+        return new_accelerations, len(new_accelerations), total_new_intensity
+
+
+# ==================== SESSION STATS ====================
+
+def apply_punch_stats(session_data: Dict, new_punch_count: int, new_intensity: float) -> Dict:
+    """
+    Calcola i campi aggiornati di una sessione dopo l'aggiunta di nuovi pugni
+
+    Args:
+        session_data: Dati attuali della sessione
+        new_punch_count: Numero di nuovi pugni
+        new_intensity: Intensità totale dei nuovi pugni
+
+    Returns:
+        Dizionario con 'avg_intensity', 'intensity_sum' e 'punch_count'
+    """
+    # Dati attuali
+    current_punch_count = session_data.get('punch_count', 0)
+    # Le sessioni create prima di 'intensity_sum' ricostruiscono il totale dalla media
+    current_total_intensity = session_data.get(
+        'intensity_sum',
+        session_data.get('avg_intensity', 0) * current_punch_count if current_punch_count > 0 else 0
+    )
+
+    # Nuovi totali
+    total_punches = current_punch_count + new_punch_count
+    total_intensity = current_total_intensity + new_intensity
+    avg_intensity = round(total_intensity / total_punches, 2) if total_punches > 0 else 0
+
+    return {
+        'avg_intensity': avg_intensity,
+        'intensity_sum': total_intensity,
+        'punch_count': total_punches
+    }
+
+
+# ==================== USER STATS AGGREGATE ====================
+
+def empty_user_stats() -> Dict:
+    """Documento 'user_stats' di un utente senza sessioni"""
+    return {'session_count': 0, 'total_punches': 0, 'avg_intensity_sum': 0, 'avg_intensity_count': 0}
+
+
+def add_session_contribution(totals: Dict, session_data: Dict, sign: int) -> None:
+    """
+    Aggiunge (sign=1) o toglie (sign=-1) una sessione dal documento aggregato
+
+    Come nel calcolo originale contano solo le sessioni con pugni, e la media
+    dell'utente è la media delle intensità medie delle sessioni con intensità > 0.
+    """
+    punch_count = session_data.get('punch_count', 0)
+    if punch_count == 0:
+        return
+    totals['session_count'] = totals.get('session_count', 0) + sign
+    totals['total_punches'] = totals.get('total_punches', 0) + sign * punch_count
+    avg_intensity = session_data.get('avg_intensity', 0)
+    if avg_intensity > 0:
+        # Le medie delle sessioni hanno due decimali: arrotondare evita l'accumulo di errori
+        totals['avg_intensity_sum'] = round(totals.get('avg_intensity_sum', 0) + sign * avg_intensity, 2)
+        totals['avg_intensity_count'] = totals.get('avg_intensity_count', 0) + sign
+
+
+def user_stats_summary(totals: Dict) -> Dict:
+    """Converte il documento aggregato nel formato restituito da get_user_stats"""
+    intensity_count = totals.get('avg_intensity_count', 0)
+    avg_intensity = round(totals.get('avg_intensity_sum', 0) / intensity_count, 2) if intensity_count > 0 else 0
+    return {
+        'session_count': totals.get('session_count', 0),
+        'total_punches': totals.get('total_punches', 0),
+        'avg_intensity': avg_intensity
+    }
+
+
+# ==================== ACCELERATION CHUNK ENCODING ====================
+
+def acceleration_points_to_arrays(data: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Converte un buffer di punti inviato dal client in array colonnari
+
+    Args:
+        data: Lista di punti con coordinate x, y, z ed eventuale timestamp in ms
+
+    Returns:
+        Tupla (x, y, z) float32 e timestamp int64; i punti senza timestamp usano l'ora attuale
+    """
+    now_ms = int(datetime.now().timestamp() * 1000)
+    x = np.array([point.get('x', 0) for point in data], dtype=np.float32)
+    y = np.array([point.get('y', 0) for point in data], dtype=np.float32)
+    z = np.array([point.get('z', 0) for point in data], dtype=np.float32)
+    timestamps = np.array([point.get('timestamp', now_ms) for point in data], dtype=np.int64)
+    return x, y, z, timestamps
+
+
+def encode_acceleration_chunk(session_id: str, x: np.ndarray, y: np.ndarray,
+                              z: np.ndarray, timestamps: np.ndarray) -> Dict:
+    """
+    Codifica una serie di accelerazioni in un documento compatto
+
+    Gli assi sono salvati come float32 little-endian, i timestamp come primo valore
+    più le differenze successive in int32 little-endian (ms tra due campioni).
+
+    Args:
+        session_id: ID della sessione
+        x, y, z: Accelerazioni lungo i tre assi
+        timestamps: Timestamp in ms di ogni campione
+
+    Returns:
+        Dizionario pronto per essere salvato su Firestore
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    return {
+        'training_session_id': session_id,
+        'start_timestamp': int(timestamps[0]),
+        'count': len(timestamps),
+        'timestamp_deltas': np.diff(timestamps).astype('<i4').tobytes(),
+        'x': np.asarray(x, dtype='<f4').tobytes(),
+        'y': np.asarray(y, dtype='<f4').tobytes(),
+        'z': np.asarray(z, dtype='<f4').tobytes(),
+    }
+
+
+def decode_acceleration_chunk(chunk: Dict) -> Dict[str, np.ndarray]:
+    """
+    Decodifica un documento creato da encode_acceleration_chunk
+
+    Returns:
+        Dizionario con gli array 'timestamp', 'x', 'y', 'z'
+    """
+    deltas = np.frombuffer(chunk['timestamp_deltas'], dtype='<i4')
+    timestamps = np.empty(chunk['count'], dtype=np.int64)
+    timestamps[0] = chunk['start_timestamp']
+    np.cumsum(deltas, out=timestamps[1:])
+    timestamps[1:] += chunk['start_timestamp']
+    return {
+        'timestamp': timestamps,
+        'x': np.frombuffer(chunk['x'], dtype='<f4'),
+        'y': np.frombuffer(chunk['y'], dtype='<f4'),
+        'z': np.frombuffer(chunk['z'], dtype='<f4'),
+    }
+
+
+def concatenate_acceleration_chunks(chunks: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Unisce i chunk decodificati in un'unica serie ordinata per timestamp"""
+    if not chunks:
+        return {
+            'timestamp': np.empty(0, dtype=np.int64),
+            'x': np.empty(0, dtype=np.float32),
+            'y': np.empty(0, dtype=np.float32),
+            'z': np.empty(0, dtype=np.float32),
+        }
+    series = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in ('timestamp', 'x', 'y', 'z')}
+    order = np.argsort(series['timestamp'], kind='stable')
+    return {key: values[order] for key, values in series.items()}
+
+
+# ==================== BACKEND SELECTION ====================
+
+def create_storage_backend(backend: str = 'firestore', **kwargs) -> StorageBackend:
+    """
+    Crea il backend richiesto importando solo le sue dipendenze
+
+    Args:
+        backend: 'firestore' o 'sqlite'
+        **kwargs: Argomenti del costruttore (credentials_path, database e client per Firestore,
+            path per SQLite, user_cache_size e user_cache_ttl per entrambi)
+    """
+    if backend == 'firestore':
+        from db_manager import DBManager
+        return DBManager(**kwargs)
+    if backend == 'sqlite':
+        from sqlite_manager import SQLiteDBManager
+        return SQLiteDBManager(**kwargs)
+    raise ValueError(f"Backend sconosciuto: {backend}, disponibili: {', '.join(STORAGE_BACKENDS)}")
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from data_module.types import AnnotatedAction, Label
+from ml.feature_extractor import StatisticalFeatureExtractor
+
+def _actions(lengths: list[int], seed: int = 0) -> list[AnnotatedAction]:
+    rng = np.random.default_rng(seed)
+    return [
+        AnnotatedAction(data=rng.normal(0.0, 20.0, (length, 3)), label=Label.PUNCH, timestamp=str(i))
+        for i, length in enumerate(lengths)
+    ]
+
+def test_feature_matrix_matches_per_action_features():
+    extractor = StatisticalFeatureExtractor()
+    # Unsorted lengths and a small batch size, so rows are padded, chunked and put back in order
+    actions = _actions([40, 3, 17, 2, 60, 17, 5, 33])
+
+    matrix = extractor.extract_feature_matrix(actions, batch_size=3)
+
+    expected = np.stack([extractor.extract_features_from_action(action) for action in actions])
+    assert matrix.shape == expected.shape
+    np.testing.assert_allclose(matrix, expected, rtol=1e-9, atol=1e-9)
+
+# scipy warns about the precision of the moments of the constant action
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_feature_matrix_replaces_nans_like_the_per_action_path():
+    extractor = StatisticalFeatureExtractor()
+    # A constant action has no skewness or kurtosis, a single impulse has no derivatives
+    actions = [
+        AnnotatedAction(data=np.full((10, 3), 4.0), label=Label.NOT_PUNCH, timestamp="0"),
+        AnnotatedAction(data=np.array([[1.0, 2.0, 3.0]]), label=Label.NOT_PUNCH, timestamp="1"),
+        *_actions([12], seed=1),
+    ]
+
+    matrix = extractor.extract_feature_matrix(actions)
+
+    assert not np.isnan(matrix).any()
+    expected = np.stack([extractor.extract_features_from_action(action) for action in actions])
+    np.testing.assert_allclose(matrix, expected, rtol=1e-9, atol=1e-9)
+
+def test_extract_features_keeps_labels_and_order():
+    actions = _actions([8, 30, 4])
+
+    collection = StatisticalFeatureExtractor().extract_features(actions)
+
+    assert [features.timestamp for features in collection.data] == ["0", "1", "2"]
+    assert all(features.label == Label.PUNCH for features in collection.data)
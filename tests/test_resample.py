@@ -0,0 +1,78 @@
+import glob
+import json
+import os
+from pathlib import Path
+
+from data_module.dataset import PunchDataset
+from data_module.loader import load_recordings
+from data_module.types import Label
+from resample import LEGACY_MANIFEST_FILE, MANIFEST_SUFFIX, resample_directory
+
+def _write_recording(path: Path, label: str, intensities: list[float]) -> None:
+    data = [{"timestamp": 1000 + 16 * i, "x": value, "y": 0.0, "z": 0.0} for i, value in enumerate(intensities)]
+    with open(path, "w") as f:
+        json.dump({"label": label, "timestamp": path.stem, "data": data}, f)
+
+def _make_input(input_dir: Path) -> None:
+    input_dir.mkdir()
+    _write_recording(input_dir / "punch_1.json", "punch", [1.0, 40.0, 80.0, 30.0, 2.0])
+    _write_recording(input_dir / "punch_2.json", "punch", [60.0, 90.0, 5.0, 30.0, 1.0])
+    _write_recording(input_dir / "non_punch_1.json", "non_punch", [1.0, 30.0, 2.0])
+    # Never above the threshold, so it has no output
+    _write_recording(input_dir / "non_punch_2.json", "non_punch", [1.0, 2.0, 3.0])
+
+def test_output_directory_holds_only_recordings(tmp_path):
+    input_dir, output_dir = tmp_path / "raw", tmp_path / "filtered"
+    _make_input(input_dir)
+
+    stats = resample_directory(input_dir, output_dir, workers=1)
+
+    assert stats == {"processed": 4, "skipped": 0, "removed": 0}
+    assert output_dir.with_name(output_dir.name + MANIFEST_SUFFIX).exists()
+    # Path.glob matches dotfiles too, nothing but recordings may end in .json
+    assert sorted(path.name for path in output_dir.glob("*.json")) == ["non_punch_1.json", "punch_1.json", "punch_2.json"]
+    dataset = PunchDataset.load_samples_from_path(output_dir, workers=1)
+    assert (dataset.punch_count, dataset.non_punch_count) == (2, 1)
+    recordings = load_recordings(sorted(glob.glob(os.path.join(output_dir, "*.json"))), workers=1, progress=False)
+    by_name = {Path(recording.file_path).name: recording for recording in recordings}
+    assert [impulse.x for impulse in by_name["punch_1.json"].impulses] == [40.0, 80.0, 30.0]
+    assert [impulse.x for impulse in by_name["punch_2.json"].impulses] == [60.0, 90.0]
+    assert by_name["non_punch_1.json"].label == Label.NOT_PUNCH
+
+def test_second_run_only_processes_changes(tmp_path):
+    input_dir, output_dir = tmp_path / "raw", tmp_path / "filtered"
+    _make_input(input_dir)
+    resample_directory(input_dir, output_dir, workers=1)
+
+    _write_recording(input_dir / "punch_1.json", "punch", [1.0, 2.0, 50.0, 3.0])
+    (input_dir / "punch_2.json").unlink()
+    stats = resample_directory(input_dir, output_dir, workers=1)
+
+    assert stats == {"processed": 1, "skipped": 2, "removed": 1}
+    assert sorted(path.name for path in output_dir.glob("*.json")) == ["non_punch_1.json", "punch_1.json"]
+
+def test_legacy_manifest_is_moved_out_of_the_output_directory(tmp_path):
+    input_dir, output_dir = tmp_path / "raw", tmp_path / "filtered"
+    _make_input(input_dir)
+    manifest_path = tmp_path / "manifest"
+    resample_directory(input_dir, output_dir, manifest_path=manifest_path, workers=1)
+    os.replace(manifest_path, output_dir / LEGACY_MANIFEST_FILE)
+
+    stats = resample_directory(input_dir, output_dir, workers=1)
+
+    assert stats == {"processed": 0, "skipped": 4, "removed": 0}
+    assert not (output_dir / LEGACY_MANIFEST_FILE).exists()
+
+def test_parallel_run_matches_serial_run(tmp_path):
+    input_dir = tmp_path / "raw"
+    input_dir.mkdir()
+    for i in range(300):
+        _write_recording(input_dir / f"punch_{i}.json", "punch", [float((i * 7 + k * 13) % 60) for k in range(30)])
+
+    resample_directory(input_dir, tmp_path / "serial", workers=1)
+    resample_directory(input_dir, tmp_path / "parallel", workers=2)
+
+    for path in sorted((tmp_path / "serial").glob("*.json")):
+        with open(path) as serial, open(tmp_path / "parallel" / path.name) as parallel:
+            serial_data, parallel_data = json.load(serial), json.load(parallel)
+        assert serial_data["data"] == parallel_data["data"]
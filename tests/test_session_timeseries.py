@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from session_timeseries import INDEX_FILE, SAMPLES_FILE, TIMESTAMPS_FILE, SessionTimeSeriesStore
+
+def _chunk(start_ms: int, count: int, seed: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    x, y, z = rng.normal(0.0, 20.0, (3, count)).astype(np.float32)
+    return x, y, z, start_ms + np.arange(count, dtype=np.int64) * 16
+
+def test_append_and_read_session(tmp_path):
+    store = SessionTimeSeriesStore(str(tmp_path))
+    chunks = [_chunk(1000 + 1000 * i, 10 + i, seed=i) for i in range(3)]
+
+    totals = [store.append("session", *chunk) for chunk in chunks]
+    series = store.read_session("session")
+
+    assert totals == [10, 21, 33]
+    assert "session" in store and store.sessions() == ["session"]
+    np.testing.assert_array_equal(series['timestamp'], np.concatenate([chunk[3] for chunk in chunks]))
+    np.testing.assert_array_equal(series['y'], np.concatenate([chunk[1] for chunk in chunks]))
+    # A new store reads the same data from disk
+    np.testing.assert_array_equal(SessionTimeSeriesStore(str(tmp_path)).read_session("session")['x'], series['x'])
+
+def test_read_range_matches_a_mask_on_the_whole_session(tmp_path):
+    store = SessionTimeSeriesStore(str(tmp_path))
+    for i in range(5):
+        store.append("session", *_chunk(1000 + 500 * i, 20, seed=i))
+    series = store.read_session("session")
+
+    for start_ms, end_ms in ((None, None), (1200, 2100), (None, 1500), (2400, None), (50_000, None)):
+        mask = np.ones(len(series['timestamp']), dtype=bool)
+        if start_ms is not None:
+            mask &= series['timestamp'] >= start_ms
+        if end_ms is not None:
+            mask &= series['timestamp'] < end_ms
+        selected = store.read_range("session", start_ms, end_ms)
+        for key in ('timestamp', 'x', 'y', 'z'):
+            np.testing.assert_array_equal(selected[key], np.asarray(series[key])[mask])
+
+def test_torn_append_is_ignored_and_overwritten(tmp_path):
+    store = SessionTimeSeriesStore(str(tmp_path))
+    first = _chunk(1000, 8, seed=0)
+    store.append("session", *first)
+    # Samples and timestamps written without their index row, then half an index row
+    session_path = tmp_path / "session"
+    with open(session_path / SAMPLES_FILE, 'ab') as f:
+        f.write(np.ones(15, dtype='<f4').tobytes())
+    with open(session_path / TIMESTAMPS_FILE, 'ab') as f:
+        f.write(np.ones(5, dtype='<i8').tobytes())
+    with open(session_path / INDEX_FILE, 'ab') as f:
+        f.write(np.ones(2, dtype='<i8').tobytes())
+
+    reopened = SessionTimeSeriesStore(str(tmp_path))
+    assert reopened.sample_count("session") == 8
+    second = _chunk(2000, 4, seed=1)
+    reopened.append("session", *second)
+
+    series = reopened.read_session("session")
+    np.testing.assert_array_equal(series['timestamp'], np.concatenate([first[3], second[3]]))
+    np.testing.assert_array_equal(series['z'], np.concatenate([first[2], second[2]]))
+
+def test_delete_and_invalid_ids(tmp_path):
+    store = SessionTimeSeriesStore(str(tmp_path))
+    store.append("session", *_chunk(1000, 3, seed=0))
+
+    store.delete("session")
+
+    assert "session" not in store and len(store.read_session("session")['timestamp']) == 0
+    with pytest.raises(ValueError):
+        store.append("..", *_chunk(1000, 3, seed=0))
@@ -0,0 +1,58 @@
+import numpy as np
+
+from data_module.dataset import PunchDataset
+from data_module.shard import PunchShard, write_shard
+from data_module.types import ColumnarRawAnnotatedAction, Label, RawAnnotatedAction, RawImpulseMeasure
+
+def _recordings() -> list[ColumnarRawAnnotatedAction]:
+    rng = np.random.default_rng(0)
+    return [
+        ColumnarRawAnnotatedAction(
+            data=rng.normal(0.0, 20.0, (length, 3)).astype(np.float32),
+            impulse_timestamps=1000 + np.arange(length, dtype=np.int64) * 16,
+            label=Label.PUNCH if i % 2 else Label.NOT_PUNCH,
+            timestamp=f"t{i}",
+            file_path=f"recording_{i}.json",
+        )
+        for i, length in enumerate([7, 1, 30, 12])
+    ]
+
+def test_shard_round_trip(tmp_path):
+    recordings = _recordings()
+
+    shard = PunchShard(write_shard(recordings, tmp_path / "train.shard"))
+
+    assert len(shard) == len(recordings)
+    np.testing.assert_array_equal(shard.lengths, [7, 1, 30, 12])
+    for recording, packed in zip(recordings, shard):
+        np.testing.assert_array_equal(packed.data, recording.data)
+        np.testing.assert_array_equal(packed.impulse_timestamps, recording.impulse_timestamps)
+        assert (packed.label, packed.timestamp, packed.file_path) == (recording.label, recording.timestamp, recording.file_path)
+    # Views on the memory mapped file, not copies
+    assert isinstance(shard.samples, np.memmap) and np.shares_memory(shard[2].data, shard.samples)
+    assert shard[-1].file_path == "recording_3.json"
+    assert [packed.timestamp for packed in shard[1:3]] == ["t1", "t2"]
+
+def test_write_shard_accepts_raw_actions_and_replaces_the_shard(tmp_path):
+    path = tmp_path / "train.shard"
+    write_shard(_recordings(), path)
+    raw = RawAnnotatedAction(
+        impulses=[RawImpulseMeasure(timestamp=5, x=1.0, y=2.0, z=3.0)],
+        label=Label.PUNCH,
+        timestamp="raw",
+        file_path="raw.json",
+    )
+
+    write_shard([raw], path)
+
+    shard = PunchShard(path)
+    assert len(shard) == 1
+    np.testing.assert_array_equal(shard[0].data, [[1.0, 2.0, 3.0]])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["train.shard"]
+
+def test_dataset_from_shard(tmp_path):
+    path = write_shard(_recordings(), tmp_path / "train.shard")
+
+    dataset = PunchDataset.from_shard(path, split=(1.0, 0.0))
+
+    assert (dataset.punch_count, dataset.non_punch_count) == (2, 2)
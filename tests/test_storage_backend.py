@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from storage_backend import (
+    ACCELERATION_CHUNK_MAX_SAMPLES,
+    concatenate_acceleration_chunks,
+    create_storage_backend,
+    decode_acceleration_chunk,
+    encode_acceleration_chunk,
+)
+
+def _series(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    x, y, z = rng.normal(0.0, 20.0, (3, count)).astype(np.float32)
+    timestamps = 1_700_000_000_000 + np.cumsum(rng.integers(1, 40, count))
+    return x, y, z, timestamps
+
+def test_acceleration_chunk_round_trip():
+    x, y, z, timestamps = _series(100)
+
+    chunk = encode_acceleration_chunk("session", x, y, z, timestamps)
+    decoded = decode_acceleration_chunk(chunk)
+
+    assert chunk['training_session_id'] == "session" and chunk['count'] == 100
+    assert all(isinstance(chunk[key], bytes) for key in ('x', 'y', 'z', 'timestamp_deltas'))
+    np.testing.assert_array_equal(decoded['timestamp'], timestamps)
+    for key, values in (('x', x), ('y', y), ('z', z)):
+        np.testing.assert_array_equal(decoded[key], values)
+
+def test_single_sample_chunk_round_trip():
+    decoded = decode_acceleration_chunk(encode_acceleration_chunk("s", [1.0], [2.0], [3.0], [42]))
+
+    np.testing.assert_array_equal(decoded['timestamp'], [42])
+    np.testing.assert_array_equal(decoded['z'], [3.0])
+
+def test_chunks_are_concatenated_in_timestamp_order():
+    x, y, z, timestamps = _series(50)
+    first = decode_acceleration_chunk(encode_acceleration_chunk("s", x[:20], y[:20], z[:20], timestamps[:20]))
+    second = decode_acceleration_chunk(encode_acceleration_chunk("s", x[20:], y[20:], z[20:], timestamps[20:]))
+
+    series = concatenate_acceleration_chunks([second, first])
+
+    np.testing.assert_array_equal(series['timestamp'], timestamps)
+    np.testing.assert_array_equal(series['x'], x)
+    assert len(concatenate_acceleration_chunks([])['timestamp']) == 0
+
+@pytest.fixture(params=["sqlite", "firestore"])
+def backend(request, tmp_path):
+    if request.param == "firestore":
+        pytest.importorskip("google.cloud.firestore")
+        from in_memory_firestore import InMemoryFirestoreClient
+        return create_storage_backend("firestore", client=InMemoryFirestoreClient())
+    return create_storage_backend("sqlite", path=str(tmp_path / "test.db"))
+
+def _user(backend) -> str:
+    backend.create_user("boxer", "secret", "boxer@example.com")
+    return backend.authenticate_user("boxer", "secret").id
+
+def test_acceleration_arrays_round_trip_across_documents(backend):
+    session_id = backend.create_training_session(_user(backend), "2025-01-01 10:00:00")
+    x, y, z, timestamps = _series(ACCELERATION_CHUNK_MAX_SAMPLES + 100)
+
+    assert backend.save_acceleration_arrays(session_id, x, y, z, timestamps)
+    series = backend.get_session_acceleration_series(session_id)
+
+    np.testing.assert_array_equal(series['timestamp'], timestamps)
+    for key, values in (('x', x), ('y', y), ('z', z)):
+        np.testing.assert_array_equal(series[key], values)
+
+def test_sessions_page_walks_every_valid_session_newest_first(backend):
+    user_id = _user(backend)
+    other_id = backend.create_training_session("someone-else", "2025-01-01 09:00:00")
+    backend.update_session_stats(other_id, 1, 10.0)
+    expected = []
+    for i in range(17):
+        session_id = backend.create_training_session(user_id, f"2025-01-{i + 1:02d} 10:00:00")
+        if i % 4 == 0:
+            # No punches, never listed
+            continue
+        backend.update_session_stats(session_id, i, 10.0 + i)
+        duration = 0 if i % 4 == 1 else 60 * i
+        backend.update_training_session(session_id, {'duration': duration})
+        expected.append((f"2025-01-{i + 1:02d} 10:00:00", duration))
+    expected.reverse()
+
+    for with_duration in (False, True):
+        wanted = [item for item in expected if item[1] > 0 or not with_duration]
+        listed, cursor, pages = [], None, 0
+        while True:
+            page, cursor = backend.get_user_sessions_page(user_id, page_size=4, cursor=cursor, with_duration=with_duration)
+            assert len(page) <= 4
+            assert all(set(session) == {'id', 'date', 'duration', 'punch_count', 'avg_intensity'} for session in page)
+            listed += page
+            pages += 1
+            if cursor is None:
+                break
+        assert [(session['date'], session['duration']) for session in listed] == wanted
+        assert pages == -(-len(wanted) // 4)
+
+def test_sessions_page_rejects_a_foreign_cursor(backend):
+    user_id = _user(backend)
+    session_id = backend.create_training_session(user_id, "2025-01-01 10:00:00")
+    backend.update_session_stats(session_id, 3, 10.0)
+    other_id = backend.create_training_session("someone-else", "2025-01-02 10:00:00")
+
+    assert backend.get_user_sessions_page(user_id, cursor=other_id) == ([], None)
+    page, cursor = backend.get_user_sessions_page(user_id)
+    assert [session['id'] for session in page] == [session_id] and cursor is None
@@ -0,0 +1,54 @@
+import numpy as np
+
+from ml.feature_extractor import StatisticalFeatureExtractor
+from ml.streaming_features import StreamingFeatureAccumulator
+from resample import StreamSegmenter
+
+def _expected(data: np.ndarray) -> dict[str, np.ndarray]:
+    return StatisticalFeatureExtractor().get_feature_dict(np.asarray(data, dtype=np.float64))
+
+def test_accumulator_matches_get_feature_dict():
+    rng = np.random.default_rng(0)
+    for length in (2, 7, 60, 300):
+        data = rng.normal(0.0, 20.0, (length, 3))
+        one_at_a_time, chunked = StreamingFeatureAccumulator(capacity=4), StreamingFeatureAccumulator(capacity=4)
+        for x, y, z in data:
+            one_at_a_time.update(x, y, z)
+        for start in range(0, length, 11):
+            chunked.update_many(data[start:start + 11])
+
+        expected = _expected(data)
+        for accumulator in (one_at_a_time, chunked):
+            features = accumulator.feature_dict()
+            assert list(features) == list(expected)
+            for key in expected:
+                np.testing.assert_allclose(features[key], expected[key], rtol=1e-9, atol=1e-9, err_msg=key)
+
+def test_reset_starts_a_new_window():
+    rng = np.random.default_rng(1)
+    accumulator = StreamingFeatureAccumulator()
+    accumulator.update_many(rng.normal(size=(50, 3)))
+    accumulator.reset()
+    data = rng.normal(size=(20, 3))
+    accumulator.update_many(data)
+
+    expected = np.concatenate([value.flatten() for value in _expected(data).values()])
+    np.testing.assert_allclose(accumulator.features(), expected, rtol=1e-9, atol=1e-9)
+
+def test_segmenter_windows_carry_their_features():
+    rng = np.random.default_rng(2)
+    active = np.repeat(rng.random(60) > 0.5, 50)
+    data = np.abs(rng.normal(0.0, 10.0, (len(active), 3))) * np.where(active, 5.0, 0.1)[:, None]
+    timestamps = np.arange(len(data), dtype=np.int64) * 16
+
+    for chunk_size in (1, 13, 500):
+        segmenter = StreamSegmenter(window_size=3, threshold=25.0, max_run_length=40, features=True)
+        windows = []
+        for start in range(0, len(data), chunk_size):
+            windows += segmenter.push(data[start:start + chunk_size], timestamps[start:start + chunk_size])
+        windows += segmenter.flush()
+
+        assert windows
+        for window in windows:
+            expected = np.concatenate([value.flatten() for value in _expected(window.data).values()])
+            np.testing.assert_allclose(window.features, expected, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from data_module.types import AnnotatedAction, ColumnarRawAnnotatedAction, Label, RawAnnotatedAction
+
+RECORDING = {
+    "label": "punch",
+    "timestamp": "20250101120000",
+    "data": [
+        {"timestamp": 1000, "x": 1.5, "y": -2.0, "z": 0.25},
+        {"timestamp": 1016, "x": 30.0, "y": 40.0, "z": 0.0},
+        {"timestamp": 1032, "x": -3.0, "y": 0.5, "z": 9.75},
+    ],
+}
+
+def test_columnar_from_json_matches_raw_action():
+    raw = RawAnnotatedAction.from_json(RECORDING, file_path="a.json")
+    columnar = ColumnarRawAnnotatedAction.from_json(RECORDING, file_path="a.json")
+
+    assert columnar.data.dtype == np.float32 and columnar.data.shape == (3, 3)
+    assert columnar.impulse_timestamps.dtype == np.int64
+    assert columnar.label == Label.PUNCH and columnar.timestamp == RECORDING["timestamp"]
+    np.testing.assert_array_equal(columnar.x, [m.x for m in raw.impulses])
+    np.testing.assert_array_equal(columnar.impulse_timestamps, [1000, 1016, 1032])
+    np.testing.assert_allclose(columnar.intensity, [m.intensity for m in raw.impulses], rtol=1e-6)
+    assert columnar.max_impulse == raw.max_impulse == 50.0
+
+def test_columnar_round_trips_through_raw_action():
+    columnar = ColumnarRawAnnotatedAction.from_json(RECORDING, file_path="a.json")
+
+    raw = columnar.to_raw_annotated_action()
+    back = ColumnarRawAnnotatedAction.from_raw_annotated_action(raw)
+
+    np.testing.assert_array_equal(back.data, columnar.data)
+    np.testing.assert_array_equal(back.impulse_timestamps, columnar.impulse_timestamps)
+    assert columnar.to_dict() == {**RECORDING, "file_path": "a.json"}
+
+def test_annotated_action_shares_the_columnar_array():
+    columnar = ColumnarRawAnnotatedAction.from_json(RECORDING, file_path="a.json")
+
+    action = AnnotatedAction.from_raw_annotated_action(columnar)
+
+    assert np.shares_memory(action.data, columnar.data)
+    expected = AnnotatedAction.from_raw_annotated_action(RawAnnotatedAction.from_json(RECORDING, file_path="a.json"))
+    np.testing.assert_array_equal(action.data, expected.data)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from data_module import wire
+from data_module.types import Label
+
+def _frame(count: int = 5) -> tuple[np.ndarray, np.ndarray, bytes]:
+    rng = np.random.default_rng(0)
+    data = rng.normal(0.0, 20.0, (count, 3)).astype(np.float32)
+    timestamps = 1_700_000_000_000 + np.arange(count, dtype=np.int64) * 16
+    return data, timestamps, wire.encode_frame(data, timestamps, Label.PUNCH, timestamp=20250101120000)
+
+def test_frame_round_trip():
+    data, timestamps, frame = _frame()
+
+    action = wire.decode_frame(frame, file_path="upload")
+
+    assert len(frame) == wire.HEADER.size + len(data) * (8 + 3 * 4)
+    np.testing.assert_array_equal(action.data, data)
+    np.testing.assert_array_equal(action.impulse_timestamps, timestamps)
+    assert action.label == Label.PUNCH
+    assert action.timestamp == "20250101120000"
+    assert action.file_path == "upload"
+
+def test_empty_frame_round_trip():
+    action = wire.decode_frame(wire.encode_frame(np.empty((0, 3)), np.empty(0)))
+
+    assert len(action) == 0 and action.label == Label.NOT_PUNCH
+
+@pytest.mark.parametrize("corrupt", [
+    lambda frame: frame[:wire.HEADER.size - 1],
+    lambda frame: frame[:-1],
+    lambda frame: frame + b"\0",
+    lambda frame: b"XXXX" + frame[4:],
+    lambda frame: frame[:4] + bytes([wire.VERSION + 1]) + frame[5:],
+    lambda frame: frame[:5] + bytes([7]) + frame[6:],
+])
+def test_malformed_frames_are_rejected(corrupt):
+    _, _, frame = _frame()
+
+    with pytest.raises(wire.WireFormatError):
+        wire.decode_frame(corrupt(frame))
+
+def test_mismatched_timestamps_are_rejected():
+    with pytest.raises(wire.WireFormatError):
+        wire.encode_frame(np.zeros((3, 3)), np.zeros(2))
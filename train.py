@@ -5,6 +5,7 @@ from data_module.types import AnnotatedFeaturesCollection
 
 from log import configure_logger
 
+from ml.feature_cache import FeatureCache
 from ml.feature_extractor import StatisticalFeatureExtractor
 from ml.model import PunchClassifier
 
@@ -13,27 +14,40 @@ from pathlib import Path
 logger = logging.getLogger(__name__)
 
 
-def train_model(classifier: PunchClassifier, dataset: PunchDataset):
-    train_partition = dataset.train_data
-    classifier.train(train_partition)
+def train_model(classifier: PunchClassifier, train_features: AnnotatedFeaturesCollection):
+    classifier.train(train_features.data)
 
-def evaluate_model(classifier: PunchClassifier, dataset: PunchDataset):
-    test_partition = dataset.test_data
-    classifier.evaluate(test_partition)
+def evaluate_model(classifier: PunchClassifier, test_features: AnnotatedFeaturesCollection):
+    classifier.evaluate(test_features.data)
 
 def run(config):
     logger.info("Loading training data")
-    punch_dataset = PunchDataset.load_samples_from_path(Path(config['data_root']))
+    data_root = Path(config['data_root'])
+    if data_root.suffix == '.shard':
+        punch_dataset = PunchDataset.from_shard(data_root)
+    else:
+        punch_dataset = PunchDataset.load_samples_from_path(data_root)
     embedder = StatisticalFeatureExtractor()
-    annotated_features = embedder(punch_dataset.processed_samples)
+    # The features are extracted once and shared by training, evaluation and plotting
+    if config.get('feature_cache'):
+        feature_cache = FeatureCache(
+            Path(config['feature_cache']),
+            max_bytes=config.get('feature_cache_max_mb', 512) * 1024 * 1024,
+        )
+        train_features = feature_cache.extract(embedder, punch_dataset.train_data)
+        test_features = feature_cache.extract(embedder, punch_dataset.test_data)
+    else:
+        train_features = embedder(punch_dataset.train_data)
+        test_features = embedder(punch_dataset.test_data)
+    annotated_features = AnnotatedFeaturesCollection(data=train_features.data + test_features.data)
     assert isinstance(annotated_features, AnnotatedFeaturesCollection), "Expected AnnotatedFeaturesCollection"
     
     logger.info("Starting training with config: %s", config)
     model = PunchClassifier()
-    train_model(model, punch_dataset)
+    train_model(model, train_features)
     
     logger.info("Training completed. Evaluating model.")
-    evaluate_model(model, punch_dataset)
+    evaluate_model(model, test_features)
 
     logger.info("Plotting t-SNE visualization")
     get_plot_tsne(annotated_features, show=True)
@@ -42,6 +56,9 @@ def run(config):
     save_path = Path("trained_model.pkl")
     joblib.dump(model.model, save_path)
     logger.info(f"Modello salvato in {save_path}")
+    numpy_save_path = Path("trained_model.npz")
+    model.export_numpy(str(numpy_save_path), verify_data=test_features.data)
+    logger.info(f"Modello esportato per NumPy in {numpy_save_path}")
 
 if __name__ == "__main__":
     configure_logger(__name__)
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar('V')
+
+
+class TTLCache(Generic[V]):
+    """Cache LRU in memoria con scadenza per gli oggetti caricati dal database
+
+    Usata da DBManager.load_user: Flask-Login ricarica l'utente a ogni richiesta autenticata,
+    comprese /upload_data_buffer e /save_high_intensity, e senza cache ognuna leggerebbe
+    un documento da Firestore. I risultati None non vengono salvati, così un utente appena
+    registrato è visibile subito; le modifiche al profilo devono chiamare invalidate.
+    """
+
+    def __init__(self, loader: Callable[[Hashable], Optional[V]], max_size: int = 1024, ttl: float = 60.0):
+        """
+        Args:
+            loader: Funzione che legge il valore dal database, chiamata in caso di miss
+            max_size: Numero massimo di valori, oltre il quale viene scartato il meno usato
+            ttl: Secondi dopo i quali un valore viene riletto dal database
+        """
+        self.loader = loader
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()  # key -> (scadenza, valore)
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """
+        Restituisce il valore in cache se non scaduto, altrimenti lo carica con il loader
+
+        Args:
+            key: Chiave del valore, ad esempio l'ID dell'utente
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._metrics['hits'] += 1
+                return entry[1]
+            self._metrics['misses'] += 1
+
+        # Il database viene letto fuori dal lock per non bloccare le altre richieste
+        value = self.loader(key)
+        if value is not None:
+            with self._lock:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._metrics['evictions'] += 1
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Scarta il valore di una chiave, la prossima get lo rilegge dal database"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._metrics['invalidations'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        """Contatori dall'avvio, più dimensione attuale e hit rate"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['size'] = len(self._entries)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+        return metrics